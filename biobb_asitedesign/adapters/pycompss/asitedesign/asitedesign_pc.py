@@ -0,0 +1,41 @@
+import traceback
+from pycompss.api.task import task
+from pycompss.api.constraint import constraint
+from pycompss.api import parameter
+from biobb_common.tools import file_utils as fu
+from biobb_asitedesign.asitedesign import asitedesign
+from biobb_asitedesign.adapters.pycompss.asitedesign.task_variants import (CPUS_VARIANTS, PARAMETER_DIRECTIONS,
+                                                                           params_kind, task_cpus, task_name)
+
+
+def _asitedesign_task(input_pdb, input_yaml, params_zip, output_path, properties, **kwargs):
+    try:
+        asitedesign.Asitedesign(input_pdb=input_pdb, input_yaml=input_yaml, params_zip=params_zip,
+                                output_path=output_path, properties=properties, **kwargs).launch()
+    except Exception:
+        traceback.print_exc()
+        fu.write_failed_output(output_path)
+
+
+def _register_task(cpus, kind):
+    def asitedesign_task(input_pdb, input_yaml, params_zip, output_path, properties, **kwargs):
+        _asitedesign_task(input_pdb, input_yaml, params_zip, output_path, properties, **kwargs)
+
+    name = task_name(cpus, kind)
+    asitedesign_task.__name__ = asitedesign_task.__qualname__ = name
+    directions = {argument: getattr(parameter, direction) for argument, direction in PARAMETER_DIRECTIONS[kind].items()}
+    decorated = constraint(computing_units=str(cpus))(task(**directions)(asitedesign_task))
+    globals()[name] = decorated
+    return decorated
+
+
+TASKS = {(cpus, kind): _register_task(cpus, kind) for cpus in CPUS_VARIANTS for kind in PARAMETER_DIRECTIONS}
+
+
+def asitedesign_pc(input_pdb, input_yaml, params_zip, output_path, properties, **kwargs):
+    """Submit an Asitedesign job as a COMPSs task constrained to the cpus of its properties.
+
+    ``params_zip`` is a zip file or a folder of params files, transferred as a directory.
+    """
+    return TASKS[(task_cpus(properties), params_kind(params_zip))](input_pdb, input_yaml, params_zip, output_path,
+                                                                   properties, **kwargs)
@@ -0,0 +1,36 @@
+""" Task variants of the PyCOMPSs adapter of Asitedesign, importable without PyCOMPSs """
+import os
+from typing import Dict
+
+from biobb_asitedesign.asitedesign import mpi
+
+# Tasks are registered by name, so one variant per number of computing units is created at
+# import time (identically on the master and on the workers). Override the sizes with a comma
+# separated list in ASITEDESIGN_PC_CPUS.
+CPUS_VARIANTS = sorted({int(cpus) for cpus in os.getenv('ASITEDESIGN_PC_CPUS', '1,2,4,8,12,16,24,32,48,64,96,128').split(',')})
+
+# Directions of the file arguments of the tasks by kind of params_zip: a zip file, or a folder of
+# params files that COMPSs can only transfer as a directory
+PARAMETER_DIRECTIONS: Dict[str, Dict[str, str]] = {
+    'zip': {'input_pdb': 'FILE_IN', 'input_yaml': 'FILE_IN', 'params_zip': 'FILE_IN', 'output_path': 'FILE_OUT'},
+    'dir': {'input_pdb': 'FILE_IN', 'input_yaml': 'FILE_IN', 'params_zip': 'DIRECTORY_IN', 'output_path': 'FILE_OUT'},
+}
+
+
+def params_kind(params_zip: str) -> str:
+    return 'dir' if os.path.isdir(params_zip) else 'zip'
+
+
+def task_name(cpus: int, kind: str = 'zip') -> str:
+    """Return the registered name of the task variant for ``cpus`` computing units and ``kind`` of params."""
+    return f"asitedesign_pc_{cpus}cu" if kind == 'zip' else f"asitedesign_pc_{kind}_{cpus}cu"
+
+
+def task_cpus(properties: dict) -> int:
+    """Return the computing units reserved for a job: the smallest variant that fits its cpus property."""
+    properties = properties or {}
+    cpus = mpi.requested_ranks(properties.get('cpus', 1), properties.get('nPoses', 3))
+    fitting = [variant for variant in CPUS_VARIANTS if variant >= cpus]
+    if not fitting:
+        raise ValueError(f"cpus={cpus} exceeds the largest task variant {CPUS_VARIANTS[-1]}, extend ASITEDESIGN_PC_CPUS")
+    return fitting[0]
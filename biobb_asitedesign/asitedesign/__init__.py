@@ -1,2 +1,2 @@
 name = "asitedesign"
-__all__ = ["asitedesign"]
\ No newline at end of file
+__all__ = ["asitedesign", "asitedesign_batch", "asitedesign_async", "asitedesign_search"]
\ No newline at end of file
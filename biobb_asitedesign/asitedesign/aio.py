@@ -0,0 +1,145 @@
+""" Asyncio execution of the job command for package biobb_asitedesign.asitedesign
+
+The command runs as the leader of a new session, so the whole process tree it starts (mpirun,
+its ranks and the containers they exec) is one process group: cancelling or timing out the
+coroutine sends SIGTERM to that group and SIGKILL after a grace period. Its output is streamed
+line by line from the stdout and stderr pipes and from the log files it redirects to.
+"""
+import asyncio
+import contextlib
+import os
+from pathlib import Path
+import signal
+import typing
+from typing import Any, Callable, Mapping, Optional
+
+from biobb_asitedesign.asitedesign.telemetry import LogTail
+
+OutputCallback = Callable[[str], Any]
+
+
+async def kill_process_group(process: asyncio.subprocess.Process, grace: float = 30) -> None:
+    """Send SIGTERM to the process group led by ``process``, then SIGKILL to what is left after ``grace`` seconds."""
+    with contextlib.suppress(ProcessLookupError):
+        os.killpg(process.pid, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(process.wait(), grace)
+    except asyncio.TimeoutError:
+        pass
+    # Also reaches the ranks that outlive the leader of the group
+    with contextlib.suppress(ProcessLookupError):
+        os.killpg(process.pid, signal.SIGKILL)
+    await process.wait()
+
+
+async def _read_stream(stream: asyncio.StreamReader, on_output: Optional[OutputCallback],
+                       lines: typing.List[str]) -> None:
+    while True:
+        line = await stream.readline()
+        if not line:
+            return
+        text = line.decode(errors='replace').rstrip('\n')
+        lines.append(text)
+        if on_output:
+            on_output(text)
+
+
+async def _tail(log_paths: typing.Sequence[Path], on_output: OutputCallback, done: asyncio.Event,
+                poll_interval: float) -> None:
+    tail = LogTail(log_paths)
+    while True:
+        finished = done.is_set()
+        for line in tail.read():
+            on_output(line)
+        if finished:
+            return
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(done.wait(), poll_interval)
+
+
+class ShellResult(typing.NamedTuple):
+    return_code: int
+    stdout: str
+    stderr: str
+
+
+async def run_shell(cmd: str, cwd: Optional[str] = None, env: Optional[Mapping[str, str]] = None,
+                    shell_path: Optional[str] = None, on_output: Optional[OutputCallback] = None,
+                    log_paths: typing.Sequence[str] = (), grace: float = 30, poll_interval: float = 0.5,
+                    on_start: Optional[Callable[[asyncio.subprocess.Process], Any]] = None) -> ShellResult:
+    """Run the shell command ``cmd`` in its own process group without blocking the event loop.
+
+    Args:
+        cmd: Command line, run by ``shell_path`` (default ``/bin/sh``).
+        cwd: Working directory of the command.
+        env: Variables added to the environment of this process.
+        on_output: Called with every line of stdout, stderr and ``log_paths``.
+        log_paths: Files the command redirects its output to, followed while it runs.
+        grace: Seconds between SIGTERM and SIGKILL when the coroutine is cancelled.
+        poll_interval: Seconds between reads of ``log_paths``.
+        on_start: Called with the process once it has started.
+    """
+    process = await asyncio.create_subprocess_shell(
+        cmd, cwd=cwd, env=dict(os.environ, **(env or {})), executable=shell_path,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, start_new_session=True)
+    if on_start:
+        on_start(process)
+    stdout: typing.List[str] = []
+    stderr: typing.List[str] = []
+    done = asyncio.Event()
+    readers = [asyncio.ensure_future(_read_stream(process.stdout, on_output, stdout)),
+               asyncio.ensure_future(_read_stream(process.stderr, on_output, stderr))]
+    if on_output and log_paths:
+        readers.append(asyncio.ensure_future(_tail([Path(path) for path in log_paths], on_output, done, poll_interval)))
+    try:
+        return_code = await process.wait()
+        done.set()
+        await asyncio.gather(*readers)
+    except BaseException:
+        # Cancelled or timed out: stop the whole process tree before leaving
+        await asyncio.shield(kill_process_group(process, grace))
+        for reader in readers:
+            reader.cancel()
+        raise
+    return ShellResult(return_code, '\n'.join(stdout), '\n'.join(stderr))
+
+
+class CpuLimiter:
+    """Admit coroutines while at most ``max_jobs`` of them run and the sum of their cpus is within ``max_cpus``.
+
+    Waiters are admitted in arrival order. Must be created and used inside the running event loop.
+    """
+
+    def __init__(self, max_cpus: int, max_jobs: Optional[int] = None) -> None:
+        self.max_cpus = max_cpus
+        self.max_jobs = max_jobs
+        self.used_cpus = 0
+        self.running = 0
+        self._condition = asyncio.Condition()
+        self._queue: typing.List[object] = []
+
+    def _fits(self, ticket: object, cpus: int) -> bool:
+        return (self._queue[0] is ticket and self.used_cpus + cpus <= self.max_cpus
+                and (self.max_jobs is None or self.running < self.max_jobs))
+
+    @contextlib.asynccontextmanager
+    async def slot(self, cpus: int) -> typing.AsyncIterator[None]:
+        if cpus > self.max_cpus:
+            raise ValueError(f"{cpus} cpus requested but the limit is {self.max_cpus}")
+        ticket = object()
+        async with self._condition:
+            self._queue.append(ticket)
+            try:
+                await self._condition.wait_for(lambda: self._fits(ticket, cpus))
+            finally:
+                self._queue.remove(ticket)
+                self._condition.notify_all()
+            self.used_cpus += cpus
+            self.running += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.used_cpus -= cpus
+                self.running -= 1
+                self._condition.notify_all()
@@ -0,0 +1,282 @@
+""" Parallel streaming zip writer for package biobb_asitedesign.asitedesign """
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+from pathlib import Path
+import struct
+import tempfile
+import typing
+from typing import Dict, List, Optional, Set
+import zipfile
+import zlib
+
+CHUNK_SIZE = 1 << 20
+MANIFEST_NAME = 'MANIFEST.json'
+
+
+class _Member(typing.NamedTuple):
+    source: str
+    arcname: str
+    is_dir: bool
+
+
+class _Packed(typing.NamedTuple):
+    member: _Member
+    spool: Optional[typing.BinaryIO]
+    size: int
+    compress_size: int
+    crc: int
+    sha256: str
+
+
+def collect_members(file_list: typing.Iterable[str], base: Optional[str] = None) -> List[_Member]:
+    """Expand files and directories into a sorted list of unique archive members.
+
+    Member names are relative to ``base`` if given, else to the parent of each listed path. A member that
+    points to a file already in the archive is skipped, while a different file
+    colliding with an existing name is renamed to ``file_<index>_<name>``.
+    """
+    members: List[_Member] = []
+    names: Set[str] = set()
+    sources: Set[str] = set()
+
+    def add(source: str, arcname: str, is_dir: bool, index: int) -> None:
+        real = os.path.realpath(source)
+        if real in sources:
+            return
+        if arcname in names:
+            arcname = f"file_{index}_{arcname}"
+        names.add(arcname)
+        sources.add(real)
+        members.append(_Member(source, arcname, is_dir))
+
+    for index, f in enumerate(sorted(file_list)):
+        path = Path(f)
+        if not path.exists():
+            continue
+        anchor = path.parent if base is None else Path(base)
+        if path.is_dir():
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                rel_root = Path(os.path.relpath(root, anchor)).as_posix()
+                if not dirs and not files:
+                    add(root, rel_root + '/', True, index)
+                for file in sorted(files):
+                    add(os.path.join(root, file), f"{rel_root}/{file}", False, index)
+        else:
+            add(str(path), Path(os.path.relpath(path, anchor)).as_posix(), False, index)
+    return members
+
+
+def _pack_member(member: _Member, compress_level: int, spool_dir: Optional[str]) -> _Packed:
+    """Read ``member`` once in chunks, computing checksums and, if needed, a raw deflate spool."""
+    crc = 0
+    size = 0
+    sha = hashlib.sha256()
+    spool = None
+    compressor = None
+    if compress_level > 0:
+        spool = tempfile.TemporaryFile(dir=spool_dir)
+        compressor = zlib.compressobj(compress_level, zlib.DEFLATED, -15)
+    with open(member.source, 'rb') as in_f:
+        for chunk in iter(lambda: in_f.read(CHUNK_SIZE), b''):
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            sha.update(chunk)
+            if compressor:
+                spool.write(compressor.compress(chunk))
+    compress_size = size
+    if compressor:
+        spool.write(compressor.flush())
+        compress_size = spool.tell()
+        spool.seek(0)
+    return _Packed(member, spool, size, compress_size, crc, sha.hexdigest())
+
+
+def _write_entry(zip_f: zipfile.ZipFile, zinfo: zipfile.ZipInfo, data: typing.BinaryIO) -> None:
+    """Append ``zinfo`` to an open ``zip_f`` with its ``compress_size`` bytes of member data read from ``data``."""
+    zip_f._writecheck(zinfo)
+    zip_f._didModify = True
+    zip_f.fp.seek(zip_f.start_dir)
+    zinfo.header_offset = zip_f.fp.tell()
+    zip_f.fp.write(zinfo.FileHeader())
+    remaining = zinfo.compress_size
+    while remaining:
+        chunk = data.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated data for member {zinfo.filename}")
+        zip_f.fp.write(chunk)
+        remaining -= len(chunk)
+    zip_f.filelist.append(zinfo)
+    zip_f.NameToInfo[zinfo.filename] = zinfo
+    zip_f.start_dir = zip_f.fp.tell()
+
+
+def _write_packed(zip_f: zipfile.ZipFile, packed: _Packed) -> None:
+    """Append an already checksummed (and compressed) member to an open ``zip_f``."""
+    zinfo = zipfile.ZipInfo.from_file(packed.member.source, packed.member.arcname)
+    zinfo.compress_type = zipfile.ZIP_DEFLATED if packed.spool else zipfile.ZIP_STORED
+    zinfo.file_size = packed.size
+    zinfo.compress_size = packed.compress_size
+    zinfo.CRC = packed.crc
+
+    if packed.spool:
+        with packed.spool:
+            _write_entry(zip_f, zinfo, packed.spool)
+    else:
+        with open(packed.member.source, 'rb') as in_f:
+            _write_entry(zip_f, zinfo, in_f)
+
+
+def _copy_raw(zip_f: zipfile.ZipFile, source: zipfile.ZipFile, info: zipfile.ZipInfo, arcname: str) -> None:
+    """Append the member ``info`` of ``source`` to ``zip_f`` as ``arcname``, as it is stored, without recompressing it."""
+    source.fp.seek(info.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, source.fp.read(zipfile.sizeFileHeader))
+    source.fp.seek(info.header_offset + zipfile.sizeFileHeader + header[zipfile._FH_FILENAME_LENGTH]
+                   + header[zipfile._FH_EXTRA_FIELD_LENGTH])
+    zinfo = zipfile.ZipInfo(arcname, info.date_time)
+    zinfo.external_attr = info.external_attr
+    zinfo.compress_type = info.compress_type
+    zinfo.file_size = info.file_size
+    zinfo.compress_size = info.compress_size
+    zinfo.CRC = info.CRC
+    _write_entry(zip_f, zinfo, source.fp)
+
+
+def _write_members(zip_f: zipfile.ZipFile, members: List[_Member], compress_level: int, workers: int,
+                   spool_dir: str) -> List[Dict[str, typing.Any]]:
+    """Write ``members`` into an open ``zip_f``, compressing the files in a pool of ``workers`` threads."""
+    entries: List[Dict[str, typing.Any]] = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for member in members:
+            if member.is_dir:
+                zip_f.write(member.source, member.arcname)
+        # Keep a bounded window of members in flight to cap the number of spool files
+        window = workers * 2
+        pending: List[typing.Any] = []
+        for member in (m for m in members if not m.is_dir):
+            pending.append(pool.submit(_pack_member, member, compress_level, spool_dir))
+            if len(pending) >= window:
+                entries.append(_drain(zip_f, pending.pop(0)))
+        while pending:
+            entries.append(_drain(zip_f, pending.pop(0)))
+    return entries
+
+
+def write_archive(zip_file: str, file_list: typing.Iterable[str], compress_level: int = 6,
+                  workers: Optional[int] = None, manifest: bool = True,
+                  base: Optional[str] = None) -> List[Dict[str, typing.Any]]:
+    """Write ``file_list`` into ``zip_file`` compressing members in parallel.
+
+    Files are read in chunks by a pool of ``workers`` threads (zlib and hashlib release
+    the GIL) and spooled as raw deflate streams next to ``zip_file``, so memory use does not
+    depend on the member size. Members are written in sorted order, so the archive layout
+    is deterministic. A ``compress_level`` of 0 stores the members uncompressed. Member names
+    are relative to ``base`` if given, see :func:`collect_members`.
+
+    Returns:
+        list: Manifest entries with the name, size, compressed size, CRC32 and SHA-256 of every member.
+    """
+    _check_level(compress_level)
+    workers = max(1, workers or os.cpu_count() or 1)
+    zip_real = os.path.realpath(zip_file)
+    members = [m for m in collect_members(file_list, base) if os.path.realpath(m.source) != zip_real]
+    spool_dir = str(Path(zip_file).resolve().parent)
+
+    compression = zipfile.ZIP_DEFLATED if compress_level else zipfile.ZIP_STORED
+    with zipfile.ZipFile(zip_file, 'w', compression=compression, allowZip64=True) as zip_f:
+        entries = _write_members(zip_f, members, compress_level, workers, spool_dir)
+        if manifest:
+            zip_f.writestr(MANIFEST_NAME, json.dumps({'members': entries}, indent=2))
+    return entries
+
+
+def _check_level(compress_level: int) -> None:
+    if not 0 <= compress_level <= 9:
+        raise ValueError(f"compress_level must be between 0 and 9, got {compress_level}")
+
+
+def _drain(zip_f: zipfile.ZipFile, future) -> Dict[str, typing.Any]:
+    packed = future.result()
+    _write_packed(zip_f, packed)
+    return {'name': packed.member.arcname,
+            'size': packed.size,
+            'compressed_size': packed.compress_size,
+            'crc32': f"{packed.crc:08x}",
+            'sha256': packed.sha256}
+
+
+class AppendableArchive:
+    """Zip archive grown by successive batches of members, a valid archive after every batch.
+
+    Every :meth:`append` writes the new members over the previous central directory and a new
+    one after them, so the members already written never move. A reader opening the archive
+    while a batch is written may get ``zipfile.BadZipFile`` and should retry. Members whose
+    name is already in the archive are skipped. :meth:`close` adds the manifest of all batches.
+    """
+
+    def __init__(self, zip_file: str, compress_level: int = 6, workers: Optional[int] = None) -> None:
+        _check_level(compress_level)
+        self.zip_file = zip_file
+        self.compress_level = compress_level
+        self.workers = workers
+        self.entries: List[Dict[str, typing.Any]] = []
+        self.names: Set[str] = set()
+        zipfile.ZipFile(zip_file, 'w').close()
+
+    def _open(self) -> zipfile.ZipFile:
+        compression = zipfile.ZIP_DEFLATED if self.compress_level else zipfile.ZIP_STORED
+        return zipfile.ZipFile(self.zip_file, 'a', compression=compression, allowZip64=True)
+
+    def append(self, file_list: typing.Iterable[str], base: Optional[str] = None,
+               workers: Optional[int] = None) -> List[Dict[str, typing.Any]]:
+        """Compress and append the members of ``file_list`` (see :func:`collect_members`) not yet in the archive."""
+        zip_real = os.path.realpath(self.zip_file)
+        members = [m for m in collect_members(file_list, base)
+                   if m.arcname not in self.names and os.path.realpath(m.source) != zip_real]
+        if not members:
+            return []
+        workers = max(1, workers or self.workers or os.cpu_count() or 1)
+        with self._open() as zip_f:
+            entries = _write_members(zip_f, members, self.compress_level, workers,
+                                     str(Path(self.zip_file).resolve().parent))
+        self.names.update(m.arcname for m in members)
+        self.entries.extend(entries)
+        return entries
+
+    def append_archive(self, source_zip: str, prefix: str = '') -> List[Dict[str, typing.Any]]:
+        """Copy the members of ``source_zip``, their names prefixed by ``prefix``, as they are stored, without
+        recompressing them. Members whose name is already in the archive are skipped."""
+        manifest = {entry['name']: entry for entry in read_manifest(source_zip)}
+        entries = []
+        with zipfile.ZipFile(source_zip) as source, self._open() as zip_f:
+            for info in source.infolist():
+                arcname = prefix + info.filename
+                if info.filename == MANIFEST_NAME or arcname in self.names:
+                    continue
+                _copy_raw(zip_f, source, info, arcname)
+                self.names.add(arcname)
+                if not info.is_dir():
+                    entry = manifest.get(info.filename) or {'name': info.filename,
+                                                            'size': info.file_size,
+                                                            'compressed_size': info.compress_size,
+                                                            'crc32': f"{info.CRC:08x}",
+                                                            'sha256': None}
+                    entries.append(dict(entry, name=arcname))
+        self.entries.extend(entries)
+        return entries
+
+    def close(self, manifest: bool = True) -> List[Dict[str, typing.Any]]:
+        if manifest:
+            with self._open() as zip_f:
+                zip_f.writestr(MANIFEST_NAME, json.dumps({'members': self.entries}, indent=2))
+        return self.entries
+
+
+def read_manifest(zip_file: str) -> List[Dict[str, typing.Any]]:
+    """Return the manifest entries stored in an archive written by :func:`write_archive`."""
+    with zipfile.ZipFile(zip_file) as zip_f:
+        if MANIFEST_NAME not in zip_f.NameToInfo:
+            return []
+        return json.loads(zip_f.read(MANIFEST_NAME))['members']
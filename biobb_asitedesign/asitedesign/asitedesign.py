@@ -2,18 +2,48 @@
 
 """Module containing the TemplateContainer class and the command line interface."""
 import argparse
+import multiprocessing
 import os
 from pathlib import Path
 import shutil
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
 import zipfile
 
+from biobb_asitedesign.asitedesign import batch
+from biobb_asitedesign.asitedesign import checkpoint as ckpt
+from biobb_asitedesign.asitedesign import clustering
 from biobb_asitedesign.asitedesign import common as com
+from biobb_asitedesign.asitedesign import crop
+from biobb_asitedesign.asitedesign import early_stop
+from biobb_asitedesign.asitedesign import ensemble
+from biobb_asitedesign.asitedesign import hosts
+from biobb_asitedesign.asitedesign import instances
+from biobb_asitedesign.asitedesign import mpi
+from biobb_asitedesign.asitedesign import outputs
+from biobb_asitedesign.asitedesign import pose_store
+from biobb_asitedesign.asitedesign import preflight
+from biobb_asitedesign.asitedesign import profiling
+from biobb_asitedesign.asitedesign import result_cache as rc
+from biobb_asitedesign.asitedesign import results_index as ri
+from biobb_asitedesign.asitedesign import scratch
+from biobb_asitedesign.asitedesign import streaming
+from biobb_asitedesign.asitedesign import telemetry
+from biobb_asitedesign.asitedesign import warm_start
+from biobb_asitedesign.asitedesign.params_cache import ParamsCache
+from biobb_asitedesign.asitedesign.pdb_index import PDBIndex
+from biobb_asitedesign.asitedesign.preflight import ValidationReport
 from biobb_common.generic.biobb_object import BiobbObject
 from biobb_common.configuration import settings
 from biobb_common.tools import file_utils as fu
 from biobb_common.tools.file_utils import launchlogger
 
 
+# YAML entries with a property of the same name, and the attribute holding their value
+SAMPLING_PROPERTIES = {'nIterations': 'nIterations', 'nSteps': 'nSteps', 'nPoses': 'nPoses', 'Time': 'time'}
+
+
 # 1. Rename class as required
 class Asitedesign(BiobbObject):
     """
@@ -27,16 +57,70 @@ class Asitedesign(BiobbObject):
         params_zip (str): Path to the params folder. File type: input. Accepted formats: PARAMS (edam:format_).
         output_path (str): Path to the output file. File type: output. Accepted formats: zip (edam:format_3987).
         properties (dict):
-            * **cpus** (*int*) - (2) Number of cpus for the job.
+            * **cpus** (*int*) - (2) Number of MPI ranks for the job, or "auto" for one rank per pose plus the controller rank.
+            * **mpi_bind_to** (*str*) - ("core") Binding policy of the ranks given to mpirun --bind-to, "none" to leave them unbound.
+            * **mpi_map_by** (*str*) - (None) Mapping policy given to mpirun --map-by. Defaults to "numa" when the available cores span several NUMA nodes, else "core".
+            * **mpi_hosts** (*str*) - (None) Nodes to spread the MPI ranks over: "auto" for the SLURM (SLURM_JOB_NODELIST) or PBS (PBS_NODEFILE) allocation, a comma separated list of "host[:slots]" or a node file. With several nodes a hostfile is written in the sandbox and the container is started per rank. Only local and singularity runs, not compatible with warm_instances.
+            * **oversubscribe** (*str*) - ("clamp") What to do with more ranks than available cores (affinity mask and cgroup quota): "clamp" reduces the ranks, "warn" oversubscribes the cores and "error" raises. Values: clamp, warn, error.
             * **name** (*str*) - ('DesignCatalyticSite_job') Name of the job, which will be used for the output folders.
             * **DesignResidues** (*list*) - (None) List of residues that want to be mutable during the simulation.
             * **CatalyticResidues** (*list*) - (None) Specify the number of residues of the active site that wants to be added (RES1, RES2 ... RESN: H).
             * **Ligands** (*list*) - (None) 1-L (you have to specify the ligand by giving the residue number and the chain of the specific LIG). Also, the torsions that want to be excluded must be specified by the user ("ExcludedTorsions").
             * **Constraints** (*list*) - (None) Add the distance and sequence constraints that you want. The distance constraints should be added by passing two residues (with residue_number-chain) and two atoms (atomname) and to which values you want to constraint them (lb: value in angstroms, hb: value in angstroms).
-            * **nIterations** (*int*) - (2) Number of adaptive sampling epochs that want to be performed.
-            * **nSteps** (*int*) - (2) Number of steps performed in each epoch/iteration.
-            * **nPoses** (*int*) - (2) Number of final poses (mutants/designs) to be reported (each one given to a processor/CPU).
-            * **Time** (*int*) - (48) Time in the queue (if it's run in a cluster).
+            * **nIterations** (*int*) - (2) Number of adaptive sampling epochs that want to be performed. Overrides input_yaml when set.
+            * **nSteps** (*int*) - (2) Number of steps performed in each epoch/iteration. Overrides input_yaml when set.
+            * **nPoses** (*int*) - (2) Number of final poses (mutants/designs) to be reported (each one given to a processor/CPU). Overrides input_yaml when set.
+            * **Time** (*int*) - (48) Time in the queue (if it's run in a cluster). Overrides input_yaml when set.
+            * **seed** (*int*) - (None) Random seed of the run, written to the YAML as Seed.
+            * **replicas** (*int*) - (1) Number of independent replicas of the design run concurrently, each with its own seed (consecutive from seed), sandbox and share of cpus. Their final poses are merged, ranked and deduplicated by mutant sequence at DesignResidues into the final poses of the output zip, with the table ensemble.csv, and the replica outputs are packed below replica_<index>.
+            * **cluster** (*bool*) - (False) Deduplicate the final poses by their mutant sequence at DesignResidues and cluster the unique ones by the RMSD of the active site (design residue backbone and CB, ligand heavy atoms). The cluster representatives and the membership table clusters.csv are written to the "clusters" folder of the output zip.
+            * **cluster_rmsd** (*float*) - (1.0) RMSD cutoff (Angstroms) of the poses joining the cluster of a better scored representative.
+            * **cluster_max_poses** (*int*) - (None) Maximum number of best scored poses whose pairwise RMSD matrix is computed at once. The remaining poses are only compared with the cluster representatives.
+            * **cluster_epochs** (*bool*) - (False) Also cluster the spawned poses of every epoch, not only the final poses.
+            * **compress_level** (*int*) - (6) Deflate level (0-9) of the output zip members. 0 stores them uncompressed.
+            * **archive_workers** (*int*) - (None) Number of threads compressing the output zip members. Defaults to cpus.
+            * **compact_poses** (*bool*) - (False) Replace the PDB poses and trajectories of every epoch by one compressed poses.npz with their shared topologies and coordinates, read with biobb_asitedesign.asitedesign.pose_store.PoseStore. The final poses stay as PDB. Not applied with stream_output, whose epochs are packed while the job runs.
+            * **compact_poses_mode** (*str*) - ("delta") Coordinates of the compact poses: "delta" for integer milli-Angstrom deltas against the input PDB (lossless), "float32" for float32 coordinates. Values: delta, float32.
+            * **params_cache** (*bool*) - (True) Unpack params_zip once into a persistent cache keyed by the archive content.
+            * **params_cache_path** (*str*) - (None) Path of the params cache. Defaults to $XDG_CACHE_HOME/biobb_asitedesign/params.
+            * **params_cache_size** (*int*) - (1024) Maximum size of the params cache in MB. Least recently used entries are evicted.
+            * **result_cache** (*bool*) - (False) Return the cached output zip of a job with the same YAML, PDB, params, image and cpus instead of running it.
+            * **result_cache_path** (*str*) - (None) Path of the result cache. Defaults to $XDG_CACHE_HOME/biobb_asitedesign/results.
+            * **results_index** (*bool*) - (False) Add the final poses of the output zip (job hash, preset, RankingMetric and constraint scores, mutant sequence and zip member) to the cross-run SQLite index queried with "python -m biobb_asitedesign.asitedesign.results_index top".
+            * **results_index_path** (*str*) - (None) Path of the SQLite results index. Defaults to $XDG_CACHE_HOME/biobb_asitedesign/index/results.sqlite.
+            * **preflight** (*bool*) - (True) Check DesignResidues, Ligands and Constraints atoms against the input PDB before launching the job.
+            * **checkpoint** (*bool*) - (False) Copy every completed adaptive sampling epoch to checkpoint_path while the job runs.
+            * **checkpoint_path** (*str*) - (None) Persistent checkpoint folder. Defaults to the output path without extension plus "_checkpoint". Removed after a successful run if remove_tmp.
+            * **checkpoint_interval** (*int*) - (60) Seconds between checks for completed epochs.
+            * **resume** (*bool*) - (False) Continue from the last checkpointed epoch of the same job, seeded with its best spawned pose and running only the remaining nIterations. Implies checkpoint.
+            * **warm_start_from** (*str*) - (None) Output zip of a previous run to continue from: its best final poses are the starting structures instead of input_pdb (one per replica), its input.yaml is updated with the entries of input_yaml and its params files are used when params_zip does not exist. Set a lower nIterations in input_yaml for a refinement.
+            * **warm_start_top** (*int*) - (None) Number of best final poses of warm_start_from used as starting structures, assigned in turn to the replicas. Defaults to replicas.
+            * **telemetry** (*bool*) - (False) Sample the progress of the running job (epochs, steps/sec, poses written, best energy, per rank progress, ETA against Time) as JSON lines.
+            * **telemetry_path** (*str*) - (None) JSON lines file of the telemetry. Defaults to the output path without extension plus "_telemetry.jsonl".
+            * **telemetry_interval** (*int*) - (30) Seconds between telemetry samples.
+            * **telemetry_port** (*int*) - (None) Serve the latest sample on this local port, in Prometheus text format at /metrics and as JSON at /.
+            * **early_stop** (*bool*) - (False) Stop the run once the best and mean scores of the completed epochs (RankingMetric, or the SpawningMetricSteps metric of each epoch) improve less than early_stop_threshold for early_stop_patience epochs, or after early_stop_wall_time. The best poses of the completed epochs are then written as the final poses and the decision to early_stop.json.
+            * **early_stop_threshold** (*float*) - (0.5) Minimum score improvement of an epoch over the best previous ones.
+            * **early_stop_patience** (*int*) - (3) Consecutive epochs without improvement that stop the run.
+            * **early_stop_min_epochs** (*int*) - (3) Epochs always completed before stopping on convergence.
+            * **early_stop_wall_time** (*float*) - (None) Wall-clock budget of the run in hours, unlimited by default.
+            * **early_stop_interval** (*int*) - (30) Seconds between convergence checks.
+            * **stream_output** (*bool*) - (False) Pack every completed epoch while the job runs, so the final packaging only compresses the files written after the last one, and publish the packed epochs in the JSON index stream_index_path that downstream steps can poll.
+            * **stream_mode** (*str*) - ("archive") "archive" appends the epochs to the output zip, written as "<output_path>.part" until the job ends. "shards" writes one zip per epoch to stream_shards_path, copied into the output zip without recompressing at the end. Values: archive, shards.
+            * **stream_index_path** (*str*) - (None) JSON index of the packed epochs and final poses. Defaults to the output path without extension plus "_index.json".
+            * **stream_shards_path** (*str*) - (None) Folder of the per epoch zips of the shards mode. Defaults to the output path without extension plus "_shards". Removed after the output zip is written if remove_tmp.
+            * **stream_interval** (*int*) - (30) Seconds between checks for completed epochs.
+            * **profile** (*bool*) - (False) Record the wall/CPU time, peak RSS and I/O bytes of every phase of the launch (staging, params, YAML, run, archiving, cleanup) in a JSON report, also added to the output zip as profile.json.
+            * **profile_path** (*str*) - (None) Path of the JSON profiling report. Defaults to the output path without extension plus "_profile.json".
+            * **profile_python** (*bool*) - (False) Also dump the cProfile stats of the Python side of the launch next to the report, with extension ".prof".
+            * **warm_instances** (*bool*) - (False) Run the job through "exec" in a long-lived container instance ("singularity instance start" or "docker run -d") kept warm for the next jobs, instead of starting the container image for every job.
+            * **instance_pool_size** (*int*) - (2) Maximum number of idle warm instances kept per image.
+            * **instance_idle_timeout** (*int*) - (600) Seconds after which an idle warm instance is stopped.
+            * **instance_pool_path** (*str*) - (None) Folder of the state of the warm instance pool. Defaults to "$XDG_CACHE_HOME/biobb_asitedesign/instances".
+            * **crop_radius** (*float*) - (None) Keep only the whole residues within this distance (Angstroms) of the design residues, ligands and constrained residues. The residue mapping is written to crop_map.json.
+            * **scratch_path** (*str*) - (None) Node-local scratch or tmpfs folder for the sandbox, instead of sandbox_path: "auto" for $TMPDIR and then /dev/shm, or a comma separated list of candidate folders. The first one with enough free space is used, falling back to sandbox_path. The output zip is packed straight from the scratch sandbox. Ignored for multi-node launches.
+            * **scratch_min_free** (*float*) - (None) Free space (GB) a scratch folder needs to be used. Defaults to an estimate from the input PDB size, nPoses, nIterations, and nSteps with WriteALL.
+            * **scratch_copy_back** (*str*) - ("none") Copy of the scratch sandbox back to the folder it was staged in, before it is removed: "tar" for a single <sandbox>.tar file, "tree" for the folder itself. Values: none, tar, tree.
             * **remove_tmp** (*bool*) - (True) [WF property] Remove temporal files.
             * **restart** (*bool*) - (False) [WF property] Do not execute if output files exist.
             * **sandbox_path** (*str*) - ("./") [WF property] Parent path to the sandbox directory.
@@ -166,28 +250,17 @@ class Asitedesign(BiobbObject):
             'out': {'output_path': output_path}
         }
         self.input_yaml = input_yaml
-
-        # Get a list of the parameters files
-
-        self.params_files = []
-        if os.path.isdir(Path(params_zip)):
-            for root, dirs, files in os.walk(params_zip):
-                for file in files:
-                    if file.endswith('.params'):
-                        self.io_dict['in'][file] = os.path.join(root, file)
-                        self.params_files.append(os.path.join(root, file))
-        elif zipfile.is_zipfile(Path(params_zip)):
-            self.zip_directory = fu.create_unique_dir()
-            self.params_files = fu.unzip_list(params_zip, dest_dir=self.zip_directory)
-            for path in self.params_files:
-                self.io_dict['in'][Path(path).name] = path
-        else:
-            if os.path.exists(Path(params_zip)):
-                self.params_files = [params_zip]
+        self.params_zip = params_zip
 
         # 3. Include all relevant properties here as
         # Properties specific for BB
         self.cpus = properties.get('cpus', 1)
+        self.mpi_bind_to = properties.get('mpi_bind_to', 'core')
+        self.mpi_map_by = properties.get('mpi_map_by', None)
+        self.oversubscribe = properties.get('oversubscribe', 'clamp')
+        self.mpi_hosts = properties.get('mpi_hosts', None)
+        self.mpi_plan = None
+        self.multinode = False
         self.name = properties.get('name', None)
         self.designResidues = properties.get('DesignResidues', None)
         self.catalyticResidues = properties.get('CatalyticResidues', None)
@@ -197,6 +270,66 @@ class Asitedesign(BiobbObject):
         self.nSteps = properties.get('nSteps', 2)
         self.nPoses = properties.get('nPoses', 3)
         self.time = properties.get('Time', 48)
+        self.seed = properties.get('seed', None)
+        self.replicas = properties.get('replicas', 1)
+        self.cluster = properties.get('cluster', False)
+        self.cluster_rmsd = properties.get('cluster_rmsd', 1.0)
+        self.cluster_max_poses = properties.get('cluster_max_poses', None)
+        self.cluster_epochs = properties.get('cluster_epochs', False)
+        self.compress_level = properties.get('compress_level', 6)
+        self.archive_workers = properties.get('archive_workers', None)
+        self.compact_poses = properties.get('compact_poses', False)
+        self.compact_poses_mode = properties.get('compact_poses_mode', 'delta')
+        self.params_cache = properties.get('params_cache', True)
+        self.params_cache_path = properties.get('params_cache_path', None)
+        self.params_cache_size = properties.get('params_cache_size', 1024)
+        self.result_cache = properties.get('result_cache', False)
+        self.result_cache_path = properties.get('result_cache_path', None)
+        self.results_index = properties.get('results_index', False)
+        self.results_index_path = properties.get('results_index_path', None)
+        self.preflight = properties.get('preflight', True)
+        self.crop_radius = properties.get('crop_radius', None)
+        self.scratch_path = properties.get('scratch_path', None)
+        self.scratch_min_free = properties.get('scratch_min_free', None)
+        self.scratch_copy_back = properties.get('scratch_copy_back', 'none')
+        self.scratch_origin = None
+        self.checkpoint = properties.get('checkpoint', False)
+        self.checkpoint_path = properties.get('checkpoint_path', None)
+        self.checkpoint_interval = properties.get('checkpoint_interval', 60)
+        self.resume = properties.get('resume', False)
+        self.warm_start_from = properties.get('warm_start_from', None)
+        self.warm_start_top = properties.get('warm_start_top', None)
+        self.telemetry = properties.get('telemetry', False)
+        self.telemetry_path = properties.get('telemetry_path', None)
+        self.telemetry_interval = properties.get('telemetry_interval', 30)
+        self.telemetry_port = properties.get('telemetry_port', None)
+        self.early_stop = properties.get('early_stop', False)
+        self.early_stop_threshold = properties.get('early_stop_threshold', 0.5)
+        self.early_stop_patience = properties.get('early_stop_patience', 3)
+        self.early_stop_min_epochs = properties.get('early_stop_min_epochs', 3)
+        self.early_stop_wall_time = properties.get('early_stop_wall_time', None)
+        self.early_stop_interval = properties.get('early_stop_interval', 30)
+        self.convergence_monitor = None
+        self.stream_output = properties.get('stream_output', False)
+        self.stream_mode = properties.get('stream_mode', 'archive')
+        self.stream_index_path = properties.get('stream_index_path', None)
+        self.stream_shards_path = properties.get('stream_shards_path', None)
+        self.stream_interval = properties.get('stream_interval', 30)
+        self.stream_packager = None
+        self.profile = properties.get('profile', False)
+        self.profile_path = properties.get('profile_path', None)
+        self.profile_python = properties.get('profile_python', False)
+        self.profiler = profiling.PhaseProfiler(enabled=False)
+        self.warm_instances = properties.get('warm_instances', False)
+        self.instance_pool_size = properties.get('instance_pool_size', 2)
+        self.instance_idle_timeout = properties.get('instance_idle_timeout', 600)
+        self.instance_pool_path = properties.get('instance_pool_path', None)
+        self.instance_pool = None
+        self.epoch_checkpoint = None
+        self.first_epoch = 0
+        self.process_group: Optional[int] = None
+        self.result_digest = None
+        self.pdb_index = None
         self.container_path = properties.get('container_path', 'singularity')
         # self.container_image = properties.get('container_image', '/home/ubuntu/biobb/singularity/asitedesign.sif')
         self.container_image = properties.get('container_image', '/home/albertcs/GitHub/EAPM/AsiteDesign-container/asitedesign.sif')
@@ -206,38 +339,582 @@ class Asitedesign(BiobbObject):
         # self.container_shell_path = properties.get('container_shell_path', '/bin/bash')
         self.properties = properties
 
+        # Start from the best final poses, YAML and params files of a previous run
+        self.warm_start = None
+        if self.warm_start_from:
+            self.warm_start = self.prepare_warm_start()
+            params_zip = self.params_zip
+
+        # The sampling sizes of input_yaml, or of the preset, are kept unless they are given as properties
+        if self.input_yaml and os.path.isfile(self.input_yaml):
+            yaml_dict = com.layer_yaml(self.input_yaml, com.yaml_preset(self.simulation_type))
+            for key, attribute in SAMPLING_PROPERTIES.items():
+                if properties.get(key) is None and yaml_dict.get(key):
+                    setattr(self, attribute, yaml_dict[key])
+
+        # Get a list of the parameters files
+        self.params_files = []
+        if os.path.isdir(Path(params_zip)):
+            for root, dirs, files in os.walk(params_zip):
+                for file in files:
+                    if file.endswith('.params'):
+                        self.params_files.append(os.path.join(root, file))
+        elif zipfile.is_zipfile(Path(params_zip)):
+            if self.params_cache:
+                cache = ParamsCache(self.params_cache_path, self.params_cache_size * 1024 * 1024)
+                self.params_files = cache.get(params_zip)
+            else:
+                self.zip_directory = fu.create_unique_dir()
+                self.params_files = fu.unzip_list(params_zip, dest_dir=self.zip_directory)
+                self.tmp_files.append(self.zip_directory)
+        else:
+            if os.path.exists(Path(params_zip)):
+                self.params_files = [params_zip]
+
         # Check the properties
         self.check_properties(properties)
         # Check the arguments
         self.check_arguments()
 
-    @launchlogger
-    def launch(self) -> int:
-        """Execute the :class:`TemplateContainer <template.template_container.TemplateContainer>` object."""
+    def prepare_warm_start(self) -> warm_start.WarmStart:
+        """Replace input_pdb by the best final pose of warm_start_from, input_yaml by its YAML updated with
+        input_yaml, and params_zip by its params files if params_zip does not exist, see :mod:`warm_start`."""
+        directory = fu.create_unique_dir()
+        self.tmp_files.append(directory)
+        start = warm_start.prepare(self.warm_start_from, directory, self.warm_start_top or self.replicas, self.input_yaml)
+        self.io_dict['in']['input_pdb'] = str(start.poses[0])
+        self.input_yaml = start.yaml_path
+        if start.params_dir and not (self.params_zip and os.path.exists(self.params_zip)):
+            self.params_zip = start.params_dir
+        return start
+
+    def workflow_dict(self, input_pdb: str) -> Dict[str, Any]:
+        """Return the YAML entries set from the properties for a run on ``input_pdb``."""
+        return {'PDB': input_pdb,
+                'ParameterFiles': [f"{self.container_volume_path}/{Path(path).name}" for path in self.params_files],
+                'nPoses': self.nPoses,
+                'Name': self.name,
+                'DesignResidues': self.designResidues,
+                'CatalyticResidues': self.catalyticResidues,
+                'Ligands': self.ligands,
+                'Constraints': self.constraints,
+                'nIterations': self.nIterations,
+                'nSteps': self.nSteps,
+                'Time': self.time,
+                'Seed': self.seed,
+                'simulation_type': self.simulation_type
+                }
+
+    def merged_yaml(self) -> Dict[str, Any]:
+        """Return the AsiteDesign YAML of this job as it will be written in the sandbox."""
+        return com.merge_yaml(self.workflow_dict(self.io_dict['in']['input_pdb']),
+                              com.layer_yaml(self.input_yaml, com.yaml_preset(self.simulation_type)))
+
+    def validate(self) -> ValidationReport:
+        """Check the residues, ligands and constraint atoms of the job against the input PDB."""
+        if self.pdb_index is None:
+            self.pdb_index = PDBIndex.from_file(self.io_dict['in']['input_pdb'])
+        return preflight.validate(self.merged_yaml(), self.pdb_index)
+
+    def crop_input(self) -> Dict[str, Any]:
+        """Replace the staged input PDB by a copy cropped to the active site, see :func:`crop.crop_structure`."""
+        unique_dir = Path(self.stage_io_dict['unique_dir'])
+        input_pdb = self.io_dict['in']['input_pdb']
+        cropped_name = f"{Path(input_pdb).stem}_cropped.pdb"
+        if self.pdb_index is None:
+            self.pdb_index = PDBIndex.from_file(input_pdb)
+        yaml_dict = self.merged_yaml()
+
+        cutoffs = [float(options.get('NeighbourCutoff', 0)) for options in preflight.ligand_entries(yaml_dict.get('Ligands')).values()]
+        if cutoffs and self.crop_radius < max(cutoffs):
+            fu.log(f"WARNING: crop_radius {self.crop_radius} is smaller than the ligand NeighbourCutoff {max(cutoffs)}",
+                   self.out_log, self.global_log)
+
+        crop_map = crop.crop_structure(self.pdb_index, input_pdb, yaml_dict, self.crop_radius,
+                                       output_pdb_path=str(unique_dir.joinpath(cropped_name)),
+                                       map_path=str(unique_dir.joinpath('crop_map.json')))
+        self.stage_io_dict['in']['input_pdb'] = str(Path(self.stage_io_dict['in']['input_pdb']).with_name(cropped_name))
+        fu.log(f"Cropped {input_pdb} to {len(crop_map['residues'])} of {crop_map['n_residues']} residues "
+               f"within {self.crop_radius} A of the active site", self.out_log, self.global_log)
+        return crop_map
+
+    def stage_to_scratch(self) -> Optional[Path]:
+        """Move the staged sandbox to the first scratch folder with enough free space, see :mod:`scratch`.
+
+        Returns:
+            Path: The sandbox on scratch, or None if it was left in place.
+        """
+        if self.disable_sandbox:
+            fu.log("WARNING: scratch_path is ignored with disable_sandbox", self.out_log, self.global_log)
+            return None
+        if self.mpi_hosts and len(hosts.discover_nodes(self.mpi_hosts)) > 1:
+            fu.log("WARNING: scratch_path is ignored for multi-node launches, the ranks of the other nodes can not see it",
+                   self.out_log, self.global_log)
+            return None
+        if self.scratch_copy_back not in scratch.COPY_BACK_MODES:
+            raise ValueError(f"scratch_copy_back must be one of {', '.join(scratch.COPY_BACK_MODES)}, got {self.scratch_copy_back}")
+        if self.scratch_min_free:
+            required = int(float(self.scratch_min_free) * 1024 ** 3)
+        else:
+            yaml_dict = self.merged_yaml()
+            required = scratch.estimate_bytes(self.io_dict['in']['input_pdb'], yaml_dict.get('nPoses', self.nPoses),
+                                              yaml_dict.get('nIterations', self.nIterations), yaml_dict.get('nSteps', 1),
+                                              bool(yaml_dict.get('WriteALL')))
+        scratch_dir, messages = scratch.select_scratch(scratch.candidates(self.scratch_path), required)
+        for message in messages:
+            fu.log(message, self.out_log, self.global_log)
+        unique_dir = self.stage_io_dict['unique_dir']
+        if scratch_dir is None:
+            fu.log(f"WARNING: no scratch folder with {required / 1024 ** 3:.2f} GB free, running in {unique_dir}",
+                   self.out_log, self.global_log)
+            return None
+        self.scratch_origin = str(Path(unique_dir).parent)
+        new_dir = str(scratch.relocate(unique_dir, scratch_dir))
+        for io_type in ('in', 'out'):
+            for key, path in self.stage_io_dict[io_type].items():
+                if path and str(path).startswith(f"{unique_dir}/"):
+                    self.stage_io_dict[io_type][key] = new_dir + str(path)[len(unique_dir):]
+        self.stage_io_dict['unique_dir'] = new_dir
+        fu.log(f"Sandbox staged on scratch: {new_dir}", self.out_log, self.global_log)
+        return Path(new_dir)
+
+    def copy_back_scratch(self) -> Optional[Path]:
+        """Copy the scratch sandbox back to the folder it was staged in, as scratch_copy_back sets."""
+        unique_dir = self.stage_io_dict['unique_dir']
+        copy = scratch.copy_back(unique_dir, self.scratch_origin, self.scratch_copy_back)
+        if copy:
+            fu.log(f"Scratch sandbox copied back to {copy}", self.out_log, self.global_log)
+        elif not self.remove_tmp:
+            fu.log(f"WARNING: the sandbox is kept on scratch, {unique_dir}", self.out_log, self.global_log)
+        return copy
+
+    def resume_from_checkpoint(self) -> int:
+        """Seed the run with the best pose of the last checkpointed epoch and run only the remaining iterations.
+
+        Returns:
+            int: Global number of the first epoch of this run.
+        """
+        last_epoch = self.epoch_checkpoint.last_epoch
+        first_epoch = last_epoch + 1
+        remaining = self.nIterations - first_epoch
+        if remaining < 1:
+            fu.log(f"All {self.nIterations} epochs were checkpointed, running one more to report the final poses",
+                   self.out_log, self.global_log)
+            remaining = 1
+        seeds = self.epoch_checkpoint.seed_poses(self.merged_yaml().get('RankingMetric'))
+        if not seeds:
+            fu.log(f"No poses found in checkpointed epoch {last_epoch}, starting from the input PDB",
+                   self.out_log, self.global_log)
+            return 0
+        score, seed = seeds[0]
+        seed_name = f"resume_epoch_{last_epoch:04d}.pdb"
+        shutil.copy2(seed, Path(self.stage_io_dict['unique_dir']).joinpath(seed_name))
+        self.stage_io_dict['in']['input_pdb'] = str(Path(self.stage_io_dict['in']['input_pdb']).with_name(seed_name))
+        fu.log(f"Resuming after epoch {last_epoch} from {seed} (score {score}) with {remaining} remaining iterations",
+               self.out_log, self.global_log)
+        self.nIterations = remaining
+        return first_epoch
+
+    def telemetry_watchers(self) -> List[Any]:
+        """Return the progress monitor of the job and, if telemetry_port is set, its HTTP endpoint."""
+        metrics_path = self.telemetry_path or str(Path(self.io_dict['out']['output_path']).with_suffix('')) + '_telemetry.jsonl'
+        unique_dir = Path(self.stage_io_dict['unique_dir'])
+        monitor = telemetry.TelemetryMonitor(str(unique_dir), self.name, metrics_path, n_iterations=self.nIterations,
+                                             time_budget_hours=self.time,
+                                             log_paths=[str(unique_dir.joinpath('output.out')), str(Path.cwd().joinpath('output.out'))],
+                                             metric=self.merged_yaml().get('RankingMetric'),
+                                             interval=self.telemetry_interval, out_log=self.out_log)
+        fu.log(f"Writing progress telemetry to {metrics_path}", self.out_log, self.global_log)
+        watchers = [monitor]
+        if self.telemetry_port:
+            watchers.append(telemetry.MetricsServer(monitor, int(self.telemetry_port)))
+            fu.log(f"Serving progress metrics at http://127.0.0.1:{self.telemetry_port}/metrics", self.out_log, self.global_log)
+        return watchers
+
+    def use_warm_instance(self) -> None:
+        """Set up the warm instance pool, whose instances mount the parent of the sandbox, and point the
+        staged paths to the sandbox as seen from inside the instances."""
+        if self.mpi_hosts:
+            fu.log("WARNING: warm_instances is ignored for launches with mpi_hosts", self.out_log, self.global_log)
+            return
+        if not instances.container_runtime(self.container_path):
+            fu.log(f"WARNING: warm_instances requires singularity or docker, running {self.container_path or 'locally'}",
+                   self.out_log, self.global_log)
+            return
+        unique_dir = Path(self.stage_io_dict['unique_dir'])
+        self.instance_pool = instances.InstancePool(self.container_path, self.container_image, str(unique_dir.parent),
+                                                    self.instance_pool_path, max_idle=self.instance_pool_size,
+                                                    idle_timeout=self.instance_idle_timeout, out_log=self.out_log)
+        volume_path = f"{instances.INSTANCE_MOUNT}/{unique_dir.name}"
+        for io_type in ('in', 'out'):
+            for key, path in self.stage_io_dict[io_type].items():
+                if path and str(path).startswith(f"{self.container_volume_path}/"):
+                    self.stage_io_dict[io_type][key] = volume_path + str(path)[len(self.container_volume_path):]
+        self.container_volume_path = volume_path
+
+    def create_convergence_monitor(self) -> early_stop.ConvergenceMonitor:
+        """Return the monitor stopping the run on convergence or when its wall-clock budget is spent."""
+        yaml_dict = self.merged_yaml()
+        self.convergence_monitor = early_stop.ConvergenceMonitor(
+            self.stage_io_dict['unique_dir'], self.name, self.nIterations, on_stop=self.stop_run,
+            metric=yaml_dict.get('RankingMetric'), spawning_steps=yaml_dict.get('SpawningMetricSteps'),
+            threshold=self.early_stop_threshold, patience=self.early_stop_patience, min_epochs=self.early_stop_min_epochs,
+            wall_budget=self.early_stop_wall_time * 3600 if self.early_stop_wall_time else None,
+            interval=self.early_stop_interval, out_log=self.out_log)
+        return self.convergence_monitor
+
+    def stop_run(self, reason: str) -> None:
+        """Terminate the process group of the running command, see :meth:`execute_command`.
+
+        Only the command is signalled: other children of this process, e.g. those of a host
+        application running several jobs, are left alone.
+        """
+        fu.log(f"Stopping the run early, {reason}", self.out_log, self.global_log)
+        if self.process_group:
+            early_stop.terminate_process_group(self.process_group)
+
+    def finish_early_stop(self) -> None:
+        """Report the final poses of a run stopped early and write the early stopping report to the sandbox."""
+        unique_dir = self.stage_io_dict['unique_dir']
+        if self.convergence_monitor.reason:
+            self.return_code = 0
+            written = early_stop.package_best_poses(unique_dir, self.name, self.nPoses,
+                                                    self.merged_yaml().get('RankingMetric'))
+            fu.log(f"Run stopped early ({self.convergence_monitor.reason}), {len(written)} best poses written as final poses",
+                   self.out_log, self.global_log)
+        early_stop.write_report(self.convergence_monitor, str(Path(unique_dir).joinpath('early_stop.json')))
+
+    def create_stream_packager(self) -> streaming.StreamingPackager:
+        """Return the thread packing the completed epochs into the output zip, or its shards, while the job runs."""
+        output_stem = str(Path(self.io_dict['out']['output_path']).with_suffix(''))
+        index_path = self.stream_index_path or output_stem + '_index.json'
+        self.stream_packager = streaming.StreamingPackager(
+            self.stage_io_dict['unique_dir'], self.name, self.io_dict['out']['output_path'], index_path,
+            mode=self.stream_mode, shards_path=self.stream_shards_path or output_stem + '_shards',
+            compress_level=self.compress_level, interval=self.stream_interval, out_log=self.out_log)
+        fu.log(f"Packing the completed epochs while the job runs, index at {index_path}", self.out_log, self.global_log)
+        return self.stream_packager
+
+    def compact_epochs(self, root: str) -> List[Path]:
+        """Store the poses of every epoch of the job in ``root`` in a compact poses.npz (see :mod:`pose_store`)."""
+        reference = self.stage_io_dict['in'].get('input_pdb')
+        stores = []
+        for _, folder in outputs.epoch_dirs(root, self.name):
+            store, skipped = pose_store.compact_folder(str(folder), self.compact_poses_mode,
+                                                       reference if reference and Path(reference).is_file() else None)
+            if store:
+                stores.append(store)
+            if skipped:
+                fu.log(f"WARNING: {len(skipped)} poses of {folder.name} kept as PDB, they do not round-trip", self.out_log, self.global_log)
+        if stores:
+            size = sum(store.stat().st_size for store in stores)
+            fu.log(f"Compacted the poses of {len(stores)} epochs into {size / 2 ** 20:.1f} MB", self.out_log, self.global_log)
+        return stores
+
+    def cluster_designs(self, root: str) -> List[clustering.ClusterMember]:
+        """Cluster the final poses of the job in ``root`` (and its epoch poses with cluster_epochs) into
+        ``<root>/clusters``, see :mod:`clustering`."""
+        yaml_dict = self.merged_yaml()
+        paths = outputs.pose_files(outputs.final_pose_dir(root, yaml_dict['Name']))
+        if self.cluster_epochs:
+            paths.extend(pose for _, epoch_dir in outputs.epoch_dirs(root, yaml_dict['Name'])
+                         for pose in outputs.pose_files(epoch_dir))
+        members = clustering.cluster_poses(paths, yaml_dict, cutoff=self.cluster_rmsd, metric=yaml_dict.get('RankingMetric'),
+                                           max_matrix=self.cluster_max_poses, root=root)
+        representatives = clustering.write_clusters(members, root, str(Path(root).joinpath('clusters')))
+        fu.log(f"Clustered {len(members)} poses, {len({member.sequence_hash for member in members})} unique sequences, "
+               f"into {len(representatives)} clusters within {self.cluster_rmsd} A", self.out_log, self.global_log)
+        return members
+
+    def mpi_command(self, program: str) -> str:
+        """Return the mpirun command line of ``program``, sized by :func:`mpi.plan_mpi`.
+
+        When mpi_hosts resolves to several nodes, the ranks are spread over them with a hostfile
+        written in the sandbox, and mpirun runs on the host starting one container per rank.
+        """
+        nodes = hosts.discover_nodes(self.mpi_hosts) if self.mpi_hosts else []
+        if len(nodes) < 2:
+            self.mpi_plan = mpi.plan_mpi(self.cpus, self.nPoses, bind_to=self.mpi_bind_to, map_by=self.mpi_map_by,
+                                         oversubscribe=self.oversubscribe)
+            for message in self.mpi_plan.messages:
+                fu.log(message, self.out_log, self.global_log)
+            return self.mpi_plan.command(program)
+
+        runtime = instances.container_runtime(self.container_path)
+        if runtime == 'docker':
+            raise ValueError("Multi-node launches support local and singularity runs, not docker")
+        self.mpi_plan = mpi.plan_mpi(self.cpus, self.nPoses, available=sum(node.slots for node in nodes), numa={},
+                                     bind_to=self.mpi_bind_to, map_by=self.mpi_map_by or 'slot',
+                                     oversubscribe=self.oversubscribe)
+        for message in self.mpi_plan.messages:
+            fu.log(message, self.out_log, self.global_log)
+        unique_dir = Path(self.stage_io_dict['unique_dir'])
+        assignment = hosts.distribute_ranks(nodes, self.mpi_plan.ranks)
+        hostfile = hosts.write_hostfile(assignment, str(unique_dir.joinpath('hostfile')))
+        fu.log(f"Spreading {self.mpi_plan.ranks} MPI ranks over {len(assignment)} nodes: "
+               f"{', '.join(f'{node.host}:{node.slots}' for node in assignment)}", self.out_log, self.global_log)
+        if runtime == 'singularity':
+            program = f"{self.container_path} exec --bind {unique_dir}:{self.container_volume_path} {self.container_image} {program}"
+        self.multinode = True
+        plan = self.mpi_plan._replace(options=['--hostfile', hostfile] + self.mpi_plan.options)
+        return f"cd {unique_dir} && {plan.command(program)}"
+
+    def prepare_command(self) -> Optional[instances.ContainerInstance]:
+        """Build the final command line: as is for multi-node runs, in a warm container instance if enabled,
+        or through the standard biobb command line.
+
+        Returns:
+            The warm container instance acquired for the command, to give back with :meth:`release_command`.
+        """
+        if self.multinode:
+            # mpirun starts the containers itself, the command must not be wrapped in one
+            return None
+        if not self.instance_pool:
+            self.create_cmd_line()
+            return None
+        instance = self.instance_pool.acquire()
+        try:
+            self.cmd = instance.exec_command(' '.join(self.cmd), self.container_volume_path, self.env_vars_dict)
+        except BaseException:
+            self.release_command(instance)
+            raise
+        fu.log(f"Running in warm container instance {instance.name}", self.out_log, self.global_log)
+        return instance
+
+    def release_command(self, instance: Optional[instances.ContainerInstance]) -> None:
+        if instance:
+            self.instance_pool.release(instance)
+            self.instance_pool.schedule_reaper()
+
+    def execute_command(self) -> None:
+        """Run the command line the way :class:`CmdWrapper` does, in its own session: the process group
+        started by the command (mpirun and its ranks) is ``self.process_group`` while it runs."""
+        cmd = ' '.join(self.cmd)
+        cwd = self.stage_io_dict['unique_dir'] if self.chdir_sandbox else os.getcwd()
+        fu.log(cmd, self.out_log)
+        process = subprocess.Popen(cmd, shell=True, cwd=cwd, executable=self.shell_path,
+                                   env=dict(os.environ, **(self.env_vars_dict or {})), stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, universal_newlines=True, start_new_session=True)
+        self.process_group = process.pid
+        try:
+            stdout, stderr = process.communicate()
+        except BaseException:
+            # Interrupted: do not leave the ranks running
+            early_stop.terminate_process_group(process.pid, grace=5)
+            raise
+        finally:
+            self.process_group = None
+        self.return_code = process.returncode
+        fu.log(f"Exit code {self.return_code}", self.out_log)
+        if stdout:
+            fu.log(stdout, self.out_log)
+        if stderr:
+            fu.log(stderr, self.err_log)
+        fu.log(f"Executing: {cmd[0:80]}...", self.global_log)
+        fu.log(f"Exit code {self.return_code}", self.global_log)
+
+    def run_command(self) -> None:
+        """Run the command built by :meth:`prepare_command`."""
+        instance = self.prepare_command()
+        try:
+            self.execute_command()
+        finally:
+            self.release_command(instance)
+
+    def write_profile(self) -> Dict[str, Any]:
+        """Write the profiling report next to the output and add it to the output zip as profile.json."""
+        report_path = self.profile_path or str(Path(self.io_dict['out']['output_path']).with_suffix('')) + '_profile.json'
+        profile_path = str(Path(report_path).with_suffix('.prof')) if self.profile_python else None
+        report = self.profiler.write(report_path, profile_path)
+        if zipfile.is_zipfile(self.io_dict['out']['output_path']):
+            with zipfile.ZipFile(self.io_dict['out']['output_path'], 'a', compression=zipfile.ZIP_DEFLATED) as zip_file:
+                zip_file.write(report_path, 'profile.json')
+        fu.log(f"Profiling report written to {report_path}", self.out_log, self.global_log)
+        return report
+
+    def job_digest(self) -> str:
+        """Return the result cache key of this job, see :func:`result_cache.job_digest`."""
+        input_pdb = self.io_dict['in']['input_pdb']
+        yaml_dict = self.merged_yaml()
+        # Properties changing the run or its output zip, only when set so that plain jobs keep their keys
+        extra = {'cpus': self.cpus}
+        if self.replicas > 1:
+            extra['replicas'] = self.replicas
+        if self.crop_radius:
+            # AsiteDesign runs on the cropped structure
+            extra['crop_radius'] = self.crop_radius
+        if self.early_stop:
+            # A run cut short is not the full-length result
+            extra['early_stop'] = {'threshold': self.early_stop_threshold, 'patience': self.early_stop_patience,
+                                   'min_epochs': self.early_stop_min_epochs, 'wall_time': self.early_stop_wall_time}
+        if self.cluster:
+            extra['cluster'] = {'rmsd': self.cluster_rmsd, 'max_poses': self.cluster_max_poses,
+                                'epochs': self.cluster_epochs}
+        if self.compact_poses:
+            # NPZ pose stores instead of PDB files
+            extra['compact_poses'] = self.compact_poses_mode
+        return rc.job_digest(yaml_dict, input_pdb, self.params_files,
+                             rc.container_identity(self.container_path, self.container_image), extra=extra)
+
+    def index_results(self) -> int:
+        """Add the final poses of the output zip to the results index, see :mod:`results_index`."""
+        with ri.ResultsIndex(self.results_index_path) as index:
+            count = index.add_zip(self.io_dict['out']['output_path'], job_hash=self.result_digest,
+                                  preset=self.simulation_type, force=True)
+            fu.log(f"Indexed {count} final poses in {index.index_path}", self.out_log, self.global_log)
+        return count
+
+    def launch_ensemble(self) -> int:
+        """Run the replicas of the design concurrently, each as an Asitedesign job in its own folder of the
+        sandbox, and pack their merged final poses with the replica outputs, see :mod:`ensemble`."""
+        self.profiler.phase('stage_files')
+        self.stage_files()
+        unique_dir = Path(self.stage_io_dict['unique_dir']).resolve()
+        yaml_dict = self.merged_yaml()
+        if self.mpi_hosts:
+            fu.log("WARNING: mpi_hosts is ignored for the replicas, they run on the local node", self.out_log, self.global_log)
+
+        seeds = ensemble.replica_seeds(self.seed, self.replicas)
+        files = {'input_pdb': os.path.abspath(self.io_dict['in']['input_pdb']),
+                 'input_yaml': os.path.abspath(self.input_yaml),
+                 'params_zip': os.path.abspath(self.params_zip)}
+        jobs = []
+        for index, (cpus, seed) in enumerate(zip(ensemble.replica_cpus(self.cpus, self.replicas), seeds)):
+            job_id = f"replica_{index}"
+            if self.warm_start:
+                files = dict(files, input_pdb=os.path.abspath(self.warm_start.poses[index % len(self.warm_start.poses)]))
+            jobs.append(batch.BatchJob(job_id=job_id, files=files,
+                                       properties=ensemble.replica_properties(self.properties, index, cpus, seed),
+                                       cpus=mpi.requested_ranks(cpus, self.nPoses),
+                                       output_path=str(unique_dir.joinpath('replicas', job_id, f"{job_id}.zip"))))
+        fu.log(f"Running {self.replicas} replicas with seeds {', '.join(map(str, seeds))} on "
+               f"{', '.join(str(job.cpus) for job in jobs)} cpus", self.out_log, self.global_log)
+
+        self.profiler.phase('run')
+        batch.run_jobs(jobs, launch=_start_replica, max_cpus=sum(job.cpus for job in jobs),
+                       succeeded=lambda job: job.return_code == 0 and Path(job.output_path).exists(),
+                       max_retries=0, poll_interval=1.0, out_log=self.out_log)
+        done = {index: job.output_path for index, job in enumerate(jobs) if job.status == 'done'}
+        if len(done) < len(jobs):
+            fu.log(f"WARNING: replicas not completed: {', '.join(job.job_id for job in jobs if job.status != 'done')}",
+                   self.out_log, self.global_log)
+        self.return_code = 0 if done else 1
+
+        if done:
+            self.profiler.phase('merge')
+            replica_poses = {}
+            for index, replica_zip in done.items():
+                poses_dir = Path(replica_zip).parent.joinpath('final_poses')
+                poses_dir.mkdir(exist_ok=True)
+                replica_poses[index] = ensemble.extract_final_poses(replica_zip, str(poses_dir))
+            final_dir = outputs.final_pose_dir(unique_dir, yaml_dict['Name'])
+            merged = ensemble.merge_final_poses(replica_poses, seeds, str(final_dir),
+                                                outputs.design_keys(yaml_dict.get('DesignResidues')),
+                                                yaml_dict.get('RankingMetric'))
+            table = ensemble.write_table(merged, str(unique_dir.joinpath('ensemble.csv')))
+            fu.log(f"Merged {sum(len(poses) for poses in replica_poses.values())} final poses of {len(done)} replicas "
+                   f"into {len(merged)} unique designs", self.out_log, self.global_log)
+            file_list = [str(final_dir), table]
+            if self.cluster:
+                self.profiler.phase('cluster')
+                self.cluster_designs(str(unique_dir))
+                file_list.append(str(unique_dir.joinpath('clusters')))
+
+            self.profiler.phase('archive')
+            ensemble.package_ensemble(self.io_dict['out']['output_path'], str(unique_dir), file_list, done,
+                                      compress_level=self.compress_level, workers=self.archive_workers)
+
+        self.tmp_files.append(self.stage_io_dict.get('unique_dir'))
+        self.profiler.phase('cleanup')
+        self.remove_tmp_files()
+        self.profiler.finish()
+        if self.profile:
+            self.write_profile()
+
+        self.check_arguments(output_files_created=True, raise_exception=False)
+
+        if self.result_cache and self.return_code == 0:
+            rc.ResultCache(self.result_cache_path).store(self.result_digest, self.io_dict['out']['output_path'],
+                                                         metadata={'input_pdb': self.io_dict['in']['input_pdb'],
+                                                                   'name': yaml_dict['Name'], 'replicas': self.replicas})
+        if self.results_index and self.return_code == 0:
+            self.index_results()
+        return self.return_code
+
+    def prepare_launch(self) -> Optional[int]:
+        """Run the phases of :meth:`launch` before the command: checks, staging and command line.
+
+        Returns:
+            int: Return code of a launch completed here (restart, result cache hit or ensemble), else None.
+        """
 
         # 4. Setup Biobb
         if self.check_restart():
             return 0
+
+        self.profiler = profiling.PhaseProfiler(enabled=self.profile, python_profile=self.profile_python)
+        if self.warm_start:
+            fu.log(f"Warm start from the {len(self.warm_start.poses)} best final poses of {self.warm_start.source} "
+                   f"(scores {', '.join(map(str, self.warm_start.scores))})", self.out_log, self.global_log)
+
+        # Fail fast on inputs that AsiteDesign would only reject after the job has started
+        if self.preflight:
+            self.profiler.phase('preflight')
+            report = self.validate()
+            fu.log(str(report), self.out_log, self.global_log)
+            if not report.ok:
+                raise ValueError(str(report))
+
+        # Reuse the output of an identical job that was already computed
+        if self.result_cache:
+            self.profiler.phase('result_cache')
+            result_cache = rc.ResultCache(self.result_cache_path)
+            self.result_digest = self.job_digest()
+            if result_cache.fetch(self.result_digest, self.io_dict['out']['output_path']):
+                fu.log(f"Result cache hit: {self.result_digest}, this step will be skipped", self.out_log, self.global_log)
+                if self.results_index:
+                    self.index_results()
+                return 0
+        if self.results_index and not self.result_digest:
+            # The extracted params files are removed with the sandbox, before the job is indexed
+            self.result_digest = self.job_digest()
+
+        if self.replicas > 1:
+            return self.launch_ensemble()
+
+        self.profiler.phase('stage_files')
         self.stage_files()
+        if self.scratch_path:
+            self.stage_to_scratch()
+        if self.warm_instances:
+            self.use_warm_instance()
+        if not self.container_path:
+            # A local run reads the files staged in the sandbox, not a container volume
+            self.container_volume_path = self.stage_io_dict['unique_dir']
 
-        # Copy params files to the unique directory
+        # Link params files into the unique directory, symlinks are not visible from a container
+        self.profiler.phase('params')
         for path in self.params_files:
-            shutil.copy(path, self.stage_io_dict['unique_dir'])
+            com.link_or_copy(path, self.stage_io_dict['unique_dir'], allow_symlink=not self.container_path)
+
+        # Trim the input structure to the residues around the active site
+        if self.crop_radius:
+            self.profiler.phase('crop')
+            self.crop_input()
+
+        # Persist the completed epochs and resume after the last one checkpointed
+        self.first_epoch = 0
+        if self.checkpoint or self.resume:
+            self.profiler.phase('checkpoint')
+            checkpoint_path = self.checkpoint_path or str(Path(self.io_dict['out']['output_path']).with_suffix('')) + '_checkpoint'
+            self.epoch_checkpoint = ckpt.EpochCheckpoint(checkpoint_path, self.result_digest or self.job_digest())
+            if self.resume and self.epoch_checkpoint.last_epoch is not None:
+                self.first_epoch = self.resume_from_checkpoint()
+            self.epoch_checkpoint.start_segment(self.first_epoch, self.nIterations)
 
         # Dict with the yaml properties form properties
-        workflow_dict = {'PDB': self.stage_io_dict['in']['input_pdb'],
-                         'ParameterFiles': [f"{self.container_volume_path}/{Path(path).name}" for path in self.params_files],
-                         'nPoses': self.nPoses,
-                         'Name': self.name,
-                         'DesignResidues': self.designResidues,
-                         'CatalyticResidues': self.catalyticResidues,
-                         'Ligands': self.ligands,
-                         'Constraints': self.constraints,
-                         'nIterations': self.nIterations,
-                         'nSteps': self.nSteps,
-                         'Time': self.time,
-                         'simulation_type': self.simulation_type
-                         }
+        self.profiler.phase('create_yaml')
+        workflow_dict = self.workflow_dict(self.stage_io_dict['in']['input_pdb'])
 
         self.input_yaml_path_final, self.name = com.create_yaml(output_yaml_path=str(Path(self.stage_io_dict['unique_dir']).joinpath('input.yaml')),
                                                                 workflow_dict=workflow_dict,
@@ -253,7 +930,7 @@ class Asitedesign(BiobbObject):
         # if self.cpus:
         #    self.container_path = f"mpirun -n {self.cpus} " + self.container_path
 
-        self.cmd = [f"mpirun -n {self.cpus} python -m ActiveSiteDesign"]
+        self.cmd = [self.mpi_command("python -m ActiveSiteDesign")]
         if self.input_yaml_path_final:
             self.cmd.append(f"{self.stage_io_dict['in']['input_yaml']}")
 
@@ -261,17 +938,58 @@ class Asitedesign(BiobbObject):
 
         fu.log("Creating command line with instructions and required arguments", self.out_log, self.global_log)
         print(self.cmd)
+        return None
+
+    def start_watchers(self) -> List[Any]:
+        """Start the background watchers of the output folders of the running job."""
+        watchers: List[Any] = []
+        if self.epoch_checkpoint:
+            watchers.append(ckpt.CheckpointSyncer(self.epoch_checkpoint, self.stage_io_dict['unique_dir'], self.name,
+                                                  epoch_offset=self.first_epoch, interval=self.checkpoint_interval,
+                                                  out_log=self.out_log))
+        if self.telemetry:
+            watchers.extend(self.telemetry_watchers())
+        if self.early_stop:
+            watchers.append(self.create_convergence_monitor())
+        if self.stream_output:
+            watchers.append(self.create_stream_packager())
+        self.profiler.phase('run')
+        for watcher in watchers:
+            watcher.start()
+        return watchers
+
+    @staticmethod
+    def stop_watchers(watchers: List[Any]) -> None:
+        for watcher in reversed(watchers):
+            watcher.stop()
 
-        # Run Biobb block
-        self.run_biobb()
+    def finish_launch(self) -> int:
+        """Run the phases of :meth:`launch` after the command: final poses, packaging, cleanup and result cache."""
+        if self.convergence_monitor:
+            self.finish_early_stop()
+        if self.cluster:
+            self.profiler.phase('cluster')
+            self.cluster_designs(self.stage_io_dict['unique_dir'])
+        if self.compact_poses and not self.stream_packager:
+            self.profiler.phase('compact')
+            self.compact_epochs(self.stage_io_dict['unique_dir'])
 
         # Make zip file
+        self.profiler.phase('archive')
         list_to_zip = []
-        list_to_zip.append(os.path.basename(self.stage_io_dict.get('unique_dir')))
+        list_to_zip.append(self.stage_io_dict.get('unique_dir'))
+        if self.first_epoch:
+            # Epochs of the previous runs only exist in the checkpoint
+            list_to_zip.append(str(self.epoch_checkpoint.epochs_dir))
         # list_to_zip.append(f"{self.name}_final_pose")
         # list_to_zip.append(f"{self.name}_output")
         # list_to_zip.append("output.out")
-        com.zip_list(self.io_dict['out']['output_path'], list_to_zip, self.out_log)
+        if self.stream_packager:
+            self.stream_packager.finish(list_to_zip, workers=self.archive_workers or self.mpi_plan.ranks,
+                                        remove_shards=self.remove_tmp)
+        else:
+            com.zip_list(self.io_dict['out']['output_path'], list_to_zip, self.out_log,
+                         compress_level=self.compress_level, workers=self.archive_workers or self.mpi_plan.ranks)
 
         # Remove temporary file(s)
         self.tmp_files.extend([
@@ -281,13 +999,62 @@ class Asitedesign(BiobbObject):
         # self.tmp_files.append(f"{self.name}_output")
         # self.tmp_files.append("output.out")
         # self.tmp_files.extend(self.params_files)
+        if self.epoch_checkpoint and self.return_code == 0:
+            self.tmp_files.append(str(self.epoch_checkpoint.path))
+        if self.scratch_origin:
+            self.profiler.phase('copy_back')
+            self.copy_back_scratch()
+        self.profiler.phase('cleanup')
         self.remove_tmp_files()
+        self.profiler.finish()
+
+        if self.profile:
+            self.write_profile()
 
         # Check output arguments
         self.check_arguments(output_files_created=True, raise_exception=False)
 
+        if self.result_cache and self.return_code == 0:
+            rc.ResultCache(self.result_cache_path).store(self.result_digest, self.io_dict['out']['output_path'],
+                                                         metadata={'input_pdb': self.io_dict['in']['input_pdb'], 'name': self.name})
+        if self.results_index and self.return_code == 0:
+            self.index_results()
+
         return self.return_code
 
+    @launchlogger
+    def launch(self) -> int:
+        """Execute the :class:`Asitedesign <asitedesign.asitedesign.Asitedesign>` object."""
+        return_code = self.prepare_launch()
+        if return_code is not None:
+            return return_code
+
+        # Run Biobb block, with the background watchers of the output folders
+        watchers = self.start_watchers()
+        try:
+            self.run_command()
+        finally:
+            self.stop_watchers(watchers)
+        return self.finish_launch()
+
+
+def _start_replica(job: batch.BatchJob) -> batch.ProcessHandle:
+    job_dir = Path(job.output_path).parent
+    job_dir.mkdir(parents=True, exist_ok=True)
+    process = multiprocessing.Process(target=_run_replica, name=job.job_id,
+                                      args=(str(job_dir), job.files, job.output_path, job.properties))
+    process.start()
+    return batch.ProcessHandle(process)
+
+
+def _run_replica(job_dir: str, files: dict, output_path: str, properties: dict) -> None:
+    """Run one replica inside ``job_dir`` so logs and sandboxes of the replicas do not mix."""
+    os.chdir(job_dir)
+    return_code = asitedesign(input_pdb=files['input_pdb'], input_yaml=files['input_yaml'],
+                              params_zip=files['params_zip'], output_path=output_path,
+                              properties=properties)
+    sys.exit(return_code or 0)
+
 
 def asitedesign(input_pdb: str, input_yaml: str, params_zip: str, output_path: str,
                 properties: dict = None, **kwargs) -> int:
@@ -317,11 +1084,22 @@ def main():
                                help='Path to the yaml file')
     required_args.add_argument('--output_path', required=True,
                                help='Path for the output file.')
+    parser.add_argument('--validate-only', action='store_true',
+                        help='Only run the pre-flight validation of the inputs and exit with 1 if it finds errors.')
 
     args = parser.parse_args()
     config = args.config if args.config else None
     properties = settings.ConfReader(config=config).get_prop_dic()
 
+    if args.validate_only:
+        report = Asitedesign(input_pdb=args.input_pdb,
+                             input_yaml=args.input_yaml,
+                             params_zip=args.params_zip,
+                             output_path=args.output_path,
+                             properties=properties).validate()
+        print(report)
+        sys.exit(0 if report.ok else 1)
+
     # 11. Adapt to match Class constructor (step 2)
     # Specific call of each building block
     asitedesign(input_pdb=args.input_pdb,
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+
+"""Module containing the asyncio API of the Asitedesign building block."""
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+import functools
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from biobb_asitedesign.asitedesign import aio
+from biobb_asitedesign.asitedesign import batch
+from biobb_asitedesign.asitedesign import mpi
+from biobb_asitedesign.asitedesign.asitedesign import Asitedesign
+from biobb_common.tools import file_utils as fu
+
+
+async def run_async(job: Asitedesign, timeout: Optional[float] = None, on_output: Optional[aio.OutputCallback] = None,
+                    executor: Optional[Executor] = None, grace: float = 30, poll_interval: float = 0.5) -> int:
+    """Execute the :meth:`launch() <asitedesign.asitedesign.Asitedesign.launch>` phases of ``job`` without blocking the event loop.
+
+    The file handling phases run in ``executor`` (default: the loop's one) and the command as an
+    asyncio subprocess in its own process group. Its output.out and stderr lines are passed to
+    ``on_output`` while it runs. On cancellation or after ``timeout`` seconds the process group is
+    terminated (SIGTERM, then SIGKILL after ``grace`` seconds), the watchers are stopped, the
+    sandbox is removed and the :class:`asyncio.CancelledError` or :class:`asyncio.TimeoutError`
+    is raised. Ensembles (replicas > 1) run their replicas as processes from the executor and are
+    not cancellable once started.
+
+    Commands run in warm docker instances are only stopped on the client side: ``docker exec``
+    does not forward signals to the process it started in the container.
+    """
+    loop = asyncio.get_event_loop()
+
+    def blocking(function: Callable, *args) -> Any:
+        return loop.run_in_executor(executor, functools.partial(function, *args))
+
+    # Same log setup and teardown as the launchlogger decorator of launch()
+    job.out_log, job.err_log = fu.get_logs(path=job.path, prefix=job.prefix, step=job.step,
+                                           can_write_console=job.can_write_console_log)
+    try:
+        return_code = await blocking(job.prepare_launch)
+        if return_code is not None:
+            return return_code
+        instance = await blocking(job.prepare_command)
+        try:
+            watchers = await blocking(job.start_watchers)
+            try:
+                result = await asyncio.wait_for(_run_command(job, on_output, grace, poll_interval), timeout)
+            except BaseException:
+                job.return_code = None
+                job.process_group = None
+                await blocking(job.stop_watchers, watchers)
+                await blocking(_discard_outputs, job)
+                raise
+            await blocking(job.stop_watchers, watchers)
+        finally:
+            await blocking(job.release_command, instance)
+        job.return_code = result.return_code
+        return await blocking(job.finish_launch)
+    finally:
+        for logger in (job.out_log, job.err_log):
+            for handler in logger.handlers[:]:
+                handler.close()
+                logger.removeHandler(handler)
+
+
+async def _run_command(job: Asitedesign, on_output: Optional[aio.OutputCallback], grace: float,
+                       poll_interval: float) -> aio.ShellResult:
+    """Run the command of ``job`` the way :class:`CmdWrapper` does, in the sandbox with chdir_sandbox."""
+    cmd = ' '.join(job.cmd)
+    cwd = job.stage_io_dict['unique_dir'] if job.chdir_sandbox else os.getcwd()
+    job.out_log.info(cmd + '\n')
+
+    def started(process: asyncio.subprocess.Process) -> None:
+        job.process_group = process.pid
+
+    try:
+        result = await aio.run_shell(cmd, cwd=cwd, env=job.env_vars_dict, shell_path=job.shell_path, on_output=on_output,
+                                     log_paths=[str(Path(cwd).joinpath('output.out'))], grace=grace,
+                                     poll_interval=poll_interval, on_start=started)
+    finally:
+        job.process_group = None
+    job.out_log.info(f"Exit code {result.return_code}\n")
+    if result.stdout:
+        job.out_log.info(result.stdout)
+    if result.stderr:
+        job.err_log.info(result.stderr)
+    fu.log(f"Executing: {cmd[0:80]}...", job.global_log)
+    fu.log(f"Exit code {result.return_code}", job.global_log)
+    return result
+
+
+def _discard_outputs(job: Asitedesign) -> None:
+    """Remove the sandbox and partial output of a cancelled job."""
+    job.tmp_files.append(job.stage_io_dict.get('unique_dir'))
+    if job.stream_packager:
+        job.tmp_files.append(job.io_dict['out']['output_path'] + '.part')
+    job.remove_tmp_files()
+    fu.log("Job cancelled, its sandbox was removed", job.out_log, job.global_log)
+
+
+async def asitedesign_async(input_pdb: str, input_yaml: str, params_zip: str, output_path: str,
+                            properties: dict = None, timeout: Optional[float] = None,
+                            on_output: Optional[aio.OutputCallback] = None, executor: Optional[Executor] = None,
+                            grace: float = 30, **kwargs) -> int:
+    """Create :class:`Asitedesign <asitedesign.asitedesign.Asitedesign>` class and await :func:`run_async` on it.
+
+    Examples:
+        Two designs run concurrently from one event loop::
+
+            import asyncio
+            from biobb_asitedesign.asitedesign.asitedesign_async import asitedesign_async
+
+            async def main():
+                return await asyncio.gather(
+                    asitedesign_async('scaffold_1.pdb', 'design.yaml', 'params.zip', 'design_1.zip',
+                                      properties={'cpus': 4}, timeout=3600, on_output=print),
+                    asitedesign_async('scaffold_2.pdb', 'design.yaml', 'params.zip', 'design_2.zip',
+                                      properties={'cpus': 4}, timeout=3600))
+
+            asyncio.run(main())
+    """
+    loop = asyncio.get_event_loop()
+    job = await loop.run_in_executor(executor, functools.partial(
+        Asitedesign, input_pdb=input_pdb, input_yaml=input_yaml, params_zip=params_zip, output_path=output_path,
+        properties=properties, **kwargs))
+    return await run_async(job, timeout=timeout, on_output=on_output, executor=executor, grace=grace)
+
+
+class AsyncAsitedesignRunner:
+    """Run many Asitedesign jobs from one event loop without oversubscribing the node.
+
+    Jobs wait for a slot until at most ``max_jobs`` run and the sum of their MPI ranks is within
+    ``max_cpus`` (default: the cores available to the process), like :class:`AsitedesignBatch`
+    does for a manifest. Their file handling phases share a pool of ``max_jobs`` threads.
+    Concurrent local runs must set chdir_sandbox so their output.out files do not mix.
+
+    Examples:
+        Screening scaffolds with a per-job timeout, printing the log lines of every job::
+
+            async def main(scaffolds):
+                async with AsyncAsitedesignRunner(max_jobs=4, timeout=6 * 3600,
+                                                  on_output=lambda job_id, line: print(job_id, line)) as runner:
+                    for path in scaffolds:
+                        runner.submit(path, 'design.yaml', 'params.zip', f"{Path(path).stem}.zip",
+                                      properties={'cpus': 8, 'chdir_sandbox': True})
+                    return await runner.wait()
+    """
+
+    def __init__(self, max_jobs: int = 4, max_cpus: Optional[int] = None, timeout: Optional[float] = None,
+                 on_output: Optional[Callable[[str, str], Any]] = None, job_properties: Optional[Dict[str, Any]] = None,
+                 grace: float = 30) -> None:
+        self.max_jobs = max_jobs
+        self.max_cpus = max_cpus or batch.available_cpus()
+        self.timeout = timeout
+        self.on_output = on_output
+        self.job_properties = job_properties or {}
+        self.grace = grace
+        self.executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix='asitedesign')
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self._limiter: Optional[aio.CpuLimiter] = None
+
+    @staticmethod
+    def job_cpus(properties: Dict[str, Any]) -> int:
+        """Return the MPI ranks a job will use: those of its replicas for ensembles."""
+        ranks = mpi.requested_ranks(properties.get('cpus', 1), properties.get('nPoses', 3))
+        if str(properties.get('cpus', 1)).lower() == 'auto':
+            ranks *= max(1, int(properties.get('replicas', 1)))
+        return ranks
+
+    async def run(self, input_pdb: str, input_yaml: str, params_zip: str, output_path: str,
+                  properties: Optional[dict] = None, job_id: Optional[str] = None, timeout: Optional[float] = None) -> int:
+        """Wait for a slot and run the job, see :func:`asitedesign_async`."""
+        properties = dict(self.job_properties, **(properties or {}))
+        # Concurrent mpiruns binding to cores would all pin their ranks starting from the first core
+        properties.setdefault('mpi_bind_to', 'none')
+        job_id = job_id or Path(output_path).stem
+        on_output = functools.partial(self.on_output, job_id) if self.on_output else None
+        if self._limiter is None:
+            self._limiter = aio.CpuLimiter(self.max_cpus, self.max_jobs)
+        async with self._limiter.slot(self.job_cpus(properties)):
+            return await asitedesign_async(input_pdb, input_yaml, params_zip, output_path, properties=properties,
+                                           timeout=timeout or self.timeout, on_output=on_output, executor=self.executor,
+                                           grace=self.grace)
+
+    def submit(self, input_pdb: str, input_yaml: str, params_zip: str, output_path: str,
+               properties: Optional[dict] = None, job_id: Optional[str] = None,
+               timeout: Optional[float] = None) -> asyncio.Task:
+        """Schedule :meth:`run` as a task of the running loop, named ``job_id`` (default: the output file stem)."""
+        job_id = job_id or Path(output_path).stem
+        if job_id in self.tasks:
+            raise ValueError(f"Job {job_id} was already submitted")
+        self.tasks[job_id] = asyncio.ensure_future(self.run(input_pdb, input_yaml, params_zip, output_path,
+                                                            properties, job_id, timeout))
+        return self.tasks[job_id]
+
+    async def wait(self) -> Dict[str, Any]:
+        """Wait for the submitted jobs and return their return code, or exception, by job id."""
+        results = await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        return dict(zip(self.tasks, results))
+
+    async def cancel(self) -> None:
+        """Cancel the submitted jobs and wait for their process groups to be terminated."""
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> 'AsyncAsitedesignRunner':
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is not None:
+            await self.cancel()
+        else:
+            await self.wait()
+        self.close()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+"""Module containing the AsitedesignBatch class and the command line interface."""
+import argparse
+import multiprocessing
+import os
+from pathlib import Path
+import sys
+
+from biobb_asitedesign.asitedesign import batch
+from biobb_asitedesign.asitedesign.asitedesign import asitedesign
+from biobb_common.generic.biobb_object import BiobbObject
+from biobb_common.configuration import settings
+from biobb_common.tools import file_utils as fu
+from biobb_common.tools.file_utils import launchlogger
+
+
+class AsitedesignBatch(BiobbObject):
+    """
+    | biobb_asitedesign AsitedesignBatch
+    | Run many AsiteDesign jobs described in a manifest on the local node.
+    | Jobs are packed on the available cores so that the sum of their cpus never exceeds the node, failed jobs are retried and a summary table is written at the end.
+
+    Args:
+        input_manifest_path (str): Path to the CSV or YAML manifest of jobs. File type: input. Accepted formats: CSV (edam:format_3752), YAML (edam:format_3750).
+        output_summary_path (str): Path to the CSV summary of the batch. File type: output. Accepted formats: CSV (edam:format_3752).
+        properties (dict):
+            * **cpus** (*int*) - (1) Default number of cpus of the jobs that do not set it in the manifest.
+            * **max_cpus** (*int*) - (None) Number of cores shared by the jobs. Defaults to the cores available to the process.
+            * **max_retries** (*int*) - (1) Number of times a failed job is launched again.
+            * **poll_interval** (*float*) - (5.0) Seconds between checks of the running jobs.
+            * **output_dir** (*str*) - (None) Folder with one sub folder and output zip per job. Defaults to a "batch" folder next to the summary.
+            * **job_properties** (*dict*) - ({}) Properties of the Asitedesign building block shared by all the jobs. The manifest values have precedence.
+            * **remove_tmp** (*bool*) - (True) [WF property] Remove temporal files.
+            * **restart** (*bool*) - (False) [WF property] Do not execute if output files exist.
+
+    Examples:
+        This is a use example of how to use the building block from Python::
+
+            from biobb_asitedesign.asitedesign.asitedesign_batch import asitedesign_batch
+            prop = {
+                'max_cpus': 32,
+                'max_retries': 1,
+                'job_properties': {'container_path': 'singularity',
+                                   'container_image': '/path/to/asitedesign.sif'}
+            }
+            asitedesign_batch(input_manifest_path='/path/to/manifest.yml',
+                              output_summary_path='/path/to/summary.csv',
+                              properties=prop)
+
+        A YAML manifest screening two scaffolds with both presets::
+
+            defaults:
+              input_yaml: DesignCatalyticSite.yaml
+              params_zip: params.zip
+              cpus: 8
+            sweep:
+              input_pdb: [scaffold_1.pdb, scaffold_2.pdb]
+              simulation_type: [CatalyticSite, DirectEvolution]
+
+    Info:
+        * wrapped_software:
+            * name: AsiteDesign
+            * version: >=1.0
+            * license: BSD 3-Clause
+        * ontology:
+            * name: EDAM
+            * schema: http://edamontology.org/EDAM.owl
+    """
+
+    def __init__(self, input_manifest_path, output_summary_path, properties=None, **kwargs) -> None:
+        properties = properties or {}
+
+        # Call parent class constructor
+        super().__init__(properties)
+        self.locals_var_dict = locals().copy()
+
+        # Input/Output files
+        self.io_dict = {
+            'in': {'input_manifest_path': input_manifest_path},
+            'out': {'output_summary_path': output_summary_path}
+        }
+
+        # Properties specific for BB
+        self.cpus = properties.get('cpus', 1)
+        self.max_cpus = properties.get('max_cpus', None)
+        self.max_retries = properties.get('max_retries', 1)
+        self.poll_interval = properties.get('poll_interval', 5.0)
+        self.output_dir = properties.get('output_dir', None)
+        self.job_properties = properties.get('job_properties', {})
+        self.properties = properties
+
+        # Check the properties
+        self.check_properties(properties)
+        # Check the arguments
+        self.check_arguments()
+
+    @launchlogger
+    def launch(self) -> int:
+        """Execute the :class:`AsitedesignBatch <asitedesign.asitedesign_batch.AsitedesignBatch>` object."""
+
+        if self.check_restart():
+            return 0
+
+        summary_path = Path(self.io_dict['out']['output_summary_path']).resolve()
+        output_dir = Path(self.output_dir or summary_path.parent.joinpath('batch')).resolve()
+        jobs = batch.build_jobs(batch.read_manifest(self.io_dict['in']['input_manifest_path']), default_cpus=self.cpus,
+                                job_properties=self.job_properties)
+        for job in jobs:
+            job.output_path = str(output_dir.joinpath(job.job_id, f"{job.job_id}.zip"))
+
+        max_cpus = self.max_cpus or batch.available_cpus()
+        fu.log(f"Running {len(jobs)} jobs on {max_cpus} cores", self.out_log, self.global_log)
+        batch.run_jobs(jobs, launch=self._start_job, max_cpus=max_cpus,
+                       succeeded=lambda job: job.return_code == 0 and Path(job.output_path).exists(),
+                       max_retries=self.max_retries, poll_interval=self.poll_interval, out_log=self.out_log)
+
+        batch.write_summary(jobs, str(summary_path))
+        failed = [job.job_id for job in jobs if job.status != 'done']
+        if failed:
+            fu.log(f"Jobs not completed: {', '.join(failed)}", self.out_log, self.global_log)
+        self.return_code = 1 if failed else 0
+
+        self.check_arguments(output_files_created=True, raise_exception=False)
+        return self.return_code
+
+    @staticmethod
+    def _start_job(job: batch.BatchJob) -> batch.ProcessHandle:
+        job_dir = Path(job.output_path).parent
+        job_dir.mkdir(parents=True, exist_ok=True)
+        if Path(job.output_path).exists():
+            os.remove(job.output_path)
+        process = multiprocessing.Process(target=_run_job, name=job.job_id,
+                                          args=(str(job_dir), job.files, job.output_path, job.properties))
+        process.start()
+        return batch.ProcessHandle(process)
+
+
+def _run_job(job_dir: str, files: dict, output_path: str, properties: dict) -> None:
+    """Run one Asitedesign job inside ``job_dir`` so logs and sandboxes of the jobs do not mix."""
+    os.chdir(job_dir)
+    return_code = asitedesign(input_pdb=files['input_pdb'], input_yaml=files['input_yaml'],
+                              params_zip=files['params_zip'], output_path=output_path,
+                              properties=properties)
+    sys.exit(return_code or 0)
+
+
+def asitedesign_batch(input_manifest_path: str, output_summary_path: str, properties: dict = None, **kwargs) -> int:
+    """Create :class:`AsitedesignBatch <asitedesign.asitedesign_batch.AsitedesignBatch>` class and
+    execute the :meth:`launch() <asitedesign.asitedesign_batch.AsitedesignBatch.launch>` method."""
+
+    return AsitedesignBatch(input_manifest_path=input_manifest_path,
+                            output_summary_path=output_summary_path,
+                            properties=properties, **kwargs).launch()
+
+
+def main():
+    """Command line execution of this building block. Please check the command line documentation."""
+    parser = argparse.ArgumentParser(description='Run many AsiteDesign jobs described in a manifest on the local node.',
+                                     formatter_class=lambda prog: argparse.RawTextHelpFormatter(prog, width=99999))
+    parser.add_argument('-c', '--config', required=False, help='Configuration yaml file')
+
+    required_args = parser.add_argument_group('required arguments')
+    required_args.add_argument('--input_manifest_path', required=True,
+                               help='Path to the CSV or YAML manifest of jobs. Accepted formats: csv, yml, yaml.')
+    required_args.add_argument('--output_summary_path', required=True,
+                               help='Path to the CSV summary of the batch. Accepted formats: csv.')
+
+    args = parser.parse_args()
+    config = args.config if args.config else None
+    properties = settings.ConfReader(config=config).get_prop_dic()
+
+    asitedesign_batch(input_manifest_path=args.input_manifest_path,
+                      output_summary_path=args.output_summary_path,
+                      properties=properties)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+
+"""Module containing the AsitedesignSearch class and the command line interface."""
+import argparse
+import multiprocessing
+import os
+from pathlib import Path
+import sys
+from typing import List
+
+from biobb_asitedesign.asitedesign import batch
+from biobb_asitedesign.asitedesign import common as com
+from biobb_asitedesign.asitedesign import ensemble
+from biobb_asitedesign.asitedesign import preset_search
+from biobb_asitedesign.asitedesign.asitedesign import SAMPLING_PROPERTIES, asitedesign
+from biobb_asitedesign.asitedesign.reader import OutputArchive
+from biobb_common.generic.biobb_object import BiobbObject
+from biobb_common.configuration import settings
+from biobb_common.tools import file_utils as fu
+from biobb_common.tools.file_utils import launchlogger
+
+
+class AsitedesignSearch(BiobbObject):
+    """
+    | biobb_asitedesign AsitedesignSearch
+    | Search the cheapest sampling settings of a preset that still reach good designs, within a core-hour budget.
+    | Successive halving: many short runs of configurations of the sampling settings, the best of which are promoted to more iterations. The Pareto front of energy vs. cost is written as a table, and its cheapest configuration within energy_tolerance of the best energy as a custom preset YAML.
+
+    Args:
+        input_pdb (str): Path to the input file pdb. File type: input. Accepted formats: PDB (edam:format_1476).
+        input_yaml (str): Path to the yaml file of the design. File type: input. Accepted formats: YAML (edam:format_3750).
+        params_zip (str): Path to the params folder. File type: input. Accepted formats: PARAMS (edam:format_).
+        output_preset_path (str): Path to the YAML of the custom preset, input_yaml with the selected settings and nIterations. File type: output. Accepted formats: YAML (edam:format_3750).
+        output_front_path (str): Path to the CSV table of the evaluated configurations, flagging the Pareto front. File type: output. Accepted formats: CSV (edam:format_3752).
+        properties (dict):
+            * **simulation_type** (*str*) - ("CatalyticSite") Preset whose sampling settings are searched. Values: CatalyticSite, DirectEvolution.
+            * **search_space** (*dict*) - (None) Values tried for every searched YAML key, e.g. {"kT_high": [250, 500], "nSteps": [1, 2]}. Defaults to kT_high, ActiveSiteLoops, nSteps and SpawningMetricSteps values around the presets.
+            * **budget_core_hours** (*float*) - (10.0) Core-hours of all the runs of the search. The first rung is always run, the next ones only with the promoted configurations that fit in the remaining budget.
+            * **min_iterations** (*int*) - (1) nIterations of the first rung.
+            * **max_iterations** (*int*) - (9) nIterations of the last rung.
+            * **eta** (*int*) - (3) Iterations multiplier between rungs, and fraction (1/eta) of the configurations promoted.
+            * **n_configs** (*int*) - (None) Configurations of the first rung. Defaults to eta ** (number of rungs - 1).
+            * **energy_tolerance** (*float*) - (1.0) Energy above the best of the Pareto front accepted for a cheaper custom preset.
+            * **warm_promotions** (*bool*) - (True) Continue the promoted configurations from the final poses of their previous rung (see warm_start_from of Asitedesign), running only the added iterations.
+            * **seed** (*int*) - (0) Random seed of the sampled configurations and of the runs.
+            * **cpus** (*int*) - (1) Number of cpus of every run.
+            * **max_cpus** (*int*) - (None) Number of cores shared by the runs. Defaults to the cores available to the process.
+            * **poll_interval** (*float*) - (5.0) Seconds between checks of the running jobs.
+            * **output_dir** (*str*) - (None) Folder with one sub folder and output zip per configuration and rung. Defaults to a "search" folder next to the preset.
+            * **job_properties** (*dict*) - ({}) Properties of the Asitedesign building block shared by all the runs.
+            * **remove_tmp** (*bool*) - (True) [WF property] Remove temporal files.
+            * **restart** (*bool*) - (False) [WF property] Do not execute if output files exist.
+
+    Examples:
+        This is a use example of how to use the building block from Python::
+
+            from biobb_asitedesign.asitedesign.asitedesign_search import asitedesign_search
+            prop = {
+                'simulation_type': 'DirectEvolution',
+                'budget_core_hours': 200,
+                'cpus': 4,
+                'job_properties': {'container_path': 'singularity',
+                                   'container_image': '/path/to/asitedesign.sif'}
+            }
+            asitedesign_search(input_pdb='/path/to/input.pdb',
+                               input_yaml='/path/to/design.yaml',
+                               params_zip='/path/to/params.zip',
+                               output_preset_path='/path/to/preset.yaml',
+                               output_front_path='/path/to/front.csv',
+                               properties=prop)
+
+    Info:
+        * wrapped_software:
+            * name: AsiteDesign
+            * version: >=1.0
+            * license: BSD 3-Clause
+        * ontology:
+            * name: EDAM
+            * schema: http://edamontology.org/EDAM.owl
+    """
+
+    def __init__(self, input_pdb, input_yaml, params_zip, output_preset_path, output_front_path,
+                 properties=None, **kwargs) -> None:
+        properties = properties or {}
+
+        # Call parent class constructor
+        super().__init__(properties)
+        self.locals_var_dict = locals().copy()
+
+        # Input/Output files
+        self.io_dict = {
+            'in': {'input_pdb': input_pdb, 'input_yaml': input_yaml},
+            'out': {'output_preset_path': output_preset_path, 'output_front_path': output_front_path}
+        }
+        self.params_zip = params_zip
+
+        # Properties specific for BB
+        self.simulation_type = properties.get('simulation_type', 'CatalyticSite')
+        self.search_space = properties.get('search_space', None)
+        self.budget_core_hours = properties.get('budget_core_hours', 10.0)
+        self.min_iterations = properties.get('min_iterations', 1)
+        self.max_iterations = properties.get('max_iterations', 9)
+        self.eta = properties.get('eta', 3)
+        self.n_configs = properties.get('n_configs', None)
+        self.energy_tolerance = properties.get('energy_tolerance', 1.0)
+        self.warm_promotions = properties.get('warm_promotions', True)
+        self.seed = properties.get('seed', 0)
+        self.cpus = properties.get('cpus', 1)
+        self.max_cpus = properties.get('max_cpus', None)
+        self.poll_interval = properties.get('poll_interval', 5.0)
+        self.output_dir = properties.get('output_dir', None)
+        self.job_properties = properties.get('job_properties', {})
+        self.properties = properties
+        self.search_dir = None
+        self.base_yaml = {}
+        self.metric = None
+
+        # Check the properties
+        self.check_properties(properties)
+        # Check the arguments
+        self.check_arguments()
+
+    @launchlogger
+    def launch(self) -> int:
+        """Execute the :class:`AsitedesignSearch <asitedesign.asitedesign_search.AsitedesignSearch>` object."""
+
+        if self.check_restart():
+            return 0
+
+        preset_path = Path(self.io_dict['out']['output_preset_path']).resolve()
+        self.search_dir = Path(self.output_dir or preset_path.parent.joinpath('search')).resolve()
+        self.base_yaml = com.read_yaml(self.io_dict['in']['input_yaml']) or {}
+        self.metric = com.layer_yaml(self.io_dict['in']['input_yaml'], com.yaml_preset(self.simulation_type)).get('RankingMetric')
+        fu.log(f"Searching the {self.simulation_type} preset within {self.budget_core_hours} core-hours",
+               self.out_log, self.global_log)
+
+        result = preset_search.successive_halving(self.search_space or preset_search.DEFAULT_SPACE, self.evaluate,
+                                                  self.budget_core_hours, self.min_iterations, self.max_iterations,
+                                                  self.eta, self.n_configs, self.seed, resume=self.warm_promotions,
+                                                  out_log=self.out_log)
+        preset_search.write_table(result, self.io_dict['out']['output_front_path'])
+        if not result.evaluations:
+            fu.log("No configuration completed, no preset written", self.out_log, self.global_log)
+            self.return_code = 1
+            return self.return_code
+
+        selected = preset_search.select(result.front, self.energy_tolerance)
+        preset_search.write_preset(preset_search.custom_preset(self.base_yaml, selected), str(preset_path))
+        fu.log(f"Pareto front of {len(result.front)} of {len(result.evaluations)} evaluations, "
+               f"{result.core_hours:.3f} core-hours spent. Preset: {selected.trial_id} with {selected.iterations} iterations, "
+               f"energy {selected.energy} for {selected.core_hours:.3f} core-hours", self.out_log, self.global_log)
+        self.return_code = 0
+        self.check_arguments(output_files_created=True, raise_exception=False)
+        return self.return_code
+
+    def evaluate(self, trials: List[preset_search.Trial], iterations: int) -> None:
+        """Run the ``trials`` up to ``iterations`` epochs, see :data:`preset_search.Evaluator`."""
+        jobs = {}
+        for trial in trials:
+            job_dir = self.search_dir.joinpath(trial.trial_id, f"iterations_{iterations}")
+            job_dir.mkdir(parents=True, exist_ok=True)
+            # The trials run from their own folder
+            properties = ensemble.absolute_paths(dict(self.job_properties, cpus=self.cpus,
+                                                      simulation_type=self.simulation_type, seed=self.seed))
+            added = iterations
+            if self.warm_promotions and trial.output_path:
+                properties['warm_start_from'] = trial.output_path
+                added = iterations - trial.iterations
+            config = dict(trial.config, nIterations=added)
+            # Asitedesign writes its properties over input_yaml, the searched ones must be given as such
+            properties.update({key: value for key, value in config.items() if key in SAMPLING_PROPERTIES})
+            yaml_path = str(job_dir.joinpath('input.yaml'))
+            preset_search.write_preset(dict(self.base_yaml, **config), yaml_path)
+            files = {'input_pdb': os.path.abspath(self.io_dict['in']['input_pdb']), 'input_yaml': yaml_path,
+                     'params_zip': os.path.abspath(self.params_zip)}
+            jobs[trial.trial_id] = batch.BatchJob(job_id=f"{trial.trial_id}_{iterations}", files=files, properties=properties,
+                                                  cpus=self.cpus, output_path=str(job_dir.joinpath('output.zip')))
+
+        max_cpus = self.max_cpus or batch.available_cpus()
+        batch.run_jobs(list(jobs.values()), launch=_start_trial, max_cpus=max_cpus,
+                       succeeded=lambda job: job.return_code == 0 and Path(job.output_path).exists(),
+                       max_retries=0, poll_interval=self.poll_interval, out_log=self.out_log)
+        if all(job.status == 'skipped' for job in jobs.values()):
+            raise ValueError(f"No trial can run: each needs {self.cpus} cpus but only {max_cpus} are available, "
+                             f"lower cpus or set max_cpus")
+        for trial in trials:
+            job = jobs[trial.trial_id]
+            trial.core_hours += job.wall_time * job.cpus / 3600
+            if job.status != 'done':
+                trial.status = 'failed'
+                continue
+            with OutputArchive(job.output_path) as archive:
+                best = archive.top_poses(1, self.metric)
+                trial.energy = best[0].score(self.metric) if best else None
+            trial.status = 'done' if trial.energy is not None else 'failed'
+            trial.iterations = iterations
+            trial.output_path = job.output_path
+
+
+def _start_trial(job: batch.BatchJob) -> batch.ProcessHandle:
+    job_dir = Path(job.output_path).parent
+    process = multiprocessing.Process(target=_run_trial, name=job.job_id,
+                                      args=(str(job_dir), job.files, job.output_path, job.properties))
+    process.start()
+    return batch.ProcessHandle(process)
+
+
+def _run_trial(job_dir: str, files: dict, output_path: str, properties: dict) -> None:
+    """Run one trial inside ``job_dir`` so logs and sandboxes of the trials do not mix."""
+    os.chdir(job_dir)
+    return_code = asitedesign(input_pdb=files['input_pdb'], input_yaml=files['input_yaml'],
+                              params_zip=files['params_zip'], output_path=output_path,
+                              properties=properties)
+    sys.exit(return_code or 0)
+
+
+def asitedesign_search(input_pdb: str, input_yaml: str, params_zip: str, output_preset_path: str,
+                       output_front_path: str, properties: dict = None, **kwargs) -> int:
+    """Create :class:`AsitedesignSearch <asitedesign.asitedesign_search.AsitedesignSearch>` class and
+    execute the :meth:`launch() <asitedesign.asitedesign_search.AsitedesignSearch.launch>` method."""
+
+    return AsitedesignSearch(input_pdb=input_pdb, input_yaml=input_yaml, params_zip=params_zip,
+                             output_preset_path=output_preset_path, output_front_path=output_front_path,
+                             properties=properties, **kwargs).launch()
+
+
+def main():
+    """Command line execution of this building block. Please check the command line documentation."""
+    parser = argparse.ArgumentParser(description='Search the cheapest sampling settings of a preset within a core-hour budget.',
+                                     formatter_class=lambda prog: argparse.RawTextHelpFormatter(prog, width=99999))
+    parser.add_argument('-c', '--config', required=False, help='Configuration yaml file')
+
+    required_args = parser.add_argument_group('required arguments')
+    required_args.add_argument('--input_pdb', required=True, help='Path to the input file pdb. Accepted formats: pdb.')
+    required_args.add_argument('--input_yaml', required=True, help='Path to the yaml file of the design. Accepted formats: yml, yaml.')
+    required_args.add_argument('--params_zip', required=True, help='Path to the params folder. Accepted formats: zip, params.')
+    required_args.add_argument('--output_preset_path', required=True,
+                               help='Path to the YAML of the custom preset. Accepted formats: yml, yaml.')
+    required_args.add_argument('--output_front_path', required=True,
+                               help='Path to the CSV table of the evaluated configurations. Accepted formats: csv.')
+
+    args = parser.parse_args()
+    config = args.config if args.config else None
+    properties = settings.ConfReader(config=config).get_prop_dic()
+
+    asitedesign_search(input_pdb=args.input_pdb,
+                       input_yaml=args.input_yaml,
+                       params_zip=args.params_zip,
+                       output_preset_path=args.output_preset_path,
+                       output_front_path=args.output_front_path,
+                       properties=properties)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+""" Manifest parsing and core-aware local scheduling for package biobb_asitedesign.asitedesign """
+import csv
+from dataclasses import dataclass, field
+import itertools
+import logging
+import multiprocessing
+from pathlib import Path
+import subprocess
+import time
+import typing
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+import yaml
+
+from biobb_asitedesign.asitedesign import mpi
+
+FILE_KEYS = ('input_pdb', 'input_yaml', 'params_zip')
+
+
+@dataclass
+class BatchJob:
+    """A single Asitedesign run of a batch and its scheduling state."""
+    job_id: str
+    files: Dict[str, str]
+    properties: Dict[str, Any]
+    cpus: int = 1
+    status: str = 'pending'
+    attempts: int = 0
+    return_code: Optional[int] = None
+    wall_time: float = 0.0
+    output_path: Optional[str] = None
+    process: Optional[subprocess.Popen] = field(default=None, repr=False)
+    start_time: float = field(default=0.0, repr=False)
+
+
+class ProcessHandle:
+    """Give a :class:`multiprocessing.Process` the ``poll()`` interface of :class:`subprocess.Popen`."""
+
+    def __init__(self, process: multiprocessing.Process) -> None:
+        self.process = process
+
+    def poll(self) -> Optional[int]:
+        if self.process.is_alive():
+            return None
+        self.process.join()
+        return self.process.exitcode
+
+
+def available_cpus() -> int:
+    """Return the number of cores this process may run on, limited by its cgroup CPU quota."""
+    return mpi.available_cores()
+
+
+def read_manifest(manifest_path: str) -> List[Dict[str, Any]]:
+    """Read a CSV or YAML batch manifest and return one dictionary per job.
+
+    A CSV manifest has one job per row. Cells are parsed as YAML, so ``DesignResidues`` can
+    be written as a flow mapping like ``{28-A: ZX, 29-A: ZX}``.
+
+    A YAML manifest may contain ``defaults`` shared by every job, a ``sweep`` mapping of
+    lists expanded as a cartesian product (e.g. PDB x DesignResidues x simulation_type) and an
+    explicit list of ``jobs``. Relative file paths are resolved against the manifest folder.
+    """
+    manifest_dir = Path(manifest_path).resolve().parent
+    if Path(manifest_path).suffix.lower() == '.csv':
+        with open(manifest_path, newline='') as csv_file:
+            rows = [{k.strip(): yaml.safe_load(v) for k, v in row.items() if k and v not in (None, '')}
+                    for row in csv.DictReader(csv_file)]
+    else:
+        with open(manifest_path) as yaml_file:
+            manifest = yaml.safe_load(yaml_file) or {}
+        defaults = manifest.get('defaults') or {}
+        rows = []
+        sweep = manifest.get('sweep') or {}
+        if sweep:
+            keys = list(sweep)
+            for values in itertools.product(*(sweep[k] for k in keys)):
+                rows.append(dict(defaults, **dict(zip(keys, values))))
+        for job in manifest.get('jobs') or []:
+            rows.append(dict(defaults, **job))
+
+    for row in rows:
+        for key in FILE_KEYS:
+            if row.get(key) and not Path(str(row[key])).is_absolute():
+                row[key] = str(manifest_dir.joinpath(str(row[key])))
+    return rows
+
+
+def build_jobs(rows: typing.Iterable[Dict[str, Any]], default_cpus: int = 1,
+               job_properties: Optional[Mapping[str, Any]] = None) -> List[BatchJob]:
+    """Split manifest rows into :class:`BatchJob` input files and properties.
+
+    The properties of a job are ``job_properties`` updated with its row. ``default_cpus`` and
+    an unbound ``mpi_bind_to`` only apply when neither of them sets the value.
+    """
+    jobs = []
+    for index, row in enumerate(rows):
+        row = dict(job_properties or {}, **row)
+        files = {key: row.pop(key, None) for key in FILE_KEYS}
+        job_id = str(row.pop('job_id', None) or f"job_{index:04d}")
+        cpus = mpi.requested_ranks(row.get('cpus') or default_cpus, row.get('nPoses', 3))
+        row['cpus'] = cpus
+        # Concurrent mpiruns binding to cores would all pin their ranks starting from the first core
+        row.setdefault('mpi_bind_to', 'none')
+        jobs.append(BatchJob(job_id=job_id, files=files, properties=row, cpus=cpus))
+    return jobs
+
+
+def run_jobs(jobs: List[BatchJob], launch: Callable[[BatchJob], subprocess.Popen], max_cpus: int,
+             succeeded: Callable[[BatchJob], bool] = lambda job: job.return_code == 0,
+             max_retries: int = 1, poll_interval: float = 1.0,
+             out_log: logging.Logger = None) -> List[BatchJob]:
+    """Run ``jobs`` concurrently without the sum of their ``cpus`` ever exceeding ``max_cpus``.
+
+    Pending jobs are packed first-fit in decreasing ``cpus`` order every time cores are
+    released. Failed jobs are queued again until they have been tried ``max_retries + 1``
+    times. Jobs needing more than ``max_cpus`` are never started and reported as skipped.
+    """
+    pending = sorted(jobs, key=lambda job: -job.cpus)
+    for job in pending:
+        if job.cpus > max_cpus:
+            job.status = 'skipped'
+            _log(f"{job.job_id}: needs {job.cpus} cpus but only {max_cpus} are available, skipped", out_log)
+    pending = [job for job in pending if job.status != 'skipped']
+    running: List[BatchJob] = []
+
+    while pending or running:
+        free = max_cpus - sum(job.cpus for job in running)
+        for job in list(pending):
+            if job.cpus <= free:
+                pending.remove(job)
+                job.attempts += 1
+                job.status = 'running'
+                job.start_time = time.time()
+                job.process = launch(job)
+                running.append(job)
+                free -= job.cpus
+                _log(f"{job.job_id}: started attempt {job.attempts} on {job.cpus} cpus ({free} free)", out_log)
+
+        time.sleep(poll_interval)
+        for job in list(running):
+            return_code = job.process.poll()
+            if return_code is None:
+                continue
+            running.remove(job)
+            job.return_code = return_code
+            job.wall_time += time.time() - job.start_time
+            job.process = None
+            if succeeded(job):
+                job.status = 'done'
+            elif job.attempts <= max_retries:
+                job.status = 'pending'
+                pending.append(job)
+                pending.sort(key=lambda job: -job.cpus)
+            else:
+                job.status = 'failed'
+            _log(f"{job.job_id}: exit code {return_code}, {job.status}", out_log)
+    return jobs
+
+
+def write_summary(jobs: typing.Iterable[BatchJob], summary_path: str) -> str:
+    """Write one CSV row per job with its inputs, status and timing."""
+    fieldnames = ['job_id', 'input_pdb', 'simulation_type', 'cpus', 'status', 'attempts',
+                  'return_code', 'wall_time', 'output_path']
+    with open(summary_path, 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+        writer.writeheader()
+        for job in jobs:
+            writer.writerow({'job_id': job.job_id,
+                             'input_pdb': job.files.get('input_pdb'),
+                             'simulation_type': job.properties.get('simulation_type', 'CatalyticSite'),
+                             'cpus': job.cpus,
+                             'status': job.status,
+                             'attempts': job.attempts,
+                             'return_code': job.return_code,
+                             'wall_time': f"{job.wall_time:.1f}",
+                             'output_path': job.output_path})
+    return summary_path
+
+
+def _log(message: str, out_log: logging.Logger = None) -> None:
+    if out_log:
+        out_log.info(message)
@@ -0,0 +1,119 @@
+""" Checkpoint and resume of adaptive sampling epochs for package biobb_asitedesign.asitedesign """
+import json
+import logging
+import os
+from pathlib import Path
+import shutil
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import uuid
+
+from biobb_asitedesign.asitedesign import outputs
+
+STATE_FILE = 'state.json'
+
+
+class EpochCheckpoint:
+    """Persistent copy of the completed epochs of a design job.
+
+    Epochs are stored as ``epochs/epoch_<n>`` with a global epoch number, so the epochs of
+    successive resumed runs of the same job follow each other. The state file records the
+    job digest, and a checkpoint written for different inputs is ignored.
+    """
+
+    def __init__(self, checkpoint_path: str, digest: str) -> None:
+        self.path = Path(checkpoint_path)
+        self.epochs_dir = self.path.joinpath('epochs')
+        self.digest = digest
+        self.epochs_dir.mkdir(parents=True, exist_ok=True)
+        self.state = self._load()
+
+    def _load(self) -> Dict[str, Any]:
+        state_file = self.path.joinpath(STATE_FILE)
+        if state_file.exists():
+            state = json.loads(state_file.read_text())
+            if state.get('digest') == self.digest:
+                return state
+            shutil.rmtree(self.epochs_dir, ignore_errors=True)
+            self.epochs_dir.mkdir(parents=True)
+        return {'digest': self.digest, 'epochs': [], 'segments': []}
+
+    def _save(self) -> None:
+        tmp = self.path.joinpath(f".{STATE_FILE}.{uuid.uuid4().hex}")
+        tmp.write_text(json.dumps(self.state, indent=2))
+        os.replace(tmp, self.path.joinpath(STATE_FILE))
+
+    @property
+    def last_epoch(self) -> Optional[int]:
+        return max(self.state['epochs']) if self.state['epochs'] else None
+
+    def epoch_path(self, epoch: int) -> Path:
+        return self.epochs_dir.joinpath(f"epoch_{epoch:04d}")
+
+    def save_epoch(self, epoch: int, source: Path) -> Path:
+        """Copy the finished epoch folder ``source`` as global ``epoch``, atomically."""
+        dest = self.epoch_path(epoch)
+        if not dest.exists():
+            tmp = self.epochs_dir.joinpath(f".{dest.name}.{uuid.uuid4().hex}")
+            shutil.copytree(source, tmp)
+            os.replace(tmp, dest)
+        if epoch not in self.state['epochs']:
+            self.state['epochs'].append(epoch)
+            self.state['epochs'].sort()
+            self._save()
+        return dest
+
+    def start_segment(self, first_epoch: int, n_iterations: int) -> None:
+        """Record a (re)launch starting at global epoch ``first_epoch``."""
+        self.state['segments'].append({'first_epoch': first_epoch, 'nIterations': n_iterations, 'started': time.time()})
+        self._save()
+
+    def seed_poses(self, metric: Optional[str] = None, top: int = 1) -> List[Tuple[float, Path]]:
+        """Return the best ranked poses spawned by the last completed epoch."""
+        if self.last_epoch is None:
+            return []
+        return outputs.rank_poses(outputs.pose_files(self.epoch_path(self.last_epoch)), metric, top)
+
+
+class CheckpointSyncer(threading.Thread):
+    """Background thread copying every newly completed epoch of a running job into an :class:`EpochCheckpoint`."""
+
+    def __init__(self, checkpoint: EpochCheckpoint, root: str, name: str, epoch_offset: int = 0,
+                 interval: float = 60, out_log: logging.Logger = None) -> None:
+        super().__init__(name='asitedesign-checkpoint', daemon=True)
+        self.checkpoint = checkpoint
+        self.root = root
+        self.name_prefix = name
+        self.epoch_offset = epoch_offset
+        self.interval = interval
+        self.out_log = out_log
+        self._stop_event = threading.Event()
+
+    def sync(self) -> List[int]:
+        saved = []
+        for epoch, path in outputs.completed_epochs(self.root, self.name_prefix):
+            global_epoch = self.epoch_offset + epoch
+            if global_epoch in self.checkpoint.state['epochs']:
+                continue
+            self.checkpoint.save_epoch(global_epoch, path)
+            saved.append(global_epoch)
+            if self.out_log:
+                self.out_log.info(f"Checkpointed epoch {global_epoch} to {self.checkpoint.epoch_path(global_epoch)}")
+        return saved
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.sync()
+            except OSError as error:
+                # The epoch may still be written, retry on the next interval
+                if self.out_log:
+                    self.out_log.info(f"Checkpoint sync postponed: {error}")
+
+    def stop(self) -> List[int]:
+        """Stop the thread and checkpoint the epochs completed since the last interval."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        return self.sync()
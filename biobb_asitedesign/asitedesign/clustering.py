@@ -0,0 +1,201 @@
+""" Sequence and active-site structure clustering of designs for package biobb_asitedesign.asitedesign
+
+Designs are first deduplicated exactly by a hash of their mutant sequence at ``DesignResidues``,
+keeping the best scored pose of every sequence. The unique designs are then clustered by the
+RMSD of their active-site atoms: the backbone and CB of the design residues and the heavy atoms
+of the ligands, compared in place since AsiteDesign keeps the frame of the input structure.
+Clusters are grown greedily from the best scored design: a design joins the nearest
+representative within the cutoff or becomes the representative of a new cluster.
+"""
+import csv
+import hashlib
+import os
+from pathlib import Path
+import re
+import shutil
+import typing
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from biobb_asitedesign.asitedesign import outputs
+from biobb_asitedesign.asitedesign.pdb_index import BACKBONE_ATOMS, PDBIndex, ResidueKey, parse_residue_key
+from biobb_asitedesign.asitedesign.preflight import ligand_entries
+
+DESIGN_ATOMS = BACKBONE_ATOMS + ('CB',)
+HYDROGEN_RE = re.compile(r'^\d*H')
+TABLE_FIELDS = ['pose', 'score', 'sequence', 'sequence_hash', 'duplicate_of', 'cluster', 'representative',
+                'rmsd_to_representative']
+
+AtomKey = Tuple[int, str, str]
+
+
+class ClusterMember(typing.NamedTuple):
+    pose: str
+    score: float
+    sequence: str
+    sequence_hash: str
+    duplicate_of: Optional[str]
+    cluster: int
+    representative: str
+    rmsd_to_representative: float
+
+
+def sequence_hash(sequence: str) -> str:
+    return hashlib.sha1(sequence.encode()).hexdigest()[:16]
+
+
+def active_site_atoms(yaml_dict: Mapping[str, Any]) -> Tuple[List[ResidueKey], List[ResidueKey]]:
+    """Return the design residue and ligand keys of ``yaml_dict`` whose atoms define the active site."""
+    ligands = [parse_residue_key(str(key).strip()) for key in ligand_entries(yaml_dict.get('Ligands'))]
+    return outputs.design_keys(yaml_dict.get('DesignResidues')), [key for key in ligands if key]
+
+
+def atom_coordinates(index: PDBIndex, design: typing.Iterable[ResidueKey],
+                     ligands: typing.Iterable[ResidueKey]) -> Dict[AtomKey, Tuple[float, float, float]]:
+    """Return the coordinates of the active-site atoms of a pose, or of all its CA atoms without active site."""
+    selection = [(key, DESIGN_ATOMS) for key in design] + [(key, None) for key in ligands]
+    if not selection:
+        selection = [(key, ('CA',)) for key in index.residues]
+    coords = {}
+    for key, names in selection:
+        residue = index.get(key)
+        if residue is None:
+            continue
+        for name, atom in residue.atoms.items():
+            if (name in names) if names else not HYDROGEN_RE.match(name):
+                coords[(key[0], key[1], name)] = (atom.x, atom.y, atom.z)
+    return coords
+
+
+def coordinate_matrix(poses: typing.Sequence[Dict[AtomKey, Tuple[float, float, float]]]) -> Tuple[np.ndarray, List[AtomKey]]:
+    """Return the (n_poses, n_atoms, 3) coordinates of the atoms present in all the ``poses``, see :func:`atom_coordinates`."""
+    if not poses:
+        return np.zeros((0, 0, 3)), []
+    common = set(poses[0]).intersection(*poses[1:])
+    atoms = sorted(common)
+    coords = np.array([[pose[atom] for atom in atoms] for pose in poses], dtype=np.float64)
+    return coords.reshape(len(poses), len(atoms), 3), atoms
+
+
+def pairwise_rmsd(coords: np.ndarray, other: Optional[np.ndarray] = None) -> np.ndarray:
+    """Return the in-place RMSD between every pose of ``coords`` (n, m, 3) and of ``other`` (default ``coords``).
+
+    Computed from the Gram matrix of the flattened coordinates, ``|a - b|^2 = |a|^2 + |b|^2 - 2 a.b``,
+    after centering all the coordinates on their common mean to limit the cancellation error.
+    """
+    same = other is None
+    other = coords if same else other
+    n_atoms = coords.shape[1]
+    if not n_atoms:
+        return np.zeros((len(coords), len(other)))
+    center = coords.reshape(-1, 3).mean(axis=0)
+    a = (coords - center).reshape(len(coords), -1)
+    b = a if same else (other - center).reshape(len(other), -1)
+    squared = np.einsum('ij,ij->i', a, a)[:, None] + np.einsum('ij,ij->i', b, b)[None, :] - 2.0 * (a @ b.T)
+    rmsd = np.sqrt(np.maximum(squared, 0.0) / n_atoms)
+    if same:
+        np.fill_diagonal(rmsd, 0.0)
+    return rmsd
+
+
+def leader_clusters(coords: np.ndarray, cutoff: float, max_matrix: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Cluster poses ordered from best to worst: each joins the nearest earlier representative within ``cutoff``
+    or becomes a representative.
+
+    The RMSD matrix of the first ``max_matrix`` poses (all by default) is computed at once; the
+    following poses are only compared with the representatives, so memory does not grow with the
+    square of the number of poses.
+
+    Returns:
+        tuple: Index of the representative of every pose and its RMSD to it.
+    """
+    n_poses = len(coords)
+    assigned = np.zeros(n_poses, dtype=np.int64)
+    distance = np.zeros(n_poses)
+    head = n_poses if not max_matrix else min(int(max_matrix), n_poses)
+    matrix = pairwise_rmsd(coords[:head])
+    representatives: List[int] = []
+    for i in range(n_poses):
+        if representatives:
+            if i < head:
+                to_representatives = matrix[i, representatives]
+            else:
+                to_representatives = pairwise_rmsd(coords[representatives], coords[i:i + 1])[:, 0]
+            nearest = int(np.argmin(to_representatives))
+            if to_representatives[nearest] <= cutoff:
+                assigned[i] = representatives[nearest]
+                distance[i] = to_representatives[nearest]
+                continue
+        representatives.append(i)
+        assigned[i] = i
+    return assigned, distance
+
+
+def cluster_poses(paths: typing.Iterable[outputs.PathLike], yaml_dict: Mapping[str, Any], cutoff: float = 1.0,
+                  metric: Optional[str] = None, max_matrix: Optional[int] = None,
+                  root: Optional[outputs.PathLike] = None) -> List[ClusterMember]:
+    """Deduplicate the poses by mutant sequence and cluster the unique ones by active-site RMSD.
+
+    Poses are named by their path relative to ``root`` (default: their common folder). Duplicated
+    sequences are reported with the pose they duplicate and the cluster of that pose.
+    """
+    ranked = outputs.rank_poses(paths, metric)
+    if not ranked:
+        return []
+    root = Path(root) if root else Path(os.path.commonpath([str(path.parent) for _, path in ranked]))
+    design, ligands = active_site_atoms(yaml_dict)
+
+    unique: List[Tuple[float, Path, str]] = []
+    poses = []
+    duplicates: List[Tuple[float, Path, str, Path]] = []
+    first: Dict[str, Path] = {}
+    for score, path in ranked:
+        index = PDBIndex.from_file(str(path))
+        sequence = index.sequence(design)
+        # Without design residues all the sequences are empty, nothing is a duplicate
+        if design and sequence in first:
+            duplicates.append((score, path, sequence, first[sequence]))
+            continue
+        first[sequence] = path
+        unique.append((score, path, sequence))
+        poses.append(atom_coordinates(index, design, ligands))
+
+    coords, _ = coordinate_matrix(poses)
+    assigned, distance = leader_clusters(coords, cutoff, max_matrix)
+    cluster_ids = {rep: number for number, rep in enumerate(dict.fromkeys(assigned.tolist()), start=1)}
+
+    def name(path: Path) -> str:
+        return path.relative_to(root).as_posix()
+
+    members: Dict[Path, ClusterMember] = {}
+    for i, (score, path, sequence) in enumerate(unique):
+        representative = unique[assigned[i]][1]
+        members[path] = ClusterMember(name(path), score, sequence, sequence_hash(sequence), None,
+                                      cluster_ids[int(assigned[i])], name(representative), round(float(distance[i]), 4))
+    for score, path, sequence, original in duplicates:
+        members[path] = members[original]._replace(pose=name(path), score=score, duplicate_of=name(original))
+    return [members[path] for _, path in ranked]
+
+
+def write_clusters(members: typing.Sequence[ClusterMember], root: outputs.PathLike, output_dir: str) -> List[Path]:
+    """Copy the cluster representatives to ``output_dir`` as ``cluster_<n>_<pose>`` and write ``clusters.csv``.
+
+    Args:
+        members: Result of :func:`cluster_poses`.
+        root: Folder the pose names are relative to.
+        output_dir: Folder of the representatives and the membership table.
+    """
+    Path(output_dir).mkdir(parents=True, exist_ok=True)
+    written = []
+    for member in members:
+        if member.duplicate_of is None and member.pose == member.representative:
+            dest = Path(output_dir).joinpath(f"cluster_{member.cluster:03d}_{member.pose.replace('/', '_')}")
+            shutil.copy2(Path(root).joinpath(member.pose), dest)
+            written.append(dest)
+    with open(Path(output_dir).joinpath('clusters.csv'), 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=TABLE_FIELDS)
+        writer.writeheader()
+        for member in members:
+            writer.writerow(member._asdict())
+    return written
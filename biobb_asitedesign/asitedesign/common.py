@@ -1,19 +1,32 @@
 """ Common functions for package biobb_asitedesign.asitedesign """
+import hashlib
 import logging
 import os
 from pathlib import Path
+import shutil
 from typing import List, Dict, Tuple, Mapping, Union, Set, Sequence
 import typing
-import zipfile
 
 import yaml
 
+from biobb_asitedesign.asitedesign.archive import write_archive
 from biobb_asitedesign.asitedesign.preset import SOFTWARE_PARAMS
 
 
 def create_yaml(output_yaml_path: str, workflow_dict: Mapping[str, str], input_yaml_path: str = None,
                 preset_dict: Mapping[str, str] = None, yaml_properties_dict: Mapping[str, str] = None, container_volume_path="/data",
                 unique_dir = None):
+    yaml_dict = layer_yaml(input_yaml_path, preset_dict, yaml_properties_dict)
+
+    name = yaml_dict['Name']
+    yaml_dict['Name'] = f"{unique_dir}/{name}"
+    yml = write_yaml(output_yaml_path, workflow_dict, yaml_dict, container_volume_path)
+    
+    return yml, name
+
+
+def layer_yaml(input_yaml_path: str = None, preset_dict: Mapping[str, str] = None,
+               yaml_properties_dict: Mapping[str, str] = None) -> Dict[str, str]:
     yaml_dict = {}  # : Dict[str, str]
     if preset_dict:
         for k, v in preset_dict.items():
@@ -25,12 +38,7 @@ def create_yaml(output_yaml_path: str, workflow_dict: Mapping[str, str], input_y
     if yaml_properties_dict:
         for k, v in yaml_properties_dict.items():
             yaml_dict[k] = v
-    
-    name = yaml_dict['Name']
-    yaml_dict['Name'] = f"{unique_dir}/{name}"
-    yml = write_yaml(output_yaml_path, workflow_dict, yaml_dict, container_volume_path)
-    
-    return yml, name
+    return yaml_dict
 
 
 def search_string_yaml(filename, string):
@@ -40,6 +48,15 @@ def search_string_yaml(filename, string):
 
 
 def write_yaml(output_yaml_path: str, workflow_dict: Mapping[str, str], yaml_dict: Mapping[str, str], container_volume_path) -> str:
+    yaml_final = merge_yaml(workflow_dict, yaml_dict)
+
+    with open(output_yaml_path, 'w') as yaml_file:
+        yaml.dump(yaml_final, yaml_file, default_flow_style=False)
+
+    return output_yaml_path
+
+
+def merge_yaml(workflow_dict: Mapping[str, str], yaml_dict: Mapping[str, str]) -> Dict[str, str]:
     yaml_final = {}
     if workflow_dict.get('PDB'):
         yaml_final['PDB'] = workflow_dict['PDB']
@@ -61,20 +78,19 @@ def write_yaml(output_yaml_path: str, workflow_dict: Mapping[str, str], yaml_dic
         yaml_final['nSteps'] = workflow_dict.get('nSteps')
     if workflow_dict.get('Time'):
         yaml_final['Time'] = workflow_dict.get('Time')
+    if workflow_dict.get('Seed') is not None:
+        yaml_final['Seed'] = workflow_dict.get('Seed')
 
     for k, v in yaml_dict.items():
         # Update the reference file path of the constrain
-        if k == 'Constraints':
+        if k == 'Constraints' and v:
             for const in v:
                 if 'reference' in v[const].keys():
                     v[const]['reference'] = workflow_dict['PDB']
         if not k in yaml_final.keys():
             yaml_final[k] = v
 
-    with open(output_yaml_path, 'w') as yaml_file:
-        yaml.dump(yaml_final, yaml_file, default_flow_style=False)
-
-    return output_yaml_path
+    return yaml_final
 
 
 def read_yaml(input_yaml_path: str) -> Dict[str, str]:
@@ -98,23 +114,53 @@ def yaml_preset(simulation_type: str) -> Dict[str, str]:
 
     return yaml_dict
 
-def zip_list(zip_file: str, file_list: typing.Iterable[str], out_log: logging.Logger = None):
-    file_list.sort()
-    with zipfile.ZipFile(zip_file, 'w') as zip_f:
-        inserted = []
-        for index, f in enumerate(file_list):
-            if os.path.exists(Path(f)):
-                base_name = Path(f).name
-                if os.path.isdir(Path(f)):
-                    for root, dirs, files in os.walk(f):
-                        for file in files:
-                            zip_f.write(root+"/"+file)
-                            inserted.append(file)
-                if base_name in inserted:
-                    base_name = 'file_' + str(index) + '_' + base_name
-                inserted.append(base_name)
-                zip_f.write(f)
+
+def zip_list(zip_file: str, file_list: typing.Iterable[str], out_log: logging.Logger = None,
+             compress_level: int = 6, workers: int = None) -> List[Dict[str, typing.Any]]:
+    file_list = sorted(file_list)
+    manifest = write_archive(zip_file, file_list, compress_level=compress_level, workers=workers)
     if out_log:
         out_log.info("Adding:")
         out_log.info(str(file_list))
-        out_log.info("to: " + str(Path(zip_file).resolve()))
\ No newline at end of file
+        out_log.info(f"to: {Path(zip_file).resolve()} ({len(manifest)} members, compress_level={compress_level})")
+    return manifest
+
+
+def link_or_copy(src: str, dest_dir: str, allow_symlink: bool = False) -> str:
+    """Stage ``src`` into ``dest_dir`` without copying data whenever possible.
+
+    A hardlink is tried first. If it fails (e.g. across filesystems), a symlink is created when
+    ``allow_symlink`` is set, which must not be used for files read from inside a container
+    because the link target is not mounted there. Copying is the last resort.
+    """
+    dest = str(Path(dest_dir).joinpath(Path(src).name))
+    if os.path.lexists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+        return dest
+    except OSError:
+        pass
+    if allow_symlink:
+        try:
+            os.symlink(os.path.abspath(src), dest)
+            return dest
+        except OSError:
+            pass
+    shutil.copy2(src, dest)
+    return dest
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of ``path`` read in chunks."""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as in_f:
+        for chunk in iter(lambda: in_f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def default_cache_path(kind: str) -> str:
+    """Return ``$XDG_CACHE_HOME/biobb_asitedesign/<kind>`` (``~/.cache`` if unset)."""
+    cache_home = os.getenv('XDG_CACHE_HOME') or str(Path.home().joinpath('.cache'))
+    return str(Path(cache_home).joinpath('biobb_asitedesign', kind))
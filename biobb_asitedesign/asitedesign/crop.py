@@ -0,0 +1,141 @@
+""" Active-site cropping of input structures for package biobb_asitedesign.asitedesign """
+import json
+import typing
+from typing import Any, Dict, Iterable, List, Mapping, Set
+
+import numpy as np
+
+from biobb_asitedesign.asitedesign.pdb_index import PDBIndex, ResidueKey, parse_residue_key
+from biobb_asitedesign.asitedesign.preflight import ligand_entries
+
+_OFFSETS = np.array([(i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)], dtype=np.int64)
+
+
+def coordinates(index: PDBIndex) -> np.ndarray:
+    """Return the (n_atoms, 3) float array of the atom coordinates of ``index``."""
+    return np.array([(atom.x, atom.y, atom.z) for atom in index.atoms], dtype=np.float64).reshape(-1, 3)
+
+
+def within_cutoff(coords: np.ndarray, query: np.ndarray, cutoff: float) -> np.ndarray:
+    """Return a boolean mask of the ``coords`` closer than ``cutoff`` to any ``query`` point.
+
+    Uses a cell list with cells of side ``cutoff``, so only the atoms in the 27 cells around
+    every occupied query cell are compared, with vectorized distances per cell.
+    """
+    mask = np.zeros(len(coords), dtype=bool)
+    if not len(coords) or not len(query):
+        return mask
+    origin = np.minimum(coords.min(axis=0), query.min(axis=0)) - cutoff
+    cells = np.floor((coords - origin) / cutoff).astype(np.int64)
+    query_cells = np.floor((query - origin) / cutoff).astype(np.int64)
+    dims = np.maximum(cells.max(axis=0), query_cells.max(axis=0)) + 2
+
+    def cell_key(cell: np.ndarray) -> np.ndarray:
+        return (cell[..., 0] * dims[1] + cell[..., 1]) * dims[2] + cell[..., 2]
+
+    keys = cell_key(cells)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    cutoff2 = cutoff * cutoff
+
+    query_keys = cell_key(query_cells)
+    for key in np.unique(query_keys):
+        points = query[query_keys == key]
+        neighbor_keys = cell_key(query_cells[query_keys == key][0] + _OFFSETS)
+        starts = np.searchsorted(sorted_keys, neighbor_keys, side='left')
+        ends = np.searchsorted(sorted_keys, neighbor_keys, side='right')
+        candidates = np.concatenate([order[s:e] for s, e in zip(starts, ends)])
+        if not len(candidates):
+            continue
+        diff = coords[candidates][:, None, :] - points[None, :, :]
+        close = (np.einsum('ijk,ijk->ij', diff, diff) <= cutoff2).any(axis=1)
+        mask[candidates[close]] = True
+    return mask
+
+
+def core_residues(yaml_dict: Mapping[str, Any]) -> Set[ResidueKey]:
+    """Return the residues that define the active site: design positions, ligands and constrained residues."""
+    keys = set()
+    references: List[Any] = list(yaml_dict.get('DesignResidues') or {})
+    references.extend(ligand_entries(yaml_dict.get('Ligands')))
+    for constraint in (yaml_dict.get('Constraints') or {}).values():
+        if isinstance(constraint, Mapping):
+            references.extend([constraint.get('resi'), constraint.get('resj')])
+    for reference in references:
+        key = parse_residue_key(str(reference).strip()) if reference is not None else None
+        if key:
+            keys.add(key)
+    return keys
+
+
+def select_residues(index: PDBIndex, core: Iterable[ResidueKey], shell: float) -> List[ResidueKey]:
+    """Return, in file order, the whole residues with any atom within ``shell`` of the ``core`` residues."""
+    core = set(core)
+    atom_keys = [(atom.resnum, atom.chain) for atom in index.atoms]
+    coords = coordinates(index)
+    in_core = np.array([key in core for key in atom_keys], dtype=bool)
+    close = within_cutoff(coords, coords[in_core], shell) | in_core
+    kept = {atom_keys[i] for i in np.flatnonzero(close)}
+    return [key for key in index.residues if key in kept]
+
+
+def write_cropped_pdb(index: PDBIndex, pdb_path: str, kept: Iterable[ResidueKey], output_pdb_path: str,
+                      shell: float) -> str:
+    """Write the atoms of the ``kept`` residues of ``pdb_path`` keeping their original numbering."""
+    kept = set(kept)
+    lines_to_keep = {atom.line for atom in index.atoms if (atom.resnum, atom.chain) in kept}
+    with open(pdb_path) as in_f, open(output_pdb_path, 'w') as out_f:
+        out_f.write(f"REMARK 999 ACTIVE SITE CROP {len(kept)} OF {len(index.residues)} RESIDUES, SHELL {shell:.2f} A\n")
+        chain = None
+        for line_number, line in enumerate(in_f):
+            if line_number not in lines_to_keep:
+                continue
+            if chain is not None and line[21] != chain:
+                out_f.write("TER\n")
+            chain = line[21]
+            out_f.write(line if line.endswith('\n') else line + '\n')
+        out_f.write("TER\nEND\n")
+    return output_pdb_path
+
+
+def crop_structure(index: PDBIndex, pdb_path: str, yaml_dict: Mapping[str, Any], shell: float,
+                   output_pdb_path: str, map_path: str) -> Dict[str, Any]:
+    """Crop ``pdb_path`` around the active site of ``yaml_dict`` and write the residue mapping to ``map_path``.
+
+    The mapping lists, in pose order, the original ``resnum-chain`` of every kept residue, so
+    outputs renumbered sequentially can be mapped back with :func:`remap_pdb`.
+    """
+    core = core_residues(yaml_dict)
+    kept = select_residues(index, core, shell)
+    write_cropped_pdb(index, pdb_path, kept, output_pdb_path, shell)
+    crop_map = {'source': pdb_path,
+                'shell': shell,
+                'n_residues': len(index.residues),
+                'residues': [{'pose': pose, 'residue': f"{resnum}-{chain}", 'resname': index.residues[(resnum, chain)].resname}
+                             for pose, (resnum, chain) in enumerate(kept, start=1)]}
+    with open(map_path, 'w') as map_file:
+        json.dump(crop_map, map_file, indent=1)
+    return crop_map
+
+
+def remap_pdb(pdb_path: str, crop_map: Mapping[str, Any], output_pdb_path: str) -> str:
+    """Restore the original residue numbers and chains of a PDB written from a cropped pose.
+
+    Residues are matched by their order of appearance, which does not depend on whether
+    the writer kept the original numbering or renumbered the pose sequentially.
+    """
+    residues = [parse_residue_key(entry['residue']) for entry in crop_map['residues']]
+    position = -1
+    previous: typing.Optional[str] = None
+    with open(pdb_path) as in_f, open(output_pdb_path, 'w') as out_f:
+        for line in in_f:
+            if line[:6] in ('ATOM  ', 'HETATM'):
+                residue_id = line[17:27]
+                if residue_id != previous:
+                    previous = residue_id
+                    position += 1
+                if position < len(residues):
+                    resnum, chain = residues[position]
+                    line = f"{line[:21]}{chain}{resnum:>4}{line[26:]}"
+            out_f.write(line)
+    return output_pdb_path
@@ -0,0 +1,168 @@
+""" Convergence-based early stopping of adaptive sampling for package biobb_asitedesign.asitedesign """
+import contextlib
+import json
+import logging
+import os
+from pathlib import Path
+import shutil
+import signal
+import statistics
+import threading
+import time
+import typing
+from typing import Any, Callable, Dict, List, Optional
+
+from biobb_asitedesign.asitedesign import outputs
+
+
+def spawning_metric(epoch: int, n_iterations: int, spawning_steps: Optional[typing.Sequence[str]],
+                    default: Optional[str] = None) -> Optional[str]:
+    """Return the metric ranking ``epoch`` from ``SpawningMetricSteps`` entries like ``'0.8 FullAtomWithConstraints'``."""
+    ratio = (epoch + 1) / max(n_iterations, 1)
+    for step in spawning_steps or []:
+        limit, _, metric = str(step).partition(' ')
+        try:
+            if ratio <= float(limit) + 1e-9:
+                return metric.strip() or default
+        except ValueError:
+            continue
+    return default
+
+
+class ConvergenceMonitor(threading.Thread):
+    """Stop a running job once sampling has converged or its wall-clock budget is spent.
+
+    For every completed epoch the best and the mean (ensemble) score of its poses are read
+    with the metric that ranks that epoch. The epoch stagnates when neither improves on the
+    best values seen so far by ``threshold``; after ``patience`` consecutive stagnant epochs
+    (and at least ``min_epochs``) ``on_stop`` is called with the reason. A change of spawning
+    metric restarts the comparison, since the scores of different metrics are not comparable.
+    """
+
+    def __init__(self, root: str, name: str, n_iterations: int, on_stop: Callable[[str], Any],
+                 metric: Optional[str] = None, spawning_steps: Optional[typing.Sequence[str]] = None,
+                 threshold: float = 0.5, patience: int = 3, min_epochs: int = 3, wall_budget: Optional[float] = None,
+                 interval: float = 30, out_log: logging.Logger = None) -> None:
+        super().__init__(name='asitedesign-early-stop', daemon=True)
+        self.root = root
+        self.name_prefix = name
+        self.n_iterations = n_iterations
+        self.on_stop = on_stop
+        self.metric = metric
+        self.spawning_steps = spawning_steps
+        self.threshold = threshold
+        self.patience = patience
+        self.min_epochs = min_epochs
+        self.wall_budget = wall_budget
+        self.interval = interval
+        self.out_log = out_log
+        self.start_time = time.time()
+        self.epochs: List[Dict[str, Any]] = []
+        self.reason: Optional[str] = None
+        self._stagnant = 0
+        self._best: Optional[float] = None
+        self._ensemble: Optional[float] = None
+        self._stop_event = threading.Event()
+
+    def _score_epoch(self, epoch: int, path: Path) -> Optional[Dict[str, Any]]:
+        metric = spawning_metric(epoch, self.n_iterations, self.spawning_steps, self.metric)
+        scores = [score for score, _ in outputs.rank_poses(outputs.pose_files(path), metric) if score != float('inf')]
+        if not scores:
+            return None
+        return {'epoch': epoch, 'metric': metric, 'best': scores[0], 'ensemble': statistics.mean(scores),
+                'n_poses': len(scores)}
+
+    def check(self) -> Optional[str]:
+        """Score the newly completed epochs and return the reason to stop, if any."""
+        if self.reason:
+            return self.reason
+        scored = {record['epoch'] for record in self.epochs}
+        for epoch, path in outputs.completed_epochs(self.root, self.name_prefix):
+            if epoch in scored:
+                continue
+            record = self._score_epoch(epoch, path)
+            if record is None:
+                continue
+            if self.epochs and record['metric'] != self.epochs[-1]['metric']:
+                self._best = self._ensemble = None
+                self._stagnant = 0
+            if self._best is None:
+                record['improvement'] = None
+                self._best, self._ensemble = record['best'], record['ensemble']
+            else:
+                record['improvement'] = max(self._best - record['best'], self._ensemble - record['ensemble'])
+                self._stagnant = self._stagnant + 1 if record['improvement'] < self.threshold else 0
+                self._best, self._ensemble = min(self._best, record['best']), min(self._ensemble, record['ensemble'])
+            self.epochs.append(record)
+            if self.out_log:
+                self.out_log.info(f"Epoch {epoch}: best {record['best']:.3f}, ensemble {record['ensemble']:.3f} "
+                                  f"({record['metric']}), {self._stagnant} stagnant epoch(s)")
+
+        if len(self.epochs) >= self.min_epochs and self._stagnant >= self.patience:
+            self.reason = (f"converged: improvement below {self.threshold} for {self._stagnant} epochs "
+                           f"after epoch {self.epochs[-1]['epoch']}")
+        elif self.wall_budget and time.time() - self.start_time > self.wall_budget:
+            self.reason = f"wall-clock budget of {self.wall_budget:.0f} s spent"
+        return self.reason
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                reason = self.check()
+            except OSError:
+                continue
+            if reason:
+                if self.out_log:
+                    self.out_log.info(f"Early stopping: {reason}")
+                self.on_stop(reason)
+                return
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join()
+
+    def report(self) -> Dict[str, Any]:
+        return {'stopped': self.reason is not None, 'reason': self.reason, 'elapsed': time.time() - self.start_time,
+                'threshold': self.threshold, 'patience': self.patience, 'epochs': self.epochs}
+
+
+def terminate_process_group(pgid: int, grace: float = 30) -> None:
+    """Send SIGTERM to the process group ``pgid`` and SIGKILL to what is left of it after ``grace``."""
+    with contextlib.suppress(ProcessLookupError, PermissionError):
+        os.killpg(pgid, signal.SIGTERM)
+    deadline = time.time() + grace
+    while time.time() < deadline and _group_alive(pgid):
+        time.sleep(0.2)
+    with contextlib.suppress(ProcessLookupError, PermissionError):
+        os.killpg(pgid, signal.SIGKILL)
+
+
+def _group_alive(pgid: int) -> bool:
+    try:
+        os.killpg(pgid, 0)
+    except (ProcessLookupError, PermissionError):
+        return False
+    return True
+
+
+def package_best_poses(root: str, name: str, n_poses: int, metric: Optional[str] = None) -> List[Path]:
+    """Write the ``n_poses`` best poses of the completed epochs to ``<Name>_final_pose`` unless it has poses already."""
+    final_dir = outputs.final_pose_dir(root, name)
+    if outputs.pose_files(final_dir):
+        return []
+    final_dir.mkdir(parents=True, exist_ok=True)
+    epochs = {pose: epoch for epoch, path in outputs.completed_epochs(root, name) for pose in outputs.pose_files(path)}
+    written = []
+    for rank, (score, path) in enumerate(outputs.rank_poses(epochs, metric, n_poses), start=1):
+        dest = final_dir.joinpath(f"{rank}_epoch{epochs[path]}_{path.name}")
+        shutil.copy2(path, dest)
+        written.append(dest)
+    return written
+
+
+def write_report(monitor: ConvergenceMonitor, report_path: str) -> Dict[str, Any]:
+    report = monitor.report()
+    with open(report_path, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+    return report
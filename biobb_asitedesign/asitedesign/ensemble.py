@@ -0,0 +1,159 @@
+""" Multi-replica ensembles of a design for package biobb_asitedesign.asitedesign
+
+A single adaptive sampling run can get stuck around its starting point, so the same design is
+run as independent replicas, each with its own seed, sandbox and slice of the cores. Their final
+poses are then merged into one ranked set keeping the best pose of every mutant sequence (the
+residues at ``DesignResidues``), and packed with the replica outputs into one zip.
+"""
+import csv
+import os
+from pathlib import Path
+import shutil
+import typing
+from typing import Any, Dict, List, Mapping, Optional, Union
+
+from biobb_asitedesign.asitedesign import mpi, outputs
+from biobb_asitedesign.asitedesign.archive import AppendableArchive
+from biobb_asitedesign.asitedesign.pdb_index import ResidueKey
+from biobb_asitedesign.asitedesign.reader import OutputArchive
+
+# Properties naming files of a job, made unique per replica when they are set explicitly
+REPLICA_PATH_PROPERTIES = ('checkpoint_path', 'telemetry_path', 'profile_path', 'stream_index_path', 'stream_shards_path')
+# Properties of the ensemble that do not apply to the replicas
+# Properties naming files or folders of the host, made absolute before a replica runs from its own folder
+HOST_PATH_PROPERTIES = ('sandbox_path', 'params_cache_path', 'result_cache_path', 'results_index_path',
+                        'instance_pool_path') + REPLICA_PATH_PROPERTIES
+ENSEMBLE_PROPERTIES = ('replicas', 'result_cache', 'results_index', 'telemetry_port', 'mpi_hosts', 'cluster',
+                       'warm_start_from', 'warm_start_top')
+TABLE_FIELDS = ['rank', 'replica', 'seed', 'score', 'sequence', 'pose', 'source']
+
+
+class EnsemblePose(typing.NamedTuple):
+    rank: int
+    replica: int
+    seed: int
+    score: float
+    sequence: Optional[str]
+    pose: str
+    source: str
+
+
+def replica_cpus(cpus: Union[int, str], replicas: int) -> List[Union[int, str]]:
+    """Split the MPI ranks of ``cpus`` between ``replicas``, the remainder going to the first ones.
+
+    With ``auto`` every replica gets its own ``auto`` sizing.
+    """
+    if replicas < 1:
+        raise ValueError(f"replicas must be at least 1, got {replicas}")
+    if str(cpus).lower() == 'auto':
+        return ['auto'] * replicas
+    minimum = mpi.CONTROLLER_RANKS + 1
+    if int(cpus) < replicas * minimum:
+        raise ValueError(f"{cpus} cpus can not run {replicas} replicas of at least {minimum} MPI ranks each")
+    share, extra = divmod(int(cpus), replicas)
+    return [share + (index < extra) for index in range(replicas)]
+
+
+def replica_seeds(seed: Optional[int], replicas: int) -> List[int]:
+    """Return the seeds of the replicas: consecutive from ``seed``, or from a random one if it is None."""
+    base = int(seed) if seed is not None else int.from_bytes(os.urandom(4), 'little') % 2 ** 31
+    return [base + index for index in range(replicas)]
+
+
+def absolute_paths(properties: Mapping[str, Any], cwd: Optional[str] = None) -> Dict[str, Any]:
+    """Return ``properties`` with their relative host paths made absolute from ``cwd`` (default: the current
+    folder), for a job that runs from another folder.
+
+    container_path is only resolved when it is a path rather than a command, container_image when
+    it names an existing file rather than a docker image, and scratch_path candidate by candidate.
+    """
+    base = Path(cwd or os.getcwd())
+    resolved = dict(properties)
+
+    def absolute(value: Any) -> str:
+        path = Path(os.path.expanduser(str(value).strip()))
+        return str(path if path.is_absolute() else base.joinpath(path))
+
+    for key in HOST_PATH_PROPERTIES:
+        if resolved.get(key):
+            resolved[key] = absolute(resolved[key])
+    if resolved.get('container_path') and os.sep in str(resolved['container_path']):
+        resolved['container_path'] = absolute(resolved['container_path'])
+    if resolved.get('container_image') and base.joinpath(str(resolved['container_image'])).exists():
+        resolved['container_image'] = absolute(resolved['container_image'])
+    if resolved.get('scratch_path') and str(resolved['scratch_path']).strip().lower() != 'auto':
+        # Candidates under an environment variable are expanded by the job itself
+        resolved['scratch_path'] = ','.join(entry.strip() if entry.strip().startswith('$') else absolute(entry)
+                                            for entry in str(resolved['scratch_path']).split(',') if entry.strip())
+    return resolved
+
+
+def replica_properties(properties: Mapping[str, Any], index: int, cpus: Union[int, str], seed: int) -> Dict[str, Any]:
+    """Return the properties of replica ``index`` of an ensemble described by ``properties``, with
+    absolute host paths since every replica runs from its own folder."""
+    replica = {key: value for key, value in absolute_paths(properties).items() if key not in ENSEMBLE_PROPERTIES}
+    replica.update(cpus=cpus, seed=seed)
+    # Concurrent mpiruns binding to cores would all pin their ranks starting from the first core
+    replica.setdefault('mpi_bind_to', 'none')
+    for key in REPLICA_PATH_PROPERTIES:
+        if replica.get(key):
+            path = Path(replica[key])
+            replica[key] = str(path.with_name(f"{path.stem}_replica{index}{path.suffix}"))
+    return replica
+
+
+def extract_final_poses(replica_zip: str, dest_dir: str) -> List[Path]:
+    """Extract the final poses (``*_final_pose/*.pdb`` members) of a replica output zip into ``dest_dir``."""
+    with OutputArchive(replica_zip) as archive:
+        return sorted(archive.extract(archive.final_poses, dest_dir, flatten=True))
+
+
+def merge_final_poses(replica_poses: Mapping[int, typing.Iterable[Path]], seeds: typing.Sequence[int],
+                      final_dir: str, keys: typing.Sequence[ResidueKey],
+                      metric: Optional[str] = None) -> List[EnsemblePose]:
+    """Rank the final poses of all the replicas and copy the best pose of every mutant sequence to ``final_dir``.
+
+    Without design residue ``keys`` the poses can not be told apart by sequence and all are kept.
+    Poses are written as ``<rank>_replica<index>_<name>``.
+    """
+    scored = []
+    for replica, paths in replica_poses.items():
+        for score, path in outputs.rank_poses(paths, metric):
+            scored.append((score, replica, path))
+    scored.sort(key=lambda item: (item[0], item[1], item[2].name))
+
+    Path(final_dir).mkdir(parents=True, exist_ok=True)
+    merged: List[EnsemblePose] = []
+    seen = set()
+    for score, replica, path in scored:
+        sequence = outputs.mutant_sequence(path, keys) if keys else None
+        if sequence is not None:
+            if sequence in seen:
+                continue
+            seen.add(sequence)
+        rank = len(merged) + 1
+        dest = Path(final_dir).joinpath(f"{rank}_replica{replica}_{path.name}")
+        shutil.copy2(path, dest)
+        merged.append(EnsemblePose(rank, replica, seeds[replica], score, sequence, dest.name, str(path)))
+    return merged
+
+
+def write_table(poses: typing.Iterable[EnsemblePose], table_path: str) -> str:
+    with open(table_path, 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=TABLE_FIELDS)
+        writer.writeheader()
+        for pose in poses:
+            writer.writerow(dict(pose._asdict(), source=Path(pose.source).name))
+    return table_path
+
+
+def package_ensemble(zip_file: str, sandbox: str, file_list: typing.Iterable[str], replica_zips: Mapping[int, str],
+                     compress_level: int = 6, workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Write the ensemble output zip: ``file_list`` of the ``sandbox`` and, below ``<sandbox>/replica_<index>/``,
+    the members of every replica zip, copied without recompressing them."""
+    sandbox = Path(sandbox).resolve()
+    archive = AppendableArchive(zip_file, compress_level, workers)
+    archive.append(file_list, base=str(sandbox.parent))
+    for index in sorted(replica_zips):
+        archive.append_archive(replica_zips[index], prefix=f"{sandbox.name}/replica_{index}/")
+    return archive.close()
@@ -0,0 +1,148 @@
+""" Node lists and MPI hostfiles of multi-node launches for package biobb_asitedesign.asitedesign
+
+The nodes of a job come from an explicit list, the SLURM allocation (``SLURM_JOB_NODELIST``
+with ``SLURM_JOB_CPUS_PER_NODE``) or the PBS node file (``PBS_NODEFILE``, one line per slot).
+The ranks are spread round-robin over the nodes, the controller rank first, and written to an
+Open MPI hostfile where the slots of every node are the ranks it gets.
+"""
+import os
+from pathlib import Path
+import re
+import typing
+from typing import Iterable, List, Mapping, Optional, Union
+
+BRACKET_RE = re.compile(r'^([^\[,]*)\[([^\]]+)\](.*)$')
+TASKS_RE = re.compile(r'^(\d+)(?:\(x(\d+)\))?$')
+
+
+class Node(typing.NamedTuple):
+    host: str
+    slots: int
+
+
+def _split_top_level(expression: str) -> List[str]:
+    """Split a hostlist on the commas outside brackets."""
+    parts, depth, current = [], 0, ''
+    for char in expression:
+        if char == ',' and not depth:
+            parts.append(current)
+            current = ''
+            continue
+        depth += {'[': 1, ']': -1}.get(char, 0)
+        current += char
+    parts.append(current)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def expand_hostlist(expression: str) -> List[str]:
+    """Expand a SLURM hostlist such as ``node[01-03,07],gpu-[1-2]-ib`` keeping the zero padding."""
+    hosts = []
+    for part in _split_top_level(expression):
+        match = BRACKET_RE.match(part)
+        if not match:
+            hosts.append(part)
+            continue
+        prefix, ranges, suffix = match.groups()
+        for item in ranges.split(','):
+            first, _, last = item.partition('-')
+            for number in range(int(first), int(last or first) + 1):
+                for suffix_host in expand_hostlist(suffix) if suffix else ['']:
+                    hosts.append(f"{prefix}{number:0{len(first)}d}{suffix_host}")
+    return hosts
+
+
+def expand_tasks(expression: str) -> List[int]:
+    """Expand a SLURM per-node count such as ``16(x2),8`` to ``[16, 16, 8]``."""
+    counts = []
+    for item in expression.split(','):
+        match = TASKS_RE.match(item.strip())
+        if match:
+            counts.extend([int(match.group(1))] * int(match.group(2) or 1))
+    return counts
+
+
+def slurm_nodes(env: Mapping[str, str]) -> List[Node]:
+    nodelist = env.get('SLURM_JOB_NODELIST') or env.get('SLURM_NODELIST')
+    if not nodelist:
+        return []
+    hosts = expand_hostlist(nodelist)
+    counts = expand_tasks(env.get('SLURM_JOB_CPUS_PER_NODE') or env.get('SLURM_TASKS_PER_NODE') or '')
+    if len(counts) != len(hosts):
+        counts = [1] * len(hosts)
+    return [Node(host, count) for host, count in zip(hosts, counts)]
+
+
+def read_node_file(node_file: str) -> List[Node]:
+    """Read a node file with one host per slot (PBS) or ``host``, ``host:slots`` or ``host slots=N`` lines."""
+    slots = {}
+    with open(node_file) as nodes:
+        for line in nodes:
+            line = line.split('#')[0].strip()
+            if line:
+                host, count = _parse_host(line)
+                slots[host] = slots.get(host, 0) + count
+    return [Node(host, count) for host, count in slots.items()]
+
+
+def _parse_host(entry: str) -> typing.Tuple[str, int]:
+    entry = entry.strip()
+    match = re.match(r'^(\S+)\s+slots\s*=\s*(\d+)', entry)
+    if match:
+        return match.group(1), int(match.group(2))
+    host, _, count = entry.partition(':')
+    return host, int(count or 1)
+
+
+def parse_hosts(hosts: Union[str, Iterable[str]]) -> List[Node]:
+    """Return the nodes of an explicit list: a node file path, a comma separated string or a list of entries."""
+    if isinstance(hosts, str):
+        if os.path.isfile(hosts):
+            return read_node_file(hosts)
+        hosts = _split_top_level(hosts)
+    nodes = []
+    for entry in hosts:
+        host, count = _parse_host(str(entry))
+        nodes.extend(Node(expanded, count) for expanded in expand_hostlist(host))
+    return nodes
+
+
+def discover_nodes(hosts: Union[str, Iterable[str], None] = 'auto', env: Optional[Mapping[str, str]] = None) -> List[Node]:
+    """Return the nodes of the job: ``hosts`` if explicit, else (``auto``) the SLURM or PBS allocation."""
+    env = os.environ if env is None else env
+    if hosts and hosts != 'auto':
+        return parse_hosts(hosts)
+    nodes = slurm_nodes(env)
+    if not nodes and env.get('PBS_NODEFILE'):
+        nodes = read_node_file(env['PBS_NODEFILE'])
+    return nodes
+
+
+def distribute_ranks(nodes: typing.Sequence[Node], ranks: int) -> List[Node]:
+    """Spread ``ranks`` round-robin over ``nodes`` within their slots, rank 0 (the controller) on the first node.
+
+    Returns the nodes that get ranks, with ``slots`` set to their number of ranks. Ranks beyond
+    the total slots are spread the same way ignoring the slots (oversubscription).
+    """
+    if not nodes:
+        raise ValueError("No nodes to distribute the MPI ranks on")
+    counts = [0] * len(nodes)
+    assigned = 0
+    while assigned < ranks:
+        progress = False
+        for index, node in enumerate(nodes):
+            if assigned < ranks and counts[index] < node.slots:
+                counts[index] += 1
+                assigned += 1
+                progress = True
+        if not progress:
+            for index in range(len(nodes)):
+                if assigned < ranks:
+                    counts[index] += 1
+                    assigned += 1
+    return [Node(node.host, count) for node, count in zip(nodes, counts) if count]
+
+
+def write_hostfile(assignment: Iterable[Node], hostfile_path: str) -> str:
+    """Write an Open MPI hostfile with the ranks of every node as its slots."""
+    Path(hostfile_path).write_text(''.join(f"{node.host} slots={node.slots}\n" for node in assignment))
+    return hostfile_path
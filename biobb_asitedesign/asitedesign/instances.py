@@ -0,0 +1,276 @@
+""" Pool of warm container instances for package biobb_asitedesign.asitedesign
+
+Starting the PyRosetta image costs several seconds per ``singularity exec``/``docker run``.
+The pool keeps long-lived instances (``singularity instance start`` or ``docker run -d``) with the
+sandbox root mounted, and jobs run inside them with ``exec``. The pool state is shared by all
+the processes of a user through a JSON file guarded by a file lock, so instances are reused
+across launches and tear themselves down after an idle timeout.
+"""
+import argparse
+import contextlib
+import fcntl
+import json
+import logging
+import os
+from pathlib import Path
+import shlex
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Mapping, Optional
+import uuid
+
+from biobb_asitedesign.asitedesign.common import default_cache_path
+
+INSTANCE_MOUNT = '/asitedesign_sandboxes'
+STATE_FILE = 'instances.json'
+LOCK_FILE = 'pool.lock'
+REAPER_PID_FILE = 'reaper.pid'
+
+
+def container_runtime(container_path: Optional[str]) -> Optional[str]:
+    """Return 'singularity' or 'docker' for the container binaries that support warm instances."""
+    for runtime in ('singularity', 'docker'):
+        if container_path and container_path.endswith(runtime):
+            return runtime
+    return None
+
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ContainerInstance:
+    """A running instance of ``image`` with ``host_root`` mounted at ``mount``."""
+
+    def __init__(self, name: str, container_path: str, image: str, host_root: str, mount: str = INSTANCE_MOUNT,
+                 shell_path: str = '/bin/bash', **state: Any) -> None:
+        self.name = name
+        self.container_path = container_path
+        self.runtime = container_runtime(container_path)
+        self.image = image
+        self.host_root = host_root
+        self.mount = mount
+        self.shell_path = shell_path
+        self.state = state
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.state, name=self.name, container_path=self.container_path, image=self.image,
+                    host_root=self.host_root, mount=self.mount, shell_path=self.shell_path)
+
+    def start_command(self) -> List[str]:
+        bind = f"{self.host_root}:{self.mount}"
+        if self.runtime == 'singularity':
+            return [self.container_path, 'instance', 'start', '--bind', bind, self.image, self.name]
+        return [self.container_path, 'run', '-d', '--rm', '--name', self.name, '-v', bind, '--entrypoint', 'sleep',
+                self.image, 'infinity']
+
+    def stop_command(self) -> List[str]:
+        if self.runtime == 'singularity':
+            return [self.container_path, 'instance', 'stop', self.name]
+        return [self.container_path, 'rm', '-f', self.name]
+
+    def exec_command(self, cmd: str, workdir: str, env: Mapping[str, str] = None) -> List[str]:
+        """Return the command line running the shell command ``cmd`` in ``workdir`` inside the instance.
+
+        The elements are quoted, so the list can be joined and run through a shell.
+        """
+        script = f"cd {shlex.quote(workdir)} && {cmd}"
+        command = [self.container_path, 'exec']
+        if self.runtime == 'singularity':
+            if env:
+                command.extend(['--env', ','.join(f"{key}={value}" for key, value in env.items())])
+            command.append(f"instance://{self.name}")
+        else:
+            for key, value in (env or {}).items():
+                command.extend(['-e', f"{key}={value}"])
+            command.extend(['-w', workdir, self.name])
+        command.extend([self.shell_path, '-c', script])
+        return [shlex.quote(part) for part in command]
+
+    def is_running(self) -> bool:
+        if self.runtime == 'singularity':
+            result = subprocess.run([self.container_path, 'instance', 'list'], capture_output=True, text=True)
+            return result.returncode == 0 and any(line.split()[:1] == [self.name] for line in result.stdout.splitlines())
+        result = subprocess.run([self.container_path, 'inspect', '-f', '{{.State.Running}}', self.name],
+                                capture_output=True, text=True)
+        return result.returncode == 0 and result.stdout.strip() == 'true'
+
+    def start(self) -> None:
+        subprocess.run(self.start_command(), check=True, capture_output=True, text=True)
+
+    def stop(self) -> None:
+        subprocess.run(self.stop_command(), capture_output=True, text=True)
+
+
+class InstancePool:
+    """Persistent pool of warm :class:`ContainerInstance` shared by all the launches of a user.
+
+    An instance serves one job at a time. :meth:`acquire` reuses an idle running instance with
+    the same image and mount, or starts a new one, and :meth:`release` makes it idle again and
+    stops the instances idle for longer than ``idle_timeout`` seconds or beyond the
+    ``max_idle`` most recently used ones.
+    """
+
+    def __init__(self, container_path: str, image: str, host_root: str, pool_path: Optional[str] = None,
+                 max_idle: int = 2, idle_timeout: float = 600, mount: str = INSTANCE_MOUNT,
+                 shell_path: str = '/bin/bash', out_log: logging.Logger = None) -> None:
+        if not container_runtime(container_path):
+            raise ValueError(f"Warm instances are only supported for singularity and docker, not {container_path!r}")
+        self.container_path = container_path
+        self.image = image
+        self.host_root = str(Path(host_root).resolve())
+        self.pool_path = Path(pool_path or default_cache_path('instances'))
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.mount = mount
+        self.shell_path = shell_path
+        self.out_log = out_log
+        self.pool_path.mkdir(parents=True, exist_ok=True)
+
+    @contextlib.contextmanager
+    def _locked_state(self):
+        with open(self.pool_path.joinpath(LOCK_FILE), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            state_file = self.pool_path.joinpath(STATE_FILE)
+            state = json.loads(state_file.read_text()) if state_file.exists() else {}
+            yield state
+            tmp = self.pool_path.joinpath(f".{STATE_FILE}.{uuid.uuid4().hex}")
+            tmp.write_text(json.dumps(state, indent=2))
+            os.replace(tmp, state_file)
+
+    def _log(self, message: str) -> None:
+        if self.out_log:
+            self.out_log.info(message)
+
+    def _matches(self, entry: Mapping[str, Any]) -> bool:
+        return (entry['container_path'], entry['image'], entry['host_root'], entry['mount']) == \
+            (self.container_path, self.image, self.host_root, self.mount)
+
+    def acquire(self) -> ContainerInstance:
+        with self._locked_state() as state:
+            for name, entry in sorted(state.items(), key=lambda item: -item[1]['last_used']):
+                if not self._matches(entry) or _pid_alive(entry.get('owner')):
+                    continue
+                instance = ContainerInstance(**entry)
+                if instance.is_running():
+                    entry['owner'] = os.getpid()
+                    self._log(f"Reusing warm container instance {name}")
+                    return instance
+                del state[name]
+            instance = ContainerInstance(f"asitedesign_{uuid.uuid4().hex[:12]}", self.container_path, self.image,
+                                         self.host_root, self.mount, self.shell_path, owner=os.getpid(),
+                                         last_used=time.time(), started=time.time(), idle_timeout=self.idle_timeout,
+                                         max_idle=self.max_idle)
+            # Register before starting so a concurrent reaper stops it if this process dies
+            state[instance.name] = instance.to_dict()
+        self._log(f"Starting warm container instance {instance.name}: {' '.join(instance.start_command())}")
+        try:
+            instance.start()
+        except subprocess.CalledProcessError:
+            with self._locked_state() as state:
+                state.pop(instance.name, None)
+            raise
+        return instance
+
+    def release(self, instance: ContainerInstance) -> List[str]:
+        with self._locked_state() as state:
+            if instance.name in state:
+                state[instance.name]['owner'] = None
+                state[instance.name]['last_used'] = time.time()
+        return self.reap()
+
+    def reap(self, now: Optional[float] = None) -> List[str]:
+        """Stop the idle instances past the idle timeout or beyond ``max_idle``, and forget the dead ones."""
+        now = now or time.time()
+        to_stop = []
+        with self._locked_state() as state:
+            idle = sorted(((entry['last_used'], name) for name, entry in state.items()
+                           if not _pid_alive(entry.get('owner'))), reverse=True)
+            kept = 0
+            for last_used, name in idle:
+                entry = state[name]
+                if now - last_used < self.idle_timeout and (not self._matches(entry) or kept < self.max_idle):
+                    kept += self._matches(entry)
+                    continue
+                to_stop.append(ContainerInstance(**state.pop(name)))
+        for instance in to_stop:
+            self._log(f"Stopping idle container instance {instance.name}")
+            instance.stop()
+        return [instance.name for instance in to_stop]
+
+    def stop_all(self) -> List[str]:
+        """Stop every instance of the pool that is not running a job."""
+        with self._locked_state() as state:
+            to_stop = [ContainerInstance(**state.pop(name)) for name in list(state) if not _pid_alive(state[name].get('owner'))]
+        for instance in to_stop:
+            instance.stop()
+        return [instance.name for instance in to_stop]
+
+    def schedule_reaper(self) -> Optional[int]:
+        """Start, unless one is already running, a detached process reaping the pool until it is empty.
+
+        Returns:
+            int: PID of the reaper started, None if one was already watching the pool.
+        """
+        with self._locked_state():
+            pid_file = self.pool_path.joinpath(REAPER_PID_FILE)
+            if pid_file.exists() and _pid_alive(int(pid_file.read_text() or 0)):
+                return None
+            reaper = subprocess.Popen([sys.executable, '-m', 'biobb_asitedesign.asitedesign.instances', '--watch',
+                                       '--pool-path', str(self.pool_path)],
+                                      stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                      start_new_session=True)
+            pid_file.write_text(str(reaper.pid))
+        return reaper.pid
+
+
+def reap_pool(pool_path: str, now: Optional[float] = None, stop_all: bool = False) -> List[str]:
+    """Reap every instance recorded in ``pool_path`` with the idle timeout stored with it."""
+    stopped = []
+    state_file = Path(pool_path).joinpath(STATE_FILE)
+    if not state_file.exists():
+        return stopped
+    entries = json.loads(state_file.read_text())
+    for key in {(entry['container_path'], entry['image'], entry['host_root'], entry['mount'],
+                 entry.get('idle_timeout', 0), entry.get('max_idle', 0)) for entry in entries.values()}:
+        container_path, image, host_root, mount, idle_timeout, max_idle = key
+        pool = InstancePool(container_path, image, host_root, pool_path, max_idle, idle_timeout, mount)
+        stopped.extend(pool.stop_all() if stop_all else pool.reap(now))
+    return stopped
+
+
+def watch_pool(pool_path: str, poll_interval: float = None) -> None:
+    """Reap the pool until no instance is left, waking up at the shortest idle timeout of its instances."""
+    state_file = Path(pool_path).joinpath(STATE_FILE)
+    while True:
+        reap_pool(pool_path)
+        entries = json.loads(state_file.read_text()) if state_file.exists() else {}
+        if not entries:
+            return
+        time.sleep(poll_interval or max(min(entry.get('idle_timeout', 60) for entry in entries.values()), 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintenance of the pool of warm AsiteDesign container instances.')
+    parser.add_argument('--pool-path', default=default_cache_path('instances'), help='Folder of the pool state.')
+    parser.add_argument('--watch', action='store_true', help='Keep reaping idle instances until the pool is empty.')
+    parser.add_argument('--stop-all', action='store_true', help='Stop every idle instance.')
+    args = parser.parse_args()
+    if args.watch:
+        watch_pool(args.pool_path)
+        return
+    for name in reap_pool(args.pool_path, stop_all=args.stop_all):
+        print(f"Stopped {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+""" Sizing, core binding and mapping of the mpirun command for package biobb_asitedesign.asitedesign
+
+AsiteDesign runs one pose per MPI worker plus a controller rank (``nPoses <= nprocesses - 1``).
+The rank count is derived from ``nPoses`` and checked against the cores this process may
+really use, which is the affinity mask limited by the cgroup CPU quota.
+"""
+import math
+import os
+from pathlib import Path
+import typing
+from typing import Dict, List, Optional, Union
+
+# Ranks of the engine that do not run a pose
+CONTROLLER_RANKS = 1
+OVERSUBSCRIBE_POLICIES = ('clamp', 'warn', 'error')
+
+
+def parse_cpulist(cpulist: str) -> List[int]:
+    """Return the cores of a kernel cpu list such as ``0-3,8,10-11``."""
+    cores: List[int] = []
+    for part in cpulist.strip().split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            cores.extend(range(int(first), int(last) + 1))
+        elif part:
+            cores.append(int(part))
+    return cores
+
+
+def cgroup_cpu_quota(proc_cgroup: str = '/proc/self/cgroup', cgroup_root: str = '/sys/fs/cgroup') -> Optional[float]:
+    """Return the CPU quota of the cgroup of the process in cores, None if it is unlimited or unknown.
+
+    Reads ``cpu.max`` for cgroup v2 and ``cpu.cfs_quota_us``/``cpu.cfs_period_us`` for v1.
+    """
+    try:
+        with open(proc_cgroup) as cgroup_file:
+            entries = [line.rstrip('\n').split(':', 2) for line in cgroup_file if line.strip()]
+    except OSError:
+        return None
+    for hierarchy, controllers, path in entries:
+        try:
+            if hierarchy == '0' and not controllers:
+                quota, period = Path(cgroup_root).joinpath(path.lstrip('/'), 'cpu.max').read_text().split()
+                if quota != 'max':
+                    return int(quota) / int(period)
+            elif 'cpu' in controllers.split(','):
+                for mount in ('cpu', 'cpu,cpuacct', 'cpuacct,cpu'):
+                    folder = Path(cgroup_root, mount).joinpath(path.lstrip('/'))
+                    if folder.joinpath('cpu.cfs_quota_us').exists():
+                        quota = int(folder.joinpath('cpu.cfs_quota_us').read_text())
+                        if quota > 0:
+                            return quota / int(folder.joinpath('cpu.cfs_period_us').read_text())
+                        break
+        except (OSError, ValueError):
+            continue
+    return None
+
+
+def affinity_cores() -> List[int]:
+    """Return the cores of the affinity mask of the process."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def available_cores(cores: typing.Sequence[int] = None, quota: Optional[float] = None) -> int:
+    """Return the number of cores this process may keep busy: its affinity mask limited by the cgroup quota."""
+    cores = affinity_cores() if cores is None else cores
+    quota = cgroup_cpu_quota() if quota is None else quota
+    if quota:
+        return max(1, min(len(cores), math.ceil(quota - 1e-6)))
+    return max(1, len(cores))
+
+
+def numa_nodes(cores: typing.Iterable[int] = None, node_root: str = '/sys/devices/system/node') -> Dict[int, List[int]]:
+    """Return the NUMA nodes spanned by ``cores`` (default: the affinity mask) with their cores in the mask."""
+    cores = set(affinity_cores() if cores is None else cores)
+    nodes = {}
+    for node_dir in sorted(Path(node_root).glob('node[0-9]*')):
+        try:
+            node_cores = [core for core in parse_cpulist(node_dir.joinpath('cpulist').read_text()) if core in cores]
+        except (OSError, ValueError):
+            continue
+        if node_cores:
+            nodes[int(node_dir.name[4:])] = node_cores
+    return nodes
+
+
+def requested_ranks(cpus: Union[int, str], n_poses: int) -> int:
+    """Return the ranks asked by the ``cpus`` property: one per pose plus the controller for ``auto``."""
+    if str(cpus).lower() == 'auto':
+        return int(n_poses) + CONTROLLER_RANKS
+    return int(cpus)
+
+
+class MpiPlan(typing.NamedTuple):
+    ranks: int
+    available: int
+    options: List[str]
+    messages: List[str]
+
+    def command(self, program: str) -> str:
+        return ' '.join(['mpirun', '-n', str(self.ranks)] + self.options + [program])
+
+
+def plan_mpi(cpus: Union[int, str], n_poses: int, available: Optional[int] = None,
+             numa: Optional[Dict[int, List[int]]] = None, bind_to: Optional[str] = 'core',
+             map_by: Optional[str] = None, oversubscribe: str = 'clamp') -> MpiPlan:
+    """Size the mpirun of a job and choose its binding and mapping options (Open MPI syntax).
+
+    Args:
+        cpus: Ranks to start, or ``auto`` for ``n_poses`` plus the controller rank.
+        n_poses: Poses of the job, one per worker rank.
+        available: Cores available to the job (default :func:`available_cores`).
+        numa: NUMA nodes spanned by those cores (default :func:`numa_nodes`).
+        bind_to: ``--bind-to`` policy, None or ``none`` to leave the ranks unbound.
+        map_by: ``--map-by`` policy. By default ranks are spread over the NUMA nodes when the
+            cores span several of them, and mapped by core otherwise.
+        oversubscribe: With more ranks than cores, ``clamp`` reduces the ranks to the cores,
+            ``warn`` keeps them unbound with ``--oversubscribe`` and ``error`` raises ValueError.
+    """
+    if oversubscribe not in OVERSUBSCRIBE_POLICIES:
+        raise ValueError(f"oversubscribe must be one of {OVERSUBSCRIBE_POLICIES}, not {oversubscribe!r}")
+    available = available_cores() if available is None else available
+    numa = numa_nodes() if numa is None else numa
+    ranks = requested_ranks(cpus, n_poses)
+    messages = []
+    oversubscribed = False
+
+    if ranks > available:
+        message = f"{ranks} MPI ranks requested but only {available} cores are available"
+        if oversubscribe == 'error':
+            raise ValueError(message)
+        if oversubscribe == 'clamp' and available > CONTROLLER_RANKS:
+            ranks = available
+            messages.append(f"WARNING: {message}, clamped to {ranks} ranks")
+        else:
+            oversubscribed = True
+            messages.append(f"WARNING: {message}, the cores will be oversubscribed")
+    elif ranks < available:
+        messages.append(f"{available - ranks} of the {available} available cores will be idle")
+
+    workers = ranks - CONTROLLER_RANKS
+    if workers < 1:
+        messages.append(f"WARNING: {ranks} MPI ranks leave no worker rank besides the controller")
+    elif workers < n_poses:
+        messages.append(f"WARNING: {n_poses} poses on {workers} worker ranks, "
+                        f"AsiteDesign expects nPoses <= ranks - {CONTROLLER_RANKS}")
+
+    options = []
+    if oversubscribed:
+        options.append('--oversubscribe')
+        options.extend(['--bind-to', 'none'])
+    elif bind_to and bind_to != 'none':
+        options.extend(['--bind-to', bind_to])
+        if not map_by:
+            map_by = 'numa' if len(numa) > 1 and ranks > 1 else 'core'
+    if map_by and not oversubscribed:
+        options.extend(['--map-by', map_by])
+    return MpiPlan(ranks, available, options, messages)
@@ -0,0 +1,135 @@
+""" Layout and scores of the AsiteDesign output folders for package biobb_asitedesign.asitedesign
+
+AsiteDesign writes the sampling epochs of a job called ``Name`` under ``<Name>_output`` (one sub
+folder per epoch, numbered by a trailing integer) and the reported designs under
+``<Name>_final_pose``. Poses are PDB files with the Rosetta pose energies table and/or
+``REMARK <metric> <value>`` lines.
+"""
+import math
+from pathlib import Path, PurePosixPath
+import re
+import typing
+from typing import Dict, List, Optional, Tuple, Union
+
+from biobb_asitedesign.asitedesign.pdb_index import PDBIndex, ResidueKey, parse_residue_key
+
+EPOCH_RE = re.compile(r'(\d+)$')
+REMARK_SCORE_RE = re.compile(r'^REMARK\s+(\S+)\s*[:=]?\s+(-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)\s*$')
+
+PathLike = Union[str, Path]
+
+
+def output_dir(root: PathLike, name: str) -> Path:
+    return Path(root).joinpath(f"{name}_output")
+
+
+def final_pose_dir(root: PathLike, name: str) -> Path:
+    return Path(root).joinpath(f"{name}_final_pose")
+
+
+def epoch_number(path: PathLike) -> Optional[int]:
+    match = EPOCH_RE.search(Path(path).name)
+    return int(match.group(1)) if match else None
+
+
+def epoch_dirs(root: PathLike, name: str) -> List[Tuple[int, Path]]:
+    """Return the (epoch number, folder) pairs found under ``<Name>_output``, in epoch order."""
+    folder = output_dir(root, name)
+    if not folder.is_dir():
+        return []
+    epochs = [(epoch_number(path), path) for path in folder.iterdir() if path.is_dir()]
+    return sorted((number, path) for number, path in epochs if number is not None)
+
+
+def completed_epochs(root: PathLike, name: str) -> List[Tuple[int, Path]]:
+    """Return the epochs known to be finished.
+
+    An epoch is finished once the next one has been spawned, and the last one once the final
+    poses have been written.
+    """
+    epochs = epoch_dirs(root, name)
+    if pose_files(final_pose_dir(root, name)):
+        return epochs
+    return epochs[:-1]
+
+
+def pose_member_kind(member: str) -> Tuple[Optional[str], Optional[int]]:
+    """Return the kind (``final`` or ``epoch``) and epoch number of a pose in a zip, (None, None) for other members."""
+    path = PurePosixPath(member)
+    if path.suffix != '.pdb':
+        return None, None
+    if path.parent.name.endswith('_final_pose'):
+        return 'final', None
+    for parent in path.parents:
+        if parent.parent.name.endswith('_output'):
+            return 'epoch', epoch_number(parent.name)
+    return None, None
+
+
+def replica_prefix(member: str) -> Optional[str]:
+    """Return the ``.../replica_<index>/`` folder holding ``member`` in an ensemble output zip, None outside replicas."""
+    parts = PurePosixPath(member).parts
+    for index, part in enumerate(parts[:-1]):
+        if part.startswith('replica_') and part[len('replica_'):].isdigit():
+            return '/'.join(parts[:index + 1]) + '/'
+    return None
+
+
+def pose_files(folder: PathLike) -> List[Path]:
+    """Return the PDB files below ``folder``, sorted by path."""
+    folder = Path(folder)
+    if not folder.is_dir():
+        return []
+    return sorted(path for path in folder.rglob('*.pdb') if path.is_file())
+
+
+def parse_scores(lines: typing.Iterable[str]) -> Dict[str, float]:
+    """Return the scores of a pose: the Rosetta ``pose`` energies row and ``REMARK <metric> <value>`` lines."""
+    scores: Dict[str, float] = {}
+    labels: Optional[List[str]] = None
+    for line in lines:
+        if line.startswith('REMARK'):
+            match = REMARK_SCORE_RE.match(line.strip())
+            if match:
+                scores[match.group(1)] = float(match.group(2))
+        elif line.startswith('label '):
+            labels = line.split()[1:]
+        elif line.startswith('pose ') and labels:
+            for label, value in zip(labels, line.split()[1:]):
+                try:
+                    scores[label] = float(value)
+                except ValueError:
+                    pass
+            labels = None
+    return scores
+
+
+def read_pose_scores(pdb_path: PathLike) -> Dict[str, float]:
+    with open(pdb_path, errors='replace') as pdb_file:
+        return parse_scores(pdb_file)
+
+
+def pose_score(scores: Dict[str, float], metric: Optional[str] = None) -> float:
+    """Return the ranking score of a pose: ``metric`` if present, else the Rosetta ``total`` (lower is better)."""
+    for key in (metric, 'total', 'total_score'):
+        if key and key in scores:
+            return scores[key]
+    return math.inf
+
+
+def rank_poses(paths: typing.Iterable[PathLike], metric: Optional[str] = None,
+               top: Optional[int] = None) -> List[Tuple[float, Path]]:
+    """Return the (score, path) of ``paths`` sorted from best to worst score."""
+    ranked = sorted((pose_score(read_pose_scores(path), metric), Path(path)) for path in paths)
+    return ranked[:top] if top else ranked
+
+
+def design_keys(design_residues: typing.Any) -> List[ResidueKey]:
+    """Return the (residue number, chain) keys of the ``DesignResidues`` mapping or list, in their order."""
+    keys = [parse_residue_key(str(key).strip()) for key in design_residues or []]
+    return [key for key in keys if key]
+
+
+def mutant_sequence(pdb_path: PathLike, keys: typing.Sequence[ResidueKey]) -> str:
+    """Return the one letter codes of a pose at the design residue ``keys`` (its first model for trajectories)."""
+    return PDBIndex.from_file(str(pdb_path)).sequence(keys)
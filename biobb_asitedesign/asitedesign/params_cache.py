@@ -0,0 +1,93 @@
+""" Content-addressed cache of unpacked params archives for package biobb_asitedesign.asitedesign """
+from pathlib import Path
+import shutil
+import time
+from typing import List, Optional, Tuple
+import uuid
+import zipfile
+
+from biobb_asitedesign.asitedesign.common import default_cache_path, file_digest
+
+COMPLETE_MARKER = '.complete'
+
+
+class ParamsCache:
+    """Persistent cache of params archives keyed by the SHA-256 of the archive content.
+
+    Every archive is unpacked once into ``<cache_path>/<digest>``. Entries are published with
+    an atomic rename, so concurrent jobs on a shared filesystem never see a partially
+    unpacked entry. The total size is capped at ``max_size`` bytes by evicting the least
+    recently used entries.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None, max_size: int = 1 << 30) -> None:
+        self.cache_path = Path(cache_path or default_cache_path('params'))
+        self.max_size = max_size
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+
+    def get(self, params_zip: str) -> List[str]:
+        """Return the unpacked files of ``params_zip``, unpacking it only on a cache miss."""
+        entry = self.cache_path.joinpath(file_digest(params_zip))
+        if not entry.joinpath(COMPLETE_MARKER).exists():
+            self._unpack(params_zip, entry)
+        entry.joinpath(COMPLETE_MARKER).touch()
+        self.evict(keep=entry.name)
+        return self.files(entry)
+
+    @staticmethod
+    def files(entry: Path) -> List[str]:
+        return sorted(str(path) for path in entry.rglob('*')
+                      if path.is_file() and not path.name.startswith('.'))
+
+    def _unpack(self, params_zip: str, entry: Path) -> None:
+        tmp_entry = self.cache_path.joinpath(f".tmp-{uuid.uuid4().hex}")
+        with zipfile.ZipFile(params_zip) as zip_f:
+            zip_f.extractall(tmp_entry)
+        tmp_entry.joinpath(COMPLETE_MARKER).touch()
+        try:
+            tmp_entry.rename(entry)
+        except OSError:
+            # Another job published the same entry first
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+
+    def entries(self) -> List[Tuple[float, int, Path]]:
+        """Return (last use, size in bytes, path) of every complete entry, least recently used first."""
+        entries = []
+        for entry in self.cache_path.iterdir():
+            marker = entry.joinpath(COMPLETE_MARKER)
+            if entry.name.startswith('.') or not marker.exists():
+                continue
+            size = sum(path.stat().st_size for path in entry.rglob('*') if path.is_file())
+            entries.append((marker.stat().st_mtime, size, entry))
+        return sorted(entries)
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """Remove least recently used entries until the cache fits in ``max_size``."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = []
+        for _, size, entry in entries:
+            if total <= self.max_size:
+                break
+            if entry.name == keep:
+                continue
+            trash = self.cache_path.joinpath(f".evict-{uuid.uuid4().hex}")
+            try:
+                entry.rename(trash)
+            except OSError:
+                continue
+            shutil.rmtree(trash, ignore_errors=True)
+            total -= size
+            evicted.append(entry.name)
+        self._clean_stale()
+        return evicted
+
+    def _clean_stale(self, max_age: float = 3600) -> None:
+        """Remove leftovers of interrupted unpacks or evictions older than ``max_age`` seconds."""
+        now = time.time()
+        for path in self.cache_path.glob('.*-*'):
+            try:
+                if now - path.stat().st_mtime > max_age:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
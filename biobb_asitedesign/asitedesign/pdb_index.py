@@ -0,0 +1,100 @@
+""" Residue and atom index of PDB files for package biobb_asitedesign.asitedesign """
+import re
+import typing
+from typing import Dict, List, Optional, Tuple
+
+ResidueKey = Tuple[int, str]
+
+RESIDUE_KEY_RE = re.compile(r'^(-?\d+)-([A-Za-z0-9])$')
+
+ONE_TO_THREE = {'A': 'ALA', 'R': 'ARG', 'N': 'ASN', 'D': 'ASP', 'C': 'CYS', 'Q': 'GLN', 'E': 'GLU',
+                'G': 'GLY', 'H': 'HIS', 'I': 'ILE', 'L': 'LEU', 'K': 'LYS', 'M': 'MET', 'F': 'PHE',
+                'P': 'PRO', 'S': 'SER', 'T': 'THR', 'W': 'TRP', 'Y': 'TYR', 'V': 'VAL'}
+THREE_TO_ONE = {three: one for one, three in ONE_TO_THREE.items()}
+THREE_TO_ONE.update({'HIE': 'H', 'HID': 'H', 'HIP': 'H', 'CYX': 'C', 'ASH': 'D', 'GLH': 'E', 'LYN': 'K'})
+
+BACKBONE_ATOMS = ('N', 'CA', 'C', 'O')
+SIDE_CHAIN_ATOMS = {
+    'ALA': ('CB',), 'ARG': ('CB', 'CG', 'CD', 'NE', 'CZ', 'NH1', 'NH2'), 'ASN': ('CB', 'CG', 'OD1', 'ND2'),
+    'ASP': ('CB', 'CG', 'OD1', 'OD2'), 'CYS': ('CB', 'SG'), 'GLN': ('CB', 'CG', 'CD', 'OE1', 'NE2'),
+    'GLU': ('CB', 'CG', 'CD', 'OE1', 'OE2'), 'GLY': (), 'HIS': ('CB', 'CG', 'ND1', 'CD2', 'CE1', 'NE2'),
+    'ILE': ('CB', 'CG1', 'CG2', 'CD1'), 'LEU': ('CB', 'CG', 'CD1', 'CD2'), 'LYS': ('CB', 'CG', 'CD', 'CE', 'NZ'),
+    'MET': ('CB', 'CG', 'SD', 'CE'), 'PHE': ('CB', 'CG', 'CD1', 'CD2', 'CE1', 'CE2', 'CZ'), 'PRO': ('CB', 'CG', 'CD'),
+    'SER': ('CB', 'OG'), 'THR': ('CB', 'OG1', 'CG2'),
+    'TRP': ('CB', 'CG', 'CD1', 'CD2', 'NE1', 'CE2', 'CE3', 'CZ2', 'CZ3', 'CH2'),
+    'TYR': ('CB', 'CG', 'CD1', 'CD2', 'CE1', 'CE2', 'CZ', 'OH'), 'VAL': ('CB', 'CG1', 'CG2')}
+
+
+def heavy_atoms(one_letter_code: str) -> Tuple[str, ...]:
+    """Return the standard heavy atom names of an amino acid given by its one letter code."""
+    return BACKBONE_ATOMS + SIDE_CHAIN_ATOMS[ONE_TO_THREE[one_letter_code]]
+
+
+def parse_residue_key(key: typing.Any) -> Optional[ResidueKey]:
+    """Parse an AsiteDesign ``<resnum>-<chain>`` residue key like ``'28-A'``. Return None if malformed."""
+    match = RESIDUE_KEY_RE.match(str(key))
+    if not match:
+        return None
+    return int(match.group(1)), match.group(2)
+
+
+class Atom(typing.NamedTuple):
+    record: str
+    name: str
+    resname: str
+    chain: str
+    resnum: int
+    x: float
+    y: float
+    z: float
+    line: int
+
+
+class Residue(typing.NamedTuple):
+    resname: str
+    hetero: bool
+    atoms: Dict[str, Atom]
+
+
+class PDBIndex:
+    """Atoms of a PDB file indexed by (residue number, chain) in a single pass."""
+
+    def __init__(self, atoms: List[Atom]) -> None:
+        self.atoms = atoms
+        self.residues: Dict[ResidueKey, Residue] = {}
+        for atom in atoms:
+            key = (atom.resnum, atom.chain)
+            if key not in self.residues:
+                self.residues[key] = Residue(atom.resname, atom.record == 'HETATM', {})
+            self.residues[key].atoms.setdefault(atom.name, atom)
+
+    @classmethod
+    def from_file(cls, pdb_path: str) -> 'PDBIndex':
+        with open(pdb_path) as pdb_file:
+            return cls.from_lines(pdb_file)
+
+    @classmethod
+    def from_lines(cls, lines: typing.Iterable[str]) -> 'PDBIndex':
+        atoms = []
+        for line_number, line in enumerate(lines):
+            record = line[:6].strip()
+            if record not in ('ATOM', 'HETATM'):
+                continue
+            # Keep only the first alternate location of every atom
+            if line[16] not in (' ', 'A'):
+                continue
+            atoms.append(Atom(record, line[12:16].strip(), line[17:20].strip(), line[21].strip(),
+                              int(line[22:26]), float(line[30:38]), float(line[38:46]), float(line[46:54]),
+                              line_number))
+        return cls(atoms)
+
+    def __contains__(self, key: ResidueKey) -> bool:
+        return key in self.residues
+
+    def get(self, key: ResidueKey) -> Optional[Residue]:
+        return self.residues.get(key)
+
+    def sequence(self, keys: typing.Iterable[ResidueKey]) -> str:
+        """Return the one letter codes of ``keys`` (``X`` for missing or non standard residues)."""
+        return ''.join(THREE_TO_ONE.get(self.residues[key].resname, 'X') if key in self.residues else 'X'
+                       for key in keys)
@@ -0,0 +1,305 @@
+""" Compact binary storage of pose files for package biobb_asitedesign.asitedesign
+
+With ``WriteALL`` every sampled pose is a full-atom text PDB, and most of them repeat the same
+atoms and differ only in coordinates. A set of poses (an epoch folder) is stored instead as one
+compressed NPZ with:
+
+* the distinct topologies: the lines of a model with their coordinate columns cut out,
+  shared by all the frames with the same atoms (one per mutant sequence),
+* the coordinates of every frame (every model of a trajectory), as float32 or as integer
+  milli-Angstrom deltas against a reference frame of the topology (the input PDB when it has the
+  same atoms), which are zero for the atoms that did not move and compress best,
+* the text before and after the models of every file (scores and energies table).
+
+Every file is decoded back and compared byte by byte before it is replaced, so the conversion is
+lossless; files that do not round-trip (e.g. coordinates not written with three decimals) stay as PDB.
+"""
+import hashlib
+import io
+from pathlib import Path
+import typing
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+FORMAT_VERSION = 1
+MODES = ('delta', 'float32')
+STORE_NAME = 'poses.npz'
+# Placeholder of the coordinate columns (31-54) in the topology lines
+COORDS_MARK = '\x00'
+ATOM_RECORDS = ('ATOM  ', 'HETATM')
+BODY_RECORDS = ATOM_RECORDS + ('TER   ', 'TER\n', 'TER\r\n', 'ANISOU')
+
+PathOrFile = Union[str, Path, typing.BinaryIO]
+
+
+class ParsedPose(typing.NamedTuple):
+    header: str
+    trailer: str
+    # (MODEL line, topology lines, coordinates, ENDMDL line) of every model
+    models: List[Tuple[str, Tuple[str, ...], np.ndarray, str]]
+
+
+def _is_atom(line: str) -> bool:
+    return line.startswith(ATOM_RECORDS)
+
+
+def _is_body(line: str) -> bool:
+    return line.startswith(BODY_RECORDS) or line.rstrip('\r\n') == 'TER'
+
+
+def _split_body(lines: List[str]) -> Tuple[Tuple[str, ...], np.ndarray]:
+    topology = []
+    coords = []
+    for line in lines:
+        if _is_atom(line):
+            topology.append(line[:30] + COORDS_MARK + line[54:])
+            coords.append((line[30:38], line[38:46], line[46:54]))
+        else:
+            topology.append(line)
+    return tuple(topology), np.array(coords, dtype=np.float64).reshape(-1, 3)
+
+
+def parse_pose(text: str) -> ParsedPose:
+    """Split the text of a PDB file into its header, models and trailer."""
+    lines = text.splitlines(keepends=True)
+    models = []
+    if any(line.startswith('MODEL ') for line in lines):
+        start = next(index for index, line in enumerate(lines) if line.startswith('MODEL '))
+        header = ''.join(lines[:start])
+        index = start
+        while index < len(lines) and lines[index].startswith('MODEL '):
+            end = next((j for j in range(index + 1, len(lines)) if lines[j].startswith('ENDMDL')), None)
+            if end is None:
+                raise ValueError('MODEL without ENDMDL')
+            topology, coords = _split_body(lines[index + 1:end])
+            models.append((lines[index], topology, coords, lines[end]))
+            index = end + 1
+        trailer = ''.join(lines[index:])
+    else:
+        body = [index for index, line in enumerate(lines) if _is_body(line)]
+        if not body:
+            raise ValueError('No atoms')
+        start, end = body[0], body[-1] + 1
+        topology, coords = _split_body(lines[start:end])
+        header, trailer = ''.join(lines[:start]), ''.join(lines[end:])
+        models.append(('', topology, coords, ''))
+    return ParsedPose(header, trailer, models)
+
+
+def format_model(topology: typing.Sequence[str], coords: np.ndarray) -> str:
+    """Return the lines of a model from its topology and (n_atoms, 3) coordinates."""
+    out = []
+    atom = 0
+    for line in topology:
+        if COORDS_MARK in line:
+            x, y, z = coords[atom]
+            out.append(line.replace(COORDS_MARK, f"{x:8.3f}{y:8.3f}{z:8.3f}", 1))
+            atom += 1
+        else:
+            out.append(line)
+    return ''.join(out)
+
+
+def _decoded(coords: np.ndarray, mode: str) -> np.ndarray:
+    """Return ``coords`` as they are read back from a store of ``mode``."""
+    if mode == 'float32':
+        return coords.astype(np.float32)
+    milli = np.rint(coords * 1000)
+    decoded = milli / 1000
+    decoded[(milli == 0) & np.signbit(coords)] = -0.0
+    return decoded
+
+
+def _topology_key(topology: typing.Sequence[str]) -> str:
+    return hashlib.sha1(''.join(topology).encode('utf-8', 'surrogateescape')).hexdigest()
+
+
+def _atom_names(topology: typing.Sequence[str]) -> List[str]:
+    return [line[12:27] for line in topology if COORDS_MARK in line]
+
+
+def write_pose_store(paths: typing.Iterable[Union[str, Path]], store_path: str, mode: str = 'delta',
+                     reference_pdb: Optional[str] = None) -> Tuple[List[Path], List[Path]]:
+    """Store the pose files ``paths`` in the compressed NPZ ``store_path``, see :mod:`pose_store`.
+
+    Args:
+        paths: PDB files, stored under their path relative to the folder of ``store_path``.
+        mode: ``delta`` for integer milli-Angstrom deltas against a reference frame, ``float32``
+            for the coordinates.
+        reference_pdb: Reference of the topologies with the same atoms in delta mode, by default
+            the first frame of every topology.
+
+    Returns:
+        tuple: The files stored, and those that did not round-trip and were left out.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown pose store mode {mode}, use one of {', '.join(MODES)}")
+    root = Path(store_path).parent
+    reference = None
+    if reference_pdb:
+        parsed = parse_pose(Path(reference_pdb).read_text(encoding='latin-1'))
+        reference = (_atom_names(parsed.models[0][1]), parsed.models[0][2])
+
+    topologies: Dict[str, int] = {}
+    topology_lines: List[Tuple[str, ...]] = []
+    frames: Dict[int, List[np.ndarray]] = {}
+    stored, skipped = [], []
+    names, headers, trailers = [], [], []
+    frame_pose, frame_topology, frame_row, model_open, model_close = [], [], [], [], []
+    for path in sorted(Path(p) for p in paths):
+        text = path.read_text(encoding='latin-1')
+        try:
+            pose = parse_pose(text)
+        except ValueError:
+            skipped.append(path)
+            continue
+        rebuilt = pose.header + ''.join(opening + format_model(topology, _decoded(coords, mode)) + closing
+                                        for opening, topology, coords, closing in pose.models) + pose.trailer
+        if rebuilt != text:
+            skipped.append(path)
+            continue
+        pose_index = len(names)
+        names.append(path.relative_to(root).as_posix() if root in path.parents else path.name)
+        headers.append(pose.header)
+        trailers.append(pose.trailer)
+        for opening, topology, coords, closing in pose.models:
+            key = _topology_key(topology)
+            if key not in topologies:
+                topologies[key] = len(topology_lines)
+                topology_lines.append(topology)
+                frames[topologies[key]] = []
+            topology_id = topologies[key]
+            frame_pose.append(pose_index)
+            frame_topology.append(topology_id)
+            frame_row.append(len(frames[topology_id]))
+            frames[topology_id].append(coords)
+            model_open.append(opening)
+            model_close.append(closing)
+        stored.append(path)
+
+    arrays: Dict[str, np.ndarray] = {
+        'format_version': np.array(FORMAT_VERSION), 'mode': np.array(mode),
+        'names': np.array(names, dtype=str), 'headers': np.array(headers, dtype=str),
+        'trailers': np.array(trailers, dtype=str),
+        'frame_pose': np.array(frame_pose, dtype=np.int32), 'frame_topology': np.array(frame_topology, dtype=np.int32),
+        'frame_row': np.array(frame_row, dtype=np.int32),
+        'model_open': np.array(model_open, dtype=str), 'model_close': np.array(model_close, dtype=str)}
+    for topology_id, topology in enumerate(topology_lines):
+        coords = np.stack(frames[topology_id])
+        arrays[f"topology_{topology_id}"] = np.array(topology, dtype=str)
+        if mode == 'float32':
+            arrays[f"coords_{topology_id}"] = coords.astype(np.float32)
+            continue
+        milli = np.rint(coords * 1000).astype(np.int32)
+        # "-0.000" is written by Rosetta and lost by the integers
+        arrays[f"negative_zero_{topology_id}"] = np.argwhere((milli == 0) & np.signbit(coords)).astype(np.int32)
+        base = milli[0]
+        if reference and reference[0] == _atom_names(topology):
+            base = np.rint(reference[1] * 1000).astype(np.int32)
+        arrays[f"reference_{topology_id}"] = base
+        arrays[f"coords_{topology_id}"] = milli - base
+    Path(store_path).parent.mkdir(parents=True, exist_ok=True)
+    partial = f"{store_path}.part"
+    with open(partial, 'wb') as store_f:
+        np.savez_compressed(store_f, **arrays)
+    Path(partial).replace(store_path)
+    return stored, skipped
+
+
+class PoseStore:
+    """Reader of a pose store written by :func:`write_pose_store`, loading the arrays on first use.
+
+    Args:
+        source: Path of the NPZ or a seekable binary file, e.g. ``io.BytesIO`` of a zip member.
+    """
+
+    def __init__(self, source: PathOrFile) -> None:
+        self.data = np.load(source, allow_pickle=False)
+        version = int(self.data['format_version'])
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported pose store version {version}")
+        self.mode = str(self.data['mode'])
+        self.names = [str(name) for name in self.data['names']]
+        self._frame_pose = self.data['frame_pose']
+        self._cache: Dict[str, np.ndarray] = {}
+
+    def __enter__(self) -> 'PoseStore':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.data.close()
+
+    def _array(self, key: str) -> np.ndarray:
+        if key not in self._cache:
+            self._cache[key] = self.data[key]
+        return self._cache[key]
+
+    @property
+    def n_frames(self) -> int:
+        return len(self._frame_pose)
+
+    def frames(self, name: str) -> List[int]:
+        """Return the frames (models) of the pose file ``name``."""
+        pose = self.names.index(name)
+        return [int(frame) for frame in np.flatnonzero(self._frame_pose == pose)]
+
+    def topology(self, frame: int) -> List[str]:
+        return [str(line) for line in self._array(f"topology_{int(self._array('frame_topology')[frame])}")]
+
+    def coordinates(self, frame: int) -> np.ndarray:
+        """Return the (n_atoms, 3) coordinates of ``frame`` in Angstroms."""
+        topology_id = int(self._array('frame_topology')[frame])
+        row_index = int(self._array('frame_row')[frame])
+        row = self._array(f"coords_{topology_id}")[row_index]
+        if self.mode == 'float32':
+            return row
+        coords = (row + self._array(f"reference_{topology_id}")) / 1000.0
+        negative_zero = self._array(f"negative_zero_{topology_id}")
+        for _, atom, axis in negative_zero[negative_zero[:, 0] == row_index]:
+            coords[atom, axis] = -0.0
+        return coords
+
+    def frame_pdb(self, frame: int, path: Optional[str] = None) -> str:
+        """Return (and write to ``path``) a single frame as a PDB with the header and trailer of its file."""
+        pose = int(self._frame_pose[frame])
+        text = str(self._array('headers')[pose]) + format_model(self.topology(frame), self.coordinates(frame)) + \
+            str(self._array('trailers')[pose])
+        if path:
+            Path(path).write_text(text, encoding='latin-1')
+        return text
+
+    def pose_text(self, name: str) -> str:
+        """Return the original text of the pose file ``name``."""
+        pose = self.names.index(name)
+        models = ''.join(str(self._array('model_open')[frame]) + format_model(self.topology(frame), self.coordinates(frame)) +
+                         str(self._array('model_close')[frame]) for frame in self.frames(name))
+        return str(self._array('headers')[pose]) + models + str(self._array('trailers')[pose])
+
+    def export(self, name: str, dest: str) -> Path:
+        """Write the original pose file ``name`` to ``dest``."""
+        Path(dest).parent.mkdir(parents=True, exist_ok=True)
+        with io.open(dest, 'w', encoding='latin-1', newline='') as pdb_file:
+            pdb_file.write(self.pose_text(name))
+        return Path(dest)
+
+
+def compact_folder(folder: str, mode: str = 'delta', reference_pdb: Optional[str] = None,
+                   remove: bool = True) -> Tuple[Optional[Path], List[Path]]:
+    """Store the PDB files below ``folder`` in ``<folder>/poses.npz`` and remove those stored if ``remove``.
+
+    Returns:
+        tuple: The store (None if there were no PDB files) and the files left as PDB.
+    """
+    paths = sorted(path for path in Path(folder).rglob('*.pdb') if path.is_file())
+    if not paths:
+        return None, []
+    store_path = Path(folder).joinpath(STORE_NAME)
+    stored, skipped = write_pose_store(paths, str(store_path), mode, reference_pdb)
+    if remove:
+        for path in stored:
+            path.unlink()
+    return store_path, skipped
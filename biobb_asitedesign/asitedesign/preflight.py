@@ -0,0 +1,172 @@
+""" Pre-flight validation of AsiteDesign inputs for package biobb_asitedesign.asitedesign """
+import re
+import typing
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+from biobb_asitedesign.asitedesign.pdb_index import ONE_TO_THREE, PDBIndex, heavy_atoms, parse_residue_key
+
+CATALYTIC_KEY_RE = re.compile(r'^RES\d+$')
+# Target wildcards: ZZ keeps the amino acid of the PDB at a '<resnum>-<chain>' key, ZX is any amino acid
+NATIVE_CODE = 'ZZ'
+ANY_CODE = 'ZX'
+
+
+class Issue(typing.NamedTuple):
+    level: str
+    where: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.level.upper()}: {self.where}: {self.message}"
+
+
+class ValidationReport:
+    """Errors and warnings found in the inputs of a design job."""
+
+    def __init__(self) -> None:
+        self.issues: List[Issue] = []
+
+    def error(self, where: str, message: str) -> None:
+        self.issues.append(Issue('error', where, message))
+
+    def warning(self, where: str, message: str) -> None:
+        self.issues.append(Issue('warning', where, message))
+
+    @property
+    def errors(self) -> List[Issue]:
+        return [issue for issue in self.issues if issue.level == 'error']
+
+    @property
+    def ok(self) -> bool:
+        return not self.errors
+
+    def __str__(self) -> str:
+        if not self.issues:
+            return "Pre-flight validation passed"
+        lines = [f"Pre-flight validation found {len(self.errors)} error(s) and "
+                 f"{len(self.issues) - len(self.errors)} warning(s):"]
+        lines.extend(f"  {issue}" for issue in self.issues)
+        return '\n'.join(lines)
+
+
+def ligand_entries(ligands: Any) -> Dict[str, Mapping[str, Any]]:
+    """Return ``{residue key: options}`` of the ``Ligands`` entry, given as a list of mappings or a mapping."""
+    if not ligands:
+        return {}
+    if isinstance(ligands, Mapping):
+        ligands = [ligands]
+    entries: Dict[str, Mapping[str, Any]] = {}
+    for ligand in ligands:
+        for key, options in ligand.items():
+            entries[key] = options or {}
+    return entries
+
+
+def _flatten(values: Any) -> Iterable[str]:
+    if isinstance(values, (list, tuple)):
+        for value in values:
+            yield from _flatten(value)
+    elif values is not None:
+        yield str(values)
+
+
+def _check_residue(report: ValidationReport, index: PDBIndex, where: str, key: Any) -> Optional[tuple]:
+    residue_key = parse_residue_key(key)
+    if residue_key is None:
+        hint = " (remove the surrounding whitespace)" if parse_residue_key(str(key).strip()) else ""
+        report.error(where, f"malformed residue {key!r}, expected '<resnum>-<chain>'{hint}")
+        return None
+    if residue_key not in index:
+        report.error(where, f"residue {key} not found in the PDB")
+        return None
+    return residue_key
+
+
+def _check_atoms(report: ValidationReport, where: str, atom_spec: Any, candidates: Iterable[str], owner: str,
+                 strict: bool = True) -> None:
+    """Check that at least one of the ``-`` separated alternatives of ``atom_spec`` is in ``candidates``.
+
+    Missing hydrogens, and any mismatch when not ``strict``, are reported as warnings.
+    """
+    alternatives = [atom for atom in str(atom_spec).split('-') if atom]
+    if not alternatives:
+        report.error(where, "missing atom name")
+        return
+    candidates = set(candidates)
+    if any(atom in candidates for atom in alternatives):
+        return
+    message = f"none of the atoms {'/'.join(alternatives)} exist in {owner}"
+    if all(atom.startswith('H') for atom in alternatives):
+        report.warning(where, message + " (hydrogens may be added by PyRosetta)")
+    elif not strict:
+        report.warning(where, message)
+    else:
+        report.error(where, message)
+
+
+def validate(yaml_dict: Mapping[str, Any], index: PDBIndex) -> ValidationReport:
+    """Check every residue, ligand and constraint reference of a merged AsiteDesign YAML against ``index``."""
+    report = ValidationReport()
+
+    design_residues = yaml_dict.get('DesignResidues') or {}
+    for key in design_residues:
+        _check_residue(report, index, f"DesignResidues.{key!r}", key)
+
+    catalytic = yaml_dict.get('CatalyticResidues') or {}
+    catalytic_atoms: Dict[str, set] = {}
+    for name, targets in catalytic.items():
+        where = f"CatalyticResidues.{name}"
+        # Either a named site placed by the design (RES1, RES2 ...) or a residue of the PDB
+        residue = None
+        if not CATALYTIC_KEY_RE.match(str(name)):
+            if parse_residue_key(name) is None:
+                report.error(where, "catalytic residues must be named RES1, RES2 ... RESN or '<resnum>-<chain>'")
+                continue
+            residue_key = _check_residue(report, index, where, name)
+            if residue_key is None:
+                continue
+            residue = index.get(residue_key)
+        codes = [code for code in str(targets).split('-') if code]
+        unknown = [code for code in codes if code not in ONE_TO_THREE and code not in (NATIVE_CODE, ANY_CODE)]
+        if unknown or not codes:
+            report.error(where, f"unknown amino acid code(s) {unknown or targets!r}")
+        atoms = {atom for code in codes if code in ONE_TO_THREE for atom in heavy_atoms(code)}
+        if ANY_CODE in codes or (NATIVE_CODE in codes and residue is None):
+            atoms.update(atom for code in ONE_TO_THREE for atom in heavy_atoms(code))
+        if residue is not None and NATIVE_CODE in codes:
+            atoms.update(residue.atoms)
+        catalytic_atoms[str(name)] = atoms
+
+    ligands = ligand_entries(yaml_dict.get('Ligands'))
+    for key, options in ligands.items():
+        where = f"Ligands.{key}"
+        residue_key = _check_residue(report, index, where, key)
+        if residue_key is None:
+            continue
+        residue = index.get(residue_key)
+        if not residue.hetero:
+            report.warning(where, f"{key} is the protein residue {residue.resname}, not a HETATM ligand")
+        for atom in _flatten(options.get('ExcludedTorsions')):
+            if atom not in residue.atoms:
+                report.error(f"{where}.ExcludedTorsions", f"atom {atom} not found in {residue.resname} {key}")
+
+    constraints = yaml_dict.get('Constraints') or {}
+    for name, constraint in constraints.items():
+        if not isinstance(constraint, Mapping) or constraint.get('type') != 'B':
+            continue
+        for side in ('i', 'j'):
+            res_ref, atom_ref = constraint.get(f"res{side}"), constraint.get(f"atom{side}")
+            where = f"Constraints.{name}.res{side}"
+            if str(res_ref) in catalytic_atoms:
+                # Only the standard heavy atoms of the target amino acids are known here
+                _check_atoms(report, f"Constraints.{name}.atom{side}", atom_ref, catalytic_atoms[str(res_ref)],
+                             f"the amino acids {catalytic[res_ref]} of {res_ref}", strict=False)
+            elif CATALYTIC_KEY_RE.match(str(res_ref)):
+                report.error(where, f"{res_ref} is not defined in CatalyticResidues")
+            else:
+                residue_key = _check_residue(report, index, where, res_ref)
+                if residue_key:
+                    residue = index.get(residue_key)
+                    _check_atoms(report, f"Constraints.{name}.atom{side}", atom_ref, residue.atoms,
+                                 f"{residue.resname} {res_ref}")
+    return report
@@ -0,0 +1,189 @@
+""" Budget-aware search of the sampling settings of the presets for package biobb_asitedesign.asitedesign
+
+Successive halving with nIterations as the budget of a configuration: many configurations of the
+sampling settings of a :data:`preset.SOFTWARE_PARAMS` preset (kT_high, ActiveSiteLoops, nSteps,
+SpawningMetricSteps) are run for ``min_iterations`` epochs, the best ``1 / eta`` of them are
+promoted to ``eta`` times more epochs, and so on up to ``max_iterations``, while the measured
+cost of the next rung fits in the core-hour budget.
+
+Every evaluation of a configuration is a point of energy (score of its best final pose, lower is
+better) vs. cost (core-hours spent on the configuration so far). The Pareto front of those points
+is reported, and its cheapest point within ``energy_tolerance`` of the best energy is the
+custom preset.
+"""
+import csv
+from dataclasses import dataclass, field
+import itertools
+import logging
+import random
+import typing
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+
+DEFAULT_SPACE = {
+    'kT_high': [100, 250, 500, 1000],
+    'ActiveSiteLoops': [1, 2, 3],
+    'nSteps': [1, 2, 4],
+    'SpawningMetricSteps': [['0.8 FullAtomWithConstraints', '1.0 FullAtom'],
+                            ['0.5 FullAtomWithConstraints', '1.0 FullAtom'],
+                            ['1.0 FullAtom']],
+}
+TABLE_FIELDS = ['trial_id', 'rung', 'iterations', 'energy', 'core_hours', 'pareto', 'config']
+
+
+@dataclass
+class Trial:
+    """A configuration of the search and the state of its last evaluation."""
+    trial_id: str
+    config: Dict[str, Any]
+    rung: int = -1
+    iterations: int = 0
+    energy: Optional[float] = None
+    core_hours: float = 0.0
+    status: str = 'pending'
+    output_path: Optional[str] = None
+
+
+@dataclass
+class Evaluation:
+    """Energy and cumulative cost of a configuration after ``iterations`` epochs."""
+    trial_id: str
+    config: Dict[str, Any]
+    rung: int
+    iterations: int
+    energy: float
+    core_hours: float
+
+
+@dataclass
+class SearchResult:
+    trials: List[Trial]
+    evaluations: List[Evaluation] = field(default_factory=list)
+    core_hours: float = 0.0
+
+    @property
+    def front(self) -> List[Evaluation]:
+        return pareto_front(self.evaluations)
+
+
+# Run the trials up to the given total iterations, updating their status, energy, core_hours,
+# iterations and output_path
+Evaluator = Callable[[List[Trial], int], None]
+
+
+def rung_iterations(min_iterations: int, max_iterations: int, eta: int) -> List[int]:
+    """Return the total iterations of every rung: min_iterations, then eta times more up to max_iterations."""
+    if min_iterations < 1 or max_iterations < min_iterations or eta < 2:
+        raise ValueError('The search needs 1 <= min_iterations <= max_iterations and eta >= 2')
+    rungs = [min_iterations]
+    while rungs[-1] < max_iterations:
+        rungs.append(min(rungs[-1] * eta, max_iterations))
+    return rungs
+
+
+def sample_configs(space: typing.Mapping[str, typing.Sequence[Any]], n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Return ``n`` distinct configurations of the grid ``space``, or the whole grid if it is smaller."""
+    keys = list(space)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*(space[key] for key in keys))]
+    return random.Random(seed).sample(grid, min(n, len(grid)))
+
+
+def pareto_front(evaluations: typing.Iterable[Evaluation]) -> List[Evaluation]:
+    """Return the evaluations that no other one beats in both energy and cost, cheapest first."""
+    front: List[Evaluation] = []
+    for evaluation in sorted(evaluations, key=lambda evaluation: (evaluation.core_hours, evaluation.energy)):
+        if not front or evaluation.energy < front[-1].energy:
+            front.append(evaluation)
+    return front
+
+
+def select(front: typing.Sequence[Evaluation], energy_tolerance: float = 0.0) -> Evaluation:
+    """Return the cheapest evaluation of ``front`` within ``energy_tolerance`` of its best energy."""
+    best = min(evaluation.energy for evaluation in front)
+    return next(evaluation for evaluation in front if evaluation.energy <= best + energy_tolerance)
+
+
+def successive_halving(space: typing.Mapping[str, typing.Sequence[Any]], evaluate: Evaluator, budget_core_hours: float,
+                       min_iterations: int = 1, max_iterations: int = 9, eta: int = 3, n_configs: Optional[int] = None,
+                       seed: int = 0, resume: bool = True, out_log: logging.Logger = None) -> SearchResult:
+    """Search ``space`` within ``budget_core_hours``, see :mod:`preset_search`.
+
+    Args:
+        evaluate: Runs the trials of a rung, see :data:`Evaluator`.
+        n_configs: Configurations of the first rung. Defaults to ``eta ** (rungs - 1)``, so one reaches max_iterations.
+        resume: The promoted trials continue from their previous rung and only cost the added iterations.
+
+    The first rung is always run; the next ones are cut to the best promoted trials whose
+    iterations fit in the remaining budget, at the cost per iteration measured for each trial.
+    """
+    rungs = rung_iterations(min_iterations, max_iterations, eta)
+    configs = sample_configs(space, n_configs or eta ** (len(rungs) - 1), seed)
+    result = SearchResult([Trial(f"trial_{index:03d}", config) for index, config in enumerate(configs)])
+    active = list(result.trials)
+    for rung, iterations in enumerate(rungs):
+        if rung:
+            ranked = sorted(active, key=lambda trial: trial.energy)
+            remaining = budget_core_hours - result.core_hours
+            promoted = []
+            for trial in ranked[:max(1, len(active) // eta)]:
+                # Measured cost per iteration of the trial
+                cost = trial.core_hours / trial.iterations * (iterations - trial.iterations if resume else iterations)
+                if cost > remaining:
+                    break
+                remaining -= cost
+                promoted.append(trial)
+            for trial in ranked[len(promoted):]:
+                trial.status = 'stopped'
+            if not promoted:
+                _log(f"Rung {rung} ({iterations} iterations) would exceed the budget of {budget_core_hours} core-hours, "
+                     f"stopping with {result.core_hours:.3f} spent", out_log)
+                break
+            active = promoted
+        _log(f"Rung {rung}: {len(active)} configurations for {iterations} iterations", out_log)
+        evaluate(active, iterations)
+        for trial in active:
+            trial.rung = rung
+            if trial.status == 'done':
+                result.evaluations.append(Evaluation(trial.trial_id, trial.config, rung, trial.iterations,
+                                                     trial.energy, trial.core_hours))
+        result.core_hours = sum(trial.core_hours for trial in result.trials)
+        active = [trial for trial in active if trial.status == 'done']
+        _log(f"Rung {rung} done: {len(active)} completed, {result.core_hours:.3f} of {budget_core_hours} core-hours spent",
+             out_log)
+        if not active:
+            break
+    return result
+
+
+def custom_preset(base: typing.Mapping[str, Any], evaluation: Evaluation) -> Dict[str, Any]:
+    """Return the AsiteDesign YAML ``base`` with the configuration and iterations of ``evaluation``."""
+    return dict(base, **evaluation.config, nIterations=evaluation.iterations)
+
+
+def write_preset(preset: typing.Mapping[str, Any], preset_path: str) -> str:
+    with open(preset_path, 'w') as yaml_file:
+        yaml.dump(dict(preset), yaml_file, default_flow_style=False)
+    return preset_path
+
+
+def write_table(result: SearchResult, table_path: str) -> str:
+    """Write one CSV row per evaluation, flagging those of the Pareto front."""
+    front = {(evaluation.trial_id, evaluation.rung) for evaluation in result.front}
+    with open(table_path, 'w', newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=TABLE_FIELDS)
+        writer.writeheader()
+        for evaluation in sorted(result.evaluations, key=lambda evaluation: (evaluation.core_hours, evaluation.energy)):
+            writer.writerow({'trial_id': evaluation.trial_id,
+                             'rung': evaluation.rung,
+                             'iterations': evaluation.iterations,
+                             'energy': evaluation.energy,
+                             'core_hours': f"{evaluation.core_hours:.4f}",
+                             'pareto': (evaluation.trial_id, evaluation.rung) in front,
+                             'config': yaml.dump(evaluation.config, default_flow_style=True, width=float('inf')).strip()})
+    return table_path
+
+
+def _log(message: str, out_log: logging.Logger = None) -> None:
+    if out_log:
+        out_log.info(message)
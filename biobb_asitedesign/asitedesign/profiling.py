@@ -0,0 +1,163 @@
+""" Phase-level timing and resource profiling of the wrapper for package biobb_asitedesign.asitedesign """
+import cProfile
+import json
+import os
+from pathlib import Path
+import platform
+import resource
+import time
+from typing import Any, Dict, List, Optional
+
+
+def read_proc_io(pid: str = 'self') -> Dict[str, int]:
+    """Return the I/O counters of ``/proc/<pid>/io``, which include the children already reaped."""
+    counters: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/io") as io_file:
+            for line in io_file:
+                key, _, value = line.partition(':')
+                counters[key.strip()] = int(value)
+    except (OSError, ValueError):
+        pass
+    return counters
+
+
+def read_peak_rss_kb() -> Optional[int]:
+    """Return the resident set size high-water mark of the process (``VmHWM``) in KiB."""
+    try:
+        with open('/proc/self/status') as status_file:
+            for line in status_file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def reset_peak_rss() -> bool:
+    """Reset ``VmHWM`` to the current RSS so the next reading is the peak of a single phase (Linux >= 4.0)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def cgroup_cpu_seconds() -> Optional[float]:
+    """Return the CPU time consumed by the cgroup of the process, from cgroup v2 ``cpu.stat`` or v1 ``cpuacct.usage``.
+
+    Unlike the rusage of the children it also counts processes that were not reaped by this
+    one, e.g. the MPI ranks started by a container runtime in the same cgroup.
+    """
+    try:
+        with open('/proc/self/cgroup') as cgroup_file:
+            entries = [line.rstrip('\n').split(':', 2) for line in cgroup_file]
+    except OSError:
+        return None
+    for hierarchy, controllers, path in entries:
+        if hierarchy == '0' and not controllers:
+            stat = Path('/sys/fs/cgroup').joinpath(path.lstrip('/'), 'cpu.stat')
+            try:
+                for line in stat.read_text().splitlines():
+                    if line.startswith('usage_usec '):
+                        return int(line.split()[1]) / 1e6
+            except (OSError, ValueError):
+                pass
+        elif 'cpuacct' in controllers.split(','):
+            for mount in ('cpuacct', 'cpu,cpuacct'):
+                usage = Path('/sys/fs/cgroup', mount).joinpath(path.lstrip('/'), 'cpuacct.usage')
+                try:
+                    return int(usage.read_text()) / 1e9
+                except (OSError, ValueError):
+                    continue
+    return None
+
+
+class ResourceSample:
+    """Snapshot of the wall clock, CPU times, cgroup CPU time and I/O counters of the process and its children."""
+
+    def __init__(self) -> None:
+        self.wall = time.perf_counter()
+        self.self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        self.children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        self.cgroup_cpu = cgroup_cpu_seconds()
+        self.io = read_proc_io()
+
+    def delta(self, start: 'ResourceSample') -> Dict[str, Any]:
+        cgroup_cpu = None
+        if self.cgroup_cpu is not None and start.cgroup_cpu is not None:
+            cgroup_cpu = round(self.cgroup_cpu - start.cgroup_cpu, 6)
+        return {'wall': round(self.wall - start.wall, 6),
+                'cpu_user': round(self.self_usage.ru_utime - start.self_usage.ru_utime, 6),
+                'cpu_system': round(self.self_usage.ru_stime - start.self_usage.ru_stime, 6),
+                'children_cpu_user': round(self.children_usage.ru_utime - start.children_usage.ru_utime, 6),
+                'children_cpu_system': round(self.children_usage.ru_stime - start.children_usage.ru_stime, 6),
+                'cgroup_cpu': cgroup_cpu,
+                'io': {key: value - start.io.get(key, 0) for key, value in self.io.items()}}
+
+
+class PhaseProfiler:
+    """Record the wall/CPU time, peak RSS and I/O bytes of the consecutive phases of a launch.
+
+    :meth:`phase` closes the running phase and opens the next one, so a method is instrumented
+    with one call at the start of every section and a final :meth:`finish`. A disabled
+    profiler records nothing.
+    """
+
+    def __init__(self, enabled: bool = True, python_profile: bool = False) -> None:
+        self.enabled = enabled
+        self.phases: List[Dict[str, Any]] = []
+        self.current: Optional[str] = None
+        self._start: Optional[ResourceSample] = None
+        self._first: Optional[ResourceSample] = None
+        self.profile = cProfile.Profile() if enabled and python_profile else None
+
+    def phase(self, name: str) -> None:
+        if not self.enabled:
+            return
+        self._close()
+        self.current = name
+        reset_peak_rss()
+        self._start = ResourceSample()
+        if self._first is None:
+            self._first = self._start
+            if self.profile:
+                self.profile.enable()
+
+    def _close(self) -> None:
+        if self.current is None:
+            return
+        record = {'phase': self.current}
+        record.update(ResourceSample().delta(self._start))
+        record['peak_rss_kb'] = read_peak_rss_kb()
+        record['children_max_rss_kb'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        self.phases.append(record)
+        self.current = None
+
+    def finish(self) -> None:
+        if not self.enabled:
+            return
+        self._close()
+        if self.profile:
+            self.profile.disable()
+
+    def report(self) -> Dict[str, Any]:
+        total = ResourceSample().delta(self._first) if self._first else {}
+        return {'host': platform.node(),
+                'python': platform.python_version(),
+                'pid': os.getpid(),
+                'phases': self.phases,
+                'total': total,
+                'peak_rss_kb': max((phase['peak_rss_kb'] or 0 for phase in self.phases), default=None),
+                'children_max_rss_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss}
+
+    def write(self, report_path: str, profile_path: Optional[str] = None) -> Dict[str, Any]:
+        """Write the JSON report and, when Python profiling is enabled, the cProfile stats to ``profile_path``."""
+        report = self.report()
+        if self.profile and profile_path:
+            self.profile.dump_stats(profile_path)
+            report['python_profile'] = profile_path
+        with open(report_path, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        return report
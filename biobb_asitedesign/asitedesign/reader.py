@@ -0,0 +1,252 @@
+""" Lazy random-access reader of the output zips for package biobb_asitedesign.asitedesign
+
+The central directory of the zip is read once when it is opened; the members (final poses,
+epoch poses and trajectories, logs) are then loaded only when they are used. A member is streamed
+from the zip, or memory-mapped in place when it is stored without compression, so taking the
+top poses of a multi-GB output only reads those poses.
+
+Command line::
+
+    python -m biobb_asitedesign.asitedesign.reader output.zip --top 5 --extract top_poses/
+"""
+import argparse
+import contextlib
+import io
+import mmap
+import os
+from pathlib import Path, PurePosixPath
+import shutil
+import struct
+import typing
+from typing import Dict, List, Optional
+import zipfile
+
+import yaml
+
+from biobb_asitedesign.asitedesign import outputs
+from biobb_asitedesign.asitedesign import pose_store
+
+LOG_SUFFIXES = ('.out', '.log', '.err')
+LOCAL_HEADER = struct.Struct('<4s22xHH')
+
+
+class ArchiveMember:
+    """A member of an :class:`OutputArchive`, read on demand."""
+
+    def __init__(self, archive: 'OutputArchive', info: zipfile.ZipInfo) -> None:
+        self.archive = archive
+        self.info = info
+        self.name = info.filename
+        self.kind, self.epoch = outputs.pose_member_kind(info.filename)
+        self._scores: Optional[Dict[str, float]] = None
+
+    def __repr__(self) -> str:
+        return f"ArchiveMember({self.name!r}, size={self.size})"
+
+    @property
+    def size(self) -> int:
+        return self.info.file_size
+
+    @property
+    def stored(self) -> bool:
+        return self.info.compress_type == zipfile.ZIP_STORED
+
+    @property
+    def trajectory(self) -> bool:
+        return self.kind == 'epoch' and PurePosixPath(self.name).name.startswith('trajectory')
+
+    def open(self) -> typing.IO[bytes]:
+        """Return a stream of the member, decompressed while it is read."""
+        return self.archive.zip_f.open(self.info)
+
+    def read(self) -> bytes:
+        with self.open() as member_f:
+            return member_f.read()
+
+    def buffer(self) -> memoryview:
+        """Return the bytes of the member: a view of the memory-mapped zip for stored members, else decompressed."""
+        if not self.stored:
+            return memoryview(self.read())
+        start = self.archive.data_offset(self.info)
+        return memoryview(self.archive.mapping)[start:start + self.info.file_size]
+
+    def lines(self) -> List[str]:
+        with io.TextIOWrapper(self.open(), errors='replace') as text:
+            return text.readlines()
+
+    @property
+    def scores(self) -> Dict[str, float]:
+        """Parsed scores of a pose, see :func:`outputs.parse_scores`, read on first use."""
+        if self._scores is None:
+            self._scores = outputs.parse_scores(self.lines())
+        return self._scores
+
+    def score(self, metric: Optional[str] = None) -> float:
+        return outputs.pose_score(self.scores, metric or self.archive.metric)
+
+    def extract(self, dest: str) -> Path:
+        """Stream the member to the file ``dest``."""
+        Path(dest).parent.mkdir(parents=True, exist_ok=True)
+        with self.open() as source, open(dest, 'wb') as target:
+            shutil.copyfileobj(source, target, 1 << 20)
+        return Path(dest)
+
+
+class OutputArchive:
+    """Random access to an Asitedesign output zip.
+
+    Args:
+        zip_path: Output zip.
+        prefix: Folder of the zip to look into, e.g. ``<sandbox>/replica_0/`` for a replica of an
+            ensemble. By default the shallowest ``<Name>_final_pose`` and ``<Name>_output`` folders are used.
+    """
+
+    def __init__(self, zip_path: str, prefix: str = '') -> None:
+        self.zip_path = str(zip_path)
+        self.zip_f = zipfile.ZipFile(self.zip_path)
+        self.prefix = prefix
+        self.members = [ArchiveMember(self, info) for info in self.zip_f.infolist()
+                        if info.filename.startswith(prefix) and not info.is_dir()]
+        self._by_name = {member.name: member for member in self.members}
+        self._file: Optional[typing.BinaryIO] = None
+        self._mapping: Optional[mmap.mmap] = None
+        self._yaml: Optional[Dict[str, typing.Any]] = None
+
+    def __enter__(self) -> 'OutputArchive':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.zip_f.close()
+        if self._mapping is not None:
+            # Views returned by ArchiveMember.buffer() keep the map open until they are released
+            with contextlib.suppress(BufferError):
+                self._mapping.close()
+        if self._file is not None:
+            self._file.close()
+
+    def member(self, name: str) -> ArchiveMember:
+        return self._by_name[name]
+
+    @property
+    def mapping(self) -> mmap.mmap:
+        """Read-only memory map of the whole zip, created on first use."""
+        if self._mapping is None:
+            self._file = open(self.zip_path, 'rb')
+            self._mapping = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mapping
+
+    def data_offset(self, info: zipfile.ZipInfo) -> int:
+        """Return the offset in the zip of the data of ``info``, after its local header."""
+        signature, name_length, extra_length = LOCAL_HEADER.unpack_from(self.mapping, info.header_offset)
+        if signature != b'PK\x03\x04':
+            raise zipfile.BadZipFile(f"Bad local header of {info.filename} in {self.zip_path}")
+        return info.header_offset + LOCAL_HEADER.size + name_length + extra_length
+
+    def _shallowest(self, members: typing.Iterable[ArchiveMember], folder: typing.Callable[[PurePosixPath], PurePosixPath]) -> List[ArchiveMember]:
+        members = list(members)
+        if not members:
+            return []
+        depth = min(len(folder(PurePosixPath(member.name)).parts) for member in members)
+        return [member for member in members if len(folder(PurePosixPath(member.name)).parts) == depth]
+
+    @property
+    def final_poses(self) -> List[ArchiveMember]:
+        return self._shallowest((member for member in self.members if member.kind == 'final'), lambda path: path.parent)
+
+    @property
+    def epochs(self) -> Dict[int, List[ArchiveMember]]:
+        """Pose and trajectory members of every epoch, by epoch number."""
+        poses = self._shallowest((member for member in self.members if member.kind == 'epoch' and member.epoch is not None),
+                                 lambda path: next(parent for parent in path.parents if parent.parent.name.endswith('_output')))
+        epochs: Dict[int, List[ArchiveMember]] = {}
+        for member in poses:
+            epochs.setdefault(member.epoch, []).append(member)
+        return dict(sorted(epochs.items()))
+
+    @property
+    def pose_stores(self) -> Dict[int, ArchiveMember]:
+        """The poses.npz of the epochs compacted with compact_poses, by epoch number."""
+        stores = {}
+        for member in self.members:
+            path = PurePosixPath(member.name)
+            if path.name == pose_store.STORE_NAME and path.parent.parent.name.endswith('_output'):
+                epoch = outputs.epoch_number(path.parent.name)
+                if epoch is not None:
+                    stores[epoch] = member
+        return dict(sorted(stores.items()))
+
+    def open_pose_store(self, epoch: int) -> pose_store.PoseStore:
+        """Open the compacted poses of ``epoch``, see :class:`pose_store.PoseStore`."""
+        return pose_store.PoseStore(io.BytesIO(self.pose_stores[epoch].buffer()))
+
+    def trajectories(self, epoch: Optional[int] = None) -> List[ArchiveMember]:
+        return [member for number, members in self.epochs.items() if epoch is None or number == epoch
+                for member in members if member.trajectory]
+
+    @property
+    def logs(self) -> List[ArchiveMember]:
+        return [member for member in self.members if PurePosixPath(member.name).suffix in LOG_SUFFIXES]
+
+    @property
+    def replicas(self) -> List[str]:
+        """Prefixes of the replicas of an ensemble output, to open with :class:`OutputArchive`."""
+        return sorted({prefix for prefix in map(outputs.replica_prefix, (member.name for member in self.members)) if prefix})
+
+    @property
+    def yaml(self) -> Dict[str, typing.Any]:
+        """The shallowest ``input.yaml`` of the archive, or an empty dictionary."""
+        if self._yaml is None:
+            candidates = sorted((member for member in self.members if PurePosixPath(member.name).name == 'input.yaml'),
+                                key=lambda member: len(PurePosixPath(member.name).parts))
+            self._yaml = (yaml.safe_load(candidates[0].read()) or {}) if candidates else {}
+        return self._yaml
+
+    @property
+    def metric(self) -> Optional[str]:
+        return self.yaml.get('RankingMetric')
+
+    def top_poses(self, n: Optional[int] = None, metric: Optional[str] = None,
+                  members: Optional[typing.Iterable[ArchiveMember]] = None) -> List[ArchiveMember]:
+        """Return the ``n`` best scored ``members`` (default: the final poses), reading only those members."""
+        ranked = sorted(self.final_poses if members is None else members, key=lambda member: (member.score(metric), member.name))
+        return ranked[:n] if n else ranked
+
+    def extract(self, members: typing.Iterable[ArchiveMember], dest_dir: str, flatten: bool = False) -> List[Path]:
+        """Extract only ``members`` to ``dest_dir``, under their zip path or with their file name if ``flatten``."""
+        extracted = []
+        for member in members:
+            relative = PurePosixPath(member.name).name if flatten else member.name
+            dest = Path(dest_dir).joinpath(*PurePosixPath(relative).parts)
+            if not os.path.abspath(dest).startswith(os.path.abspath(dest_dir) + os.sep):
+                raise ValueError(f"Member {member.name} would be extracted outside {dest_dir}")
+            extracted.append(member.extract(str(dest)))
+        return extracted
+
+    def extract_top(self, n: int, dest_dir: str, metric: Optional[str] = None, flatten: bool = True) -> List[Path]:
+        return self.extract(self.top_poses(n, metric), dest_dir, flatten)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Read the poses of an AsiteDesign output zip without extracting it.')
+    parser.add_argument('zip_path', help='Output zip.')
+    parser.add_argument('--prefix', default='', help='Folder of the zip to look into, e.g. a replica of an ensemble.')
+    parser.add_argument('--top', type=int, default=None, help='Only the N best final poses.')
+    parser.add_argument('--metric', default=None, help='Score to rank by, default the RankingMetric of the job.')
+    parser.add_argument('--extract', default=None, help='Folder to extract the selected final poses to.')
+    args = parser.parse_args()
+    with OutputArchive(args.zip_path, args.prefix) as archive:
+        poses = archive.top_poses(args.top, args.metric)
+        if args.extract:
+            for path in archive.extract(poses, args.extract, flatten=True):
+                print(path)
+            return
+        for member in poses:
+            print(f"{member.score(args.metric)}\t{member.name}")
+        print(f"{len(archive.epochs)} epochs, {len(archive.logs)} logs, {len(archive.replicas)} replicas")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+""" Result memoization for package biobb_asitedesign.asitedesign """
+import copy
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import time
+from typing import Any, Dict, Iterable, Mapping, Optional
+import uuid
+
+from biobb_asitedesign.asitedesign.common import default_cache_path, file_digest
+
+
+def canonical_yaml(yaml_dict: Mapping[str, Any]) -> str:
+    """Return a canonical JSON text of an AsiteDesign YAML dictionary.
+
+    Keys are sorted and the sandbox dependent paths (``Name``, ``PDB``, ``ParameterFiles`` and
+    the ``reference`` of sequence constraints) are reduced to their file names, so the same
+    design gives the same text whatever sandbox or container volume it was written for.
+    """
+    normalized = copy.deepcopy(dict(yaml_dict))
+    for key in ('Name', 'PDB'):
+        if normalized.get(key):
+            normalized[key] = Path(str(normalized[key])).name
+    if normalized.get('ParameterFiles'):
+        normalized['ParameterFiles'] = sorted(Path(str(path)).name for path in normalized['ParameterFiles'])
+    for constraint in (normalized.get('Constraints') or {}).values():
+        if isinstance(constraint, dict) and constraint.get('reference'):
+            constraint['reference'] = Path(str(constraint['reference'])).name
+    return json.dumps(normalized, sort_keys=True, default=str)
+
+
+def container_identity(container_path: Optional[str], container_image: Optional[str]) -> str:
+    """Return a cheap identity of the container image.
+
+    Image files (e.g. Singularity ``.sif``) are identified by their resolved path, size and
+    modification time instead of hashing several GB. Registry images are identified by their
+    reference, so pin a tag or digest to make cached results trustworthy.
+    """
+    if container_image and Path(container_image).is_file():
+        stat = Path(container_image).stat()
+        return f"{container_path}:{Path(container_image).resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+    return f"{container_path}:{container_image}"
+
+
+def job_digest(yaml_dict: Mapping[str, Any], input_pdb: str, params_files: Iterable[str],
+               image_identity: str, extra: Optional[Mapping[str, Any]] = None) -> str:
+    """Return the SHA-256 key of a design job from its canonical inputs."""
+    sha = hashlib.sha256()
+    sha.update(canonical_yaml(yaml_dict).encode())
+    sha.update(file_digest(input_pdb).encode())
+    for path in sorted(params_files, key=lambda path: Path(path).name):
+        sha.update(Path(path).name.encode())
+        sha.update(file_digest(path).encode())
+    sha.update(image_identity.encode())
+    sha.update(json.dumps(extra or {}, sort_keys=True, default=str).encode())
+    return sha.hexdigest()
+
+
+class ResultCache:
+    """Directory of output zips named by :func:`job_digest`, with a JSON sidecar per entry."""
+
+    def __init__(self, cache_path: Optional[str] = None) -> None:
+        self.cache_path = Path(cache_path or default_cache_path('results'))
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+
+    def lookup(self, digest: str) -> Optional[Path]:
+        path = self.cache_path.joinpath(f"{digest}.zip")
+        return path if path.exists() else None
+
+    def fetch(self, digest: str, output_path: str) -> bool:
+        """Materialize the cached zip of ``digest`` at ``output_path``. Return False on a miss."""
+        cached = self.lookup(digest)
+        if not cached:
+            return False
+        _publish(cached, Path(output_path))
+        return True
+
+    def store(self, digest: str, output_path: str, metadata: Optional[Dict[str, Any]] = None) -> Path:
+        """Add ``output_path`` to the cache under ``digest``."""
+        cached = self.cache_path.joinpath(f"{digest}.zip")
+        _publish(Path(output_path), cached)
+        metadata = dict(metadata or {}, digest=digest, created=time.time())
+        self.cache_path.joinpath(f"{digest}.json").write_text(json.dumps(metadata, indent=2, default=str))
+        return cached
+
+
+def _publish(src: Path, dest: Path) -> None:
+    """Copy ``src`` to a temporary name next to ``dest`` and rename it atomically.
+
+    The copy is never a hardlink: a job writing the output zip again (``ZipFile(..., 'w')``)
+    truncates the file in place, which would corrupt a cache entry sharing its inode.
+    """
+    if dest.exists() and dest.samefile(src):
+        return
+    tmp = dest.with_name(f".{dest.name}.{uuid.uuid4().hex}")
+    shutil.copy2(src, tmp)
+    os.replace(tmp, dest)
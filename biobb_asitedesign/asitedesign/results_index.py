@@ -0,0 +1,340 @@
+""" Cross-run index of the designed poses for package biobb_asitedesign.asitedesign
+
+The poses of finished output zips are indexed once in a local SQLite database: one row per pose
+with the job hash, the preset, the ``RankingMetric`` score, the constraint score, all the parsed
+scores, the mutant sequence at ``DesignResidues`` and the member path in its zip, plus one row
+per design position so mutations are found through an index. Ranking and filtering queries then
+answer from the database without opening the archives.
+
+Command line::
+
+    python -m biobb_asitedesign.asitedesign.results_index add runs/ --epochs
+    python -m biobb_asitedesign.asitedesign.results_index top -k 20 --mutation 28-A:H --mutation 57-A:S
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+from pathlib import Path, PurePosixPath
+import sqlite3
+import sys
+import time
+import typing
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+import zipfile
+
+import yaml
+
+from biobb_asitedesign.asitedesign import outputs
+from biobb_asitedesign.asitedesign.common import default_cache_path
+from biobb_asitedesign.asitedesign.pdb_index import PDBIndex, parse_residue_key
+from biobb_asitedesign.asitedesign.preset import SOFTWARE_PARAMS
+from biobb_asitedesign.asitedesign.result_cache import canonical_yaml
+
+SCHEMA_VERSION = 1
+RECORD_FIELDS = ['job_hash', 'preset', 'zip_path', 'member', 'kind', 'epoch', 'metric', 'score', 'constraint_score',
+                 'sequence']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    zip_path TEXT PRIMARY KEY,
+    job_hash TEXT,
+    preset TEXT,
+    metric TEXT,
+    design_residues TEXT,
+    size INTEGER,
+    mtime_ns INTEGER,
+    indexed REAL
+);
+CREATE TABLE IF NOT EXISTS poses (
+    id INTEGER PRIMARY KEY,
+    zip_path TEXT NOT NULL REFERENCES jobs(zip_path) ON DELETE CASCADE,
+    member TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    epoch INTEGER,
+    score REAL,
+    constraint_score REAL,
+    sequence TEXT,
+    positions TEXT,
+    scores TEXT
+);
+CREATE TABLE IF NOT EXISTS mutations (
+    pose_id INTEGER NOT NULL REFERENCES poses(id) ON DELETE CASCADE,
+    position TEXT NOT NULL,
+    residue TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS poses_score ON poses(kind, score);
+CREATE INDEX IF NOT EXISTS poses_zip ON poses(zip_path);
+CREATE INDEX IF NOT EXISTS mutations_position ON mutations(position, residue, pose_id);
+CREATE INDEX IF NOT EXISTS mutations_pose ON mutations(pose_id);
+"""
+
+
+class PoseRecord(typing.NamedTuple):
+    job_hash: Optional[str]
+    preset: Optional[str]
+    zip_path: str
+    member: str
+    kind: str
+    epoch: Optional[int]
+    metric: Optional[str]
+    score: float
+    constraint_score: Optional[float]
+    sequence: str
+    positions: List[str]
+    scores: Dict[str, float]
+
+
+def default_index_path() -> str:
+    return str(Path(default_cache_path('index')).joinpath('results.sqlite'))
+
+
+def yaml_hash(yaml_dict: Mapping[str, Any]) -> str:
+    """Return the hash of the canonical AsiteDesign YAML, the job hash of zips indexed without one."""
+    return hashlib.sha256(canonical_yaml(yaml_dict).encode()).hexdigest()
+
+
+def infer_preset(yaml_dict: Mapping[str, Any]) -> Optional[str]:
+    """Return the SOFTWARE_PARAMS preset whose fixed values match most of ``yaml_dict``, None on a tie."""
+    matches = {}
+    for name, preset in SOFTWARE_PARAMS.items():
+        matches[name] = sum(1 for key, value in preset.items() if value is not None and yaml_dict.get(key) == value)
+    ranked = sorted(matches.items(), key=lambda item: -item[1])
+    if not ranked or (len(ranked) > 1 and ranked[0][1] == ranked[1][1]):
+        return None
+    return ranked[0][0]
+
+
+def constraint_score(scores: Mapping[str, float]) -> Optional[float]:
+    """Return the ``OnlyConstraints`` score of a pose, else the sum of its Rosetta ``*_constraint`` terms."""
+    if 'OnlyConstraints' in scores:
+        return scores['OnlyConstraints']
+    terms = [value for key, value in scores.items() if key.endswith('_constraint')]
+    return sum(terms) if terms else None
+
+
+def zip_records(zip_path: str, job_hash: Optional[str] = None, preset: Optional[str] = None,
+                epochs: bool = False) -> Tuple[List[PoseRecord], Dict[str, Any]]:
+    """Read the pose records of an output zip: its final poses, and its epoch poses with ``epochs``.
+    For an ensemble only its merged final poses are read, not those of every replica.
+
+    Every pose takes the AsiteDesign YAML (``input.yaml``) of the deepest folder above it, or the
+    first one of the zip, for its metric and design residues. Without ``job_hash`` or ``preset``
+    they are derived from that YAML.
+
+    Returns:
+        tuple: The records and the YAML of the job.
+    """
+    zip_path = str(Path(zip_path).resolve())
+    records = []
+    with zipfile.ZipFile(zip_path) as zip_f:
+        names = zip_f.namelist()
+        yamls = {}
+        for name in names:
+            if PurePosixPath(name).name == 'input.yaml':
+                yamls[str(PurePosixPath(name).parent)] = yaml.safe_load(zip_f.read(name)) or {}
+        default_yaml = yamls[sorted(yamls, key=len)[0]] if yamls else {}
+        # The final poses of the replicas of an ensemble are already among its merged final poses
+        merged = any(outputs.pose_member_kind(name)[0] == 'final' and not outputs.replica_prefix(name) for name in names)
+        for name in names:
+            kind, epoch = outputs.pose_member_kind(name)
+            if kind is None or (kind == 'epoch' and not epochs):
+                continue
+            if kind == 'final' and merged and outputs.replica_prefix(name):
+                continue
+            parents = [str(parent) for parent in PurePosixPath(name).parents if str(parent) in yamls]
+            yaml_dict = yamls[parents[0]] if parents else default_yaml
+            metric = yaml_dict.get('RankingMetric')
+            lines = io.TextIOWrapper(io.BytesIO(zip_f.read(name)), errors='replace').readlines()
+            scores = outputs.parse_scores(lines)
+            keys = outputs.design_keys(yaml_dict.get('DesignResidues'))
+            sequence = PDBIndex.from_lines(lines).sequence(keys) if keys else ''
+            records.append(PoseRecord(job_hash or yaml_hash(yaml_dict), preset or infer_preset(yaml_dict), zip_path, name,
+                                      kind, epoch, metric, outputs.pose_score(scores, metric), constraint_score(scores),
+                                      sequence, [_position(key) for key in keys], scores))
+    return records, default_yaml
+
+
+def parse_mutation(text: str) -> Tuple[str, str]:
+    """Parse a ``<resnum>-<chain>:<one letter code>`` mutation filter, e.g. ``28-A:H``."""
+    position, _, residue = str(text).partition(':')
+    key = parse_residue_key(position.strip())
+    if key is None or len(residue.strip()) != 1:
+        raise ValueError(f"Mutations are given as <resnum>-<chain>:<residue>, e.g. 28-A:H, got {text}")
+    return _position(key), residue.strip().upper()
+
+
+def _position(key: Tuple[int, str]) -> str:
+    return f"{key[0]}-{key[1]}"
+
+
+class ResultsIndex:
+    """SQLite index of the poses of many output zips, see :mod:`results_index`."""
+
+    def __init__(self, index_path: Optional[str] = None, timeout: float = 60) -> None:
+        self.index_path = Path(index_path or default_index_path())
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        # Several jobs may finish at once, wait for each other's transactions
+        self.connection = sqlite3.connect(str(self.index_path), timeout=timeout)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise ValueError(f"{self.index_path} has schema version {version}, expected {SCHEMA_VERSION}")
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def add_zip(self, zip_path: str, job_hash: Optional[str] = None, preset: Optional[str] = None,
+                epochs: bool = False, force: bool = False) -> int:
+        """Index the poses of ``zip_path``, replacing its previous records. Zips not modified since they
+        were indexed are skipped unless ``force``.
+
+        Returns:
+            int: Number of poses indexed.
+        """
+        zip_path = str(Path(zip_path).resolve())
+        stat = os.stat(zip_path)
+        known = self.connection.execute('SELECT size, mtime_ns FROM jobs WHERE zip_path = ?', (zip_path,)).fetchone()
+        if known and tuple(known) == (stat.st_size, stat.st_mtime_ns) and not force:
+            return 0
+        records, yaml_dict = zip_records(zip_path, job_hash, preset, epochs)
+        with self.connection:
+            self.connection.execute('DELETE FROM jobs WHERE zip_path = ?', (zip_path,))
+            self.connection.execute(
+                'INSERT INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (zip_path, job_hash or (records[0].job_hash if records else yaml_hash(yaml_dict)),
+                 preset or (records[0].preset if records else infer_preset(yaml_dict)), yaml_dict.get('RankingMetric'),
+                 json.dumps([_position(key) for key in outputs.design_keys(yaml_dict.get('DesignResidues'))]),
+                 stat.st_size, stat.st_mtime_ns, time.time()))
+            for record in records:
+                cursor = self.connection.execute(
+                    'INSERT INTO poses (zip_path, member, kind, epoch, score, constraint_score, sequence, positions, scores) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (zip_path, record.member, record.kind, record.epoch, _finite(record.score), record.constraint_score,
+                     record.sequence, json.dumps(record.positions), json.dumps(record.scores)))
+                self.connection.executemany('INSERT INTO mutations VALUES (?, ?, ?)',
+                                            [(cursor.lastrowid, position, residue)
+                                             for position, residue in zip(record.positions, record.sequence)])
+        return len(records)
+
+    def add_directory(self, folder: str, epochs: bool = False, force: bool = False) -> Dict[str, int]:
+        """Index every zip below ``folder``. Returns the number of poses indexed by zip."""
+        added = {}
+        for zip_path in sorted(Path(folder).rglob('*.zip')):
+            if zipfile.is_zipfile(str(zip_path)):
+                added[str(zip_path)] = self.add_zip(str(zip_path), epochs=epochs, force=force)
+        return added
+
+    def remove_missing(self) -> List[str]:
+        """Drop the records of the zips that no longer exist."""
+        missing = [row[0] for row in self.connection.execute('SELECT zip_path FROM jobs') if not os.path.exists(row[0])]
+        with self.connection:
+            self.connection.executemany('DELETE FROM jobs WHERE zip_path = ?', [(path,) for path in missing])
+        return missing
+
+    def top(self, k: Optional[int] = 10, metric: Optional[str] = None, mutations: typing.Iterable[str] = (),
+            preset: Optional[str] = None, job_hash: Optional[str] = None, kind: Optional[str] = 'final') -> List[PoseRecord]:
+        """Return the ``k`` best poses (lowest score) matching all the filters.
+
+        Args:
+            k: Number of poses, all if None.
+            metric: Score to rank by: the ``RankingMetric`` of every job by default, ``constraints``
+                for the constraint score, or the name of any parsed score.
+            mutations: ``<resnum>-<chain>:<residue>`` the poses must have, see :func:`parse_mutation`.
+            preset: Only poses of jobs with this preset.
+            job_hash: Only poses of the jobs with this hash.
+            kind: ``final`` or ``epoch`` poses, both if None.
+        """
+        order_parameters: List[Any] = []
+        if metric in (None, 'score'):
+            order = 'p.score'
+        elif metric == 'constraints':
+            order = 'p.constraint_score'
+        else:
+            order = "json_extract(p.scores, '$.\"' || ? || '\"')"
+            order_parameters = [metric]
+        where = [f"{order} IS NOT NULL"]
+        parameters = list(order_parameters)
+        for position, residue in (parse_mutation(mutation) for mutation in mutations):
+            where.append('p.id IN (SELECT pose_id FROM mutations WHERE position = ? AND residue = ?)')
+            parameters.extend([position, residue])
+        for column, value in (('p.kind', kind), ('j.preset', preset), ('j.job_hash', job_hash)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                parameters.append(value)
+        query = (f"SELECT j.job_hash, j.preset, p.zip_path, p.member, p.kind, p.epoch, j.metric, p.score, "
+                 f"p.constraint_score, p.sequence, p.positions, p.scores FROM poses p JOIN jobs j ON j.zip_path = p.zip_path "
+                 f"WHERE {' AND '.join(where)} ORDER BY {order}, p.zip_path, p.member")
+        parameters.extend(order_parameters)
+        if k is not None:
+            query += ' LIMIT ?'
+            parameters.append(int(k))
+        rows = self.connection.execute(query, parameters)
+        return [PoseRecord(*row[:7], _score(row[7]), row[8], row[9], json.loads(row[10]), json.loads(row[11]))
+                for row in rows]
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> 'ResultsIndex':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def _finite(value: float) -> Optional[float]:
+    return value if value not in (float('inf'), float('-inf')) else None
+
+
+def _score(value: Optional[float]) -> float:
+    return float('inf') if value is None else value
+
+
+def write_records(records: typing.Iterable[PoseRecord], out: typing.TextIO = sys.stdout) -> None:
+    writer = csv.writer(out)
+    writer.writerow(RECORD_FIELDS)
+    for record in records:
+        writer.writerow(record[:len(RECORD_FIELDS)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Index the poses of AsiteDesign output zips and rank them across runs.')
+    parser.add_argument('--index-path', default=default_index_path(), help='SQLite index file.')
+    commands = parser.add_subparsers(dest='command')
+    add = commands.add_parser('add', help='Index output zips, or the zips below folders.')
+    add.add_argument('paths', nargs='+', help='Output zips or folders.')
+    add.add_argument('--epochs', action='store_true', help='Also index the poses of the sampling epochs.')
+    add.add_argument('--force', action='store_true', help='Index again the zips not modified since they were indexed.')
+    commands.add_parser('prune', help='Drop the records of the zips that no longer exist.')
+    top = commands.add_parser('top', help='Print the best poses as CSV.')
+    top.add_argument('-k', type=int, default=10, help='Number of poses.')
+    top.add_argument('--metric', default=None, help='Score to rank by, default the RankingMetric of every job. '
+                                                    '"constraints" for the constraint score.')
+    top.add_argument('--mutation', action='append', default=[], help='Required mutation <resnum>-<chain>:<residue>, repeatable.')
+    top.add_argument('--preset', default=None, help='Only jobs of this preset.')
+    top.add_argument('--job-hash', default=None, help='Only jobs with this hash.')
+    top.add_argument('--kind', default='final', choices=['final', 'epoch', 'all'], help='Kind of poses.')
+    args = parser.parse_args()
+
+    with ResultsIndex(args.index_path) as index:
+        if args.command == 'add':
+            for path in args.paths:
+                added = index.add_directory(path, args.epochs, args.force) if os.path.isdir(path) else \
+                    {path: index.add_zip(path, epochs=args.epochs, force=args.force)}
+                for zip_path, count in added.items():
+                    print(f"{zip_path}: {count} poses")
+        elif args.command == 'prune':
+            for path in index.remove_missing():
+                print(f"Removed {path}")
+        elif args.command == 'top':
+            write_records(index.top(args.k, args.metric, args.mutation, args.preset, args.job_hash,
+                                    None if args.kind == 'all' else args.kind))
+        else:
+            parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+""" Node-local scratch sandboxes for package biobb_asitedesign.asitedesign
+
+With WriteALL every MPI rank writes many small PDB files to the sandbox, which on a shared
+parallel filesystem loads its metadata servers. The sandbox can be moved to node-local scratch
+or tmpfs instead, chosen among candidate folders as the first one with enough free space. The
+output zip is then packed straight from the scratch sandbox, and the sandbox itself may be
+copied back to the shared filesystem in one sequential transfer: a single tar file, or the
+folder tree.
+"""
+import os
+from pathlib import Path
+import shutil
+import tarfile
+import typing
+from typing import List, Optional, Tuple
+
+AUTO_CANDIDATES = ('$TMPDIR', '/dev/shm')
+COPY_BACK_MODES = ('none', 'tar', 'tree')
+# Logs, YAML, params and the files of the controller rank
+BASE_BYTES = 64 * 1024 ** 2
+
+
+def candidates(scratch_path: str) -> List[Path]:
+    """Return the candidate scratch folders of the scratch_path property: ``auto`` for $TMPDIR and then
+    /dev/shm, or a comma separated list of folders, with environment variables expanded."""
+    entries = AUTO_CANDIDATES if str(scratch_path).strip().lower() == 'auto' else str(scratch_path).split(',')
+    paths = []
+    for entry in entries:
+        expanded = os.path.expandvars(entry.strip())
+        # Unset variables are left unexpanded
+        if expanded and '$' not in expanded:
+            paths.append(Path(expanded))
+    return paths
+
+
+def estimate_bytes(input_pdb: str, n_poses: int, n_iterations: int, n_steps: int = 1, write_all: bool = False) -> int:
+    """Estimate the size of the sandbox of a job: a pose per epoch and pose, or per step with WriteALL."""
+    pose_bytes = os.path.getsize(input_pdb) if input_pdb and os.path.exists(input_pdb) else 0
+    frames = int(n_poses) * (int(n_iterations) + 1) * (max(1, int(n_steps)) if write_all else 1)
+    return BASE_BYTES + pose_bytes * frames
+
+
+def select_scratch(paths: typing.Iterable[Path], required_bytes: int) -> Tuple[Optional[Path], List[str]]:
+    """Return the first of ``paths`` that is a writable folder with ``required_bytes`` free, and the
+    reasons the previous ones were skipped."""
+    messages = []
+    for path in paths:
+        if not path.is_dir() or not os.access(str(path), os.W_OK | os.X_OK):
+            messages.append(f"Scratch {path} skipped: not a writable folder")
+            continue
+        free = shutil.disk_usage(str(path)).free
+        if free < required_bytes:
+            messages.append(f"Scratch {path} skipped: {free / 1024 ** 3:.2f} GB free, "
+                            f"{required_bytes / 1024 ** 3:.2f} GB required")
+            continue
+        return path, messages
+    return None, messages
+
+
+def relocate(sandbox: str, scratch: Path) -> Path:
+    """Move the staged ``sandbox`` folder below ``scratch``, keeping its name."""
+    dest = scratch.joinpath(Path(sandbox).name)
+    shutil.move(sandbox, str(dest))
+    return dest
+
+
+def same_filesystem(path: str, other: str) -> bool:
+    return os.stat(path).st_dev == os.stat(other).st_dev
+
+
+def copy_back(sandbox: str, dest_dir: str, mode: str = 'tar') -> Optional[Path]:
+    """Copy the ``sandbox`` folder to ``dest_dir``: as ``<name>.tar`` (one file and one sequential write
+    on the shared filesystem) or as the folder tree. Returns the copy, or None for mode ``none``."""
+    if mode not in COPY_BACK_MODES:
+        raise ValueError(f"Unknown copy back mode {mode}, use one of {', '.join(COPY_BACK_MODES)}")
+    if mode == 'none':
+        return None
+    source = Path(sandbox)
+    Path(dest_dir).mkdir(parents=True, exist_ok=True)
+    if mode == 'tree':
+        dest = Path(dest_dir).joinpath(source.name)
+        shutil.copytree(str(source), str(dest), symlinks=True)
+        return dest
+    dest = Path(dest_dir).joinpath(f"{source.name}.tar")
+    partial = dest.with_name(dest.name + '.part')
+    with tarfile.open(str(partial), 'w', format=tarfile.PAX_FORMAT) as tar:
+        tar.add(str(source), arcname=source.name)
+    os.replace(partial, dest)
+    return dest
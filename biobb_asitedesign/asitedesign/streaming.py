@@ -0,0 +1,171 @@
+""" Incremental packaging of the output while the job runs for package biobb_asitedesign.asitedesign
+
+An epoch folder does not change once AsiteDesign has spawned the next epoch (see
+:func:`outputs.completed_epochs`), so it can be packed while the sampling continues:
+
+* ``archive`` mode appends every completed epoch to the output zip, written as ``<output>.part``
+  until the job ends, when the remaining files are appended and it is renamed to the output.
+* ``shards`` mode writes every completed epoch to its own zip in a shards folder, which is never
+  modified once written. At the end the shards are copied into the output zip as they are stored,
+  without compressing their members again.
+
+Either way the final packaging only compresses the files written after the last completed epoch.
+The progress is published in a JSON index, replaced atomically on every change, that downstream
+steps can poll for the epochs ready to read and the archive holding them.
+"""
+import json
+import logging
+import os
+from pathlib import Path
+import shutil
+import threading
+import time
+import typing
+from typing import Any, Dict, List, Optional
+import uuid
+
+from biobb_asitedesign.asitedesign import outputs
+from biobb_asitedesign.asitedesign.archive import AppendableArchive, write_archive
+
+INDEX_VERSION = 1
+STREAM_MODES = ('archive', 'shards')
+
+
+def read_index(index_path: str) -> Dict[str, Any]:
+    """Return the index written by a :class:`StreamingPackager`, empty if it does not exist yet."""
+    try:
+        with open(index_path) as index_file:
+            return json.load(index_file)
+    except FileNotFoundError:
+        return {}
+
+
+class StreamingPackager(threading.Thread):
+    """Background thread packing every newly completed epoch of a running job.
+
+    Member names are those of the final output zip: relative to the parent of the sandbox
+    ``root``. While the job runs the members are compressed in a single thread, to leave the
+    cores to the MPI ranks, and :meth:`finish` packs the rest with ``workers`` threads.
+    """
+
+    def __init__(self, root: str, name: str, zip_file: str, index_path: str, mode: str = 'archive',
+                 shards_path: Optional[str] = None, compress_level: int = 6, workers: Optional[int] = None,
+                 interval: float = 30, out_log: logging.Logger = None) -> None:
+        super().__init__(name='asitedesign-streaming', daemon=True)
+        if mode not in STREAM_MODES:
+            raise ValueError(f"stream mode must be one of {STREAM_MODES}, not {mode!r}")
+        if mode == 'shards' and not shards_path:
+            raise ValueError("The shards mode needs a shards path")
+        self.root = str(Path(root).resolve())
+        self.name_prefix = name
+        self.zip_file = zip_file
+        self.index_path = index_path
+        self.mode = mode
+        self.shards_path = shards_path
+        self.compress_level = compress_level
+        self.workers = workers
+        self.interval = interval
+        self.out_log = out_log
+        self.base = str(Path(self.root).parent)
+        self.epochs: Dict[int, Dict[str, Any]] = {}
+        self.status = 'running'
+        self.archive: Optional[AppendableArchive] = None
+        if mode == 'archive':
+            self.archive = AppendableArchive(self.partial_path, compress_level, workers)
+        else:
+            Path(shards_path).mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self.write_index()
+
+    @property
+    def partial_path(self) -> str:
+        return f"{self.zip_file}.part"
+
+    def shard_path(self, epoch: int) -> str:
+        return str(Path(self.shards_path).joinpath(f"epoch_{epoch:04d}.zip"))
+
+    def _pose_members(self, entries: typing.Iterable[Dict[str, Any]]) -> List[str]:
+        return sorted(entry['name'] for entry in entries if entry['name'].endswith('.pdb'))
+
+    def pack(self) -> List[int]:
+        """Pack the epochs completed since the last call and publish them in the index."""
+        packed = []
+        with self._lock:
+            for epoch, path in outputs.completed_epochs(self.root, self.name_prefix):
+                if epoch in self.epochs:
+                    continue
+                if self.archive:
+                    entries = self.archive.append([str(path)], base=self.base, workers=1)
+                    location = self.partial_path
+                else:
+                    location = self.shard_path(epoch)
+                    tmp = str(Path(location).with_name(f".{Path(location).name}.{uuid.uuid4().hex}"))
+                    entries = write_archive(tmp, [str(path)], compress_level=self.compress_level, workers=1, base=self.base)
+                    os.replace(tmp, location)
+                self.epochs[epoch] = {'epoch': epoch, 'archive': location, 'n_members': len(entries),
+                                      'poses': self._pose_members(entries)}
+                packed.append(epoch)
+                if self.out_log:
+                    self.out_log.info(f"Packed epoch {epoch} ({len(entries)} members) into {location}")
+            if packed:
+                self.write_index()
+        return packed
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.pack()
+            except OSError as error:
+                # The epoch may still be written, retry on the next interval
+                if self.out_log:
+                    self.out_log.info(f"Streaming packaging postponed: {error}")
+
+    def stop(self) -> List[int]:
+        """Stop the thread and pack the epochs completed since the last interval."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        return self.pack()
+
+    def finish(self, file_list: typing.Iterable[str], workers: Optional[int] = None,
+               remove_shards: bool = True) -> List[Dict[str, Any]]:
+        """Append ``file_list`` (see :func:`archive.collect_members`) to the packed epochs and write the output zip.
+
+        Returns:
+            list: Manifest entries of the output zip.
+        """
+        self.pack()
+        with self._lock:
+            if self.archive is None:
+                self.archive = AppendableArchive(self.partial_path, self.compress_level, self.workers)
+                for epoch in sorted(self.epochs):
+                    self.archive.append_archive(self.epochs[epoch]['archive'])
+            self.archive.append(file_list, workers=workers)
+            entries = self.archive.close()
+            os.replace(self.partial_path, self.zip_file)
+            for record in self.epochs.values():
+                record['archive'] = self.zip_file
+            final_prefix = outputs.final_pose_dir(self.root, self.name_prefix).relative_to(self.base).as_posix() + '/'
+            self.status = 'complete'
+            self.write_index(final_poses=[name for name in self._pose_members(entries) if name.startswith(final_prefix)])
+        if self.shards_path and remove_shards:
+            shutil.rmtree(self.shards_path, ignore_errors=True)
+        if self.out_log:
+            self.out_log.info(f"Streaming packaging complete: {self.zip_file} ({len(entries)} members)")
+        return entries
+
+    def write_index(self, final_poses: Optional[List[str]] = None) -> Dict[str, Any]:
+        index = {'version': INDEX_VERSION,
+                 'status': self.status,
+                 'mode': self.mode,
+                 'output_path': self.zip_file,
+                 'updated': time.time(),
+                 'epochs': [self.epochs[epoch] for epoch in sorted(self.epochs)],
+                 'final_poses': final_poses or []}
+        index_path = Path(self.index_path)
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = index_path.with_name(f".{index_path.name}.{uuid.uuid4().hex}")
+        tmp.write_text(json.dumps(index, indent=2))
+        os.replace(tmp, index_path)
+        return index
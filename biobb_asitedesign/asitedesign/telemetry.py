@@ -0,0 +1,202 @@
+""" Live progress telemetry of running design jobs for package biobb_asitedesign.asitedesign """
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import math
+from pathlib import Path
+import re
+import threading
+import time
+import typing
+from typing import Any, Dict, List, Optional
+
+from biobb_asitedesign.asitedesign import outputs
+
+# Progress lines of the ActiveSiteDesign log, e.g. "Rank 3 Epoch 2 Step 4 ... Energy: -512.3"
+EPOCH_RE = re.compile(r'\b(?:epoch|iteration)\b\D{0,3}(\d+)', re.IGNORECASE)
+STEP_RE = re.compile(r'\bstep\b\D{0,3}(\d+)', re.IGNORECASE)
+RANK_RE = re.compile(r'\brank\b\D{0,3}(\d+)', re.IGNORECASE)
+ENERGY_RE = re.compile(r'\b(?:energy|score|total)\b\s*[:=]?\s*(-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)', re.IGNORECASE)
+
+
+class LogTail:
+    """Incrementally read the complete lines appended to a file that may not exist yet."""
+
+    def __init__(self, candidates: typing.Iterable[Path]) -> None:
+        self.candidates = list(candidates)
+        self.path: Optional[Path] = None
+        self.offset = 0
+        self._partial = ''
+
+    def read(self) -> List[str]:
+        if self.path is None:
+            self.path = next((path for path in self.candidates if path.exists()), None)
+            if self.path is None:
+                return []
+        try:
+            with open(self.path, errors='replace') as log_file:
+                log_file.seek(self.offset)
+                text = log_file.read()
+                self.offset = log_file.tell()
+        except OSError:
+            return []
+        text = self._partial + text
+        lines = text.split('\n')
+        self._partial = lines.pop()
+        return lines
+
+
+class LogParser:
+    """Accumulate epoch, step, rank and energy progress from log lines."""
+
+    def __init__(self) -> None:
+        self.epoch: Optional[int] = None
+        self.steps = 0
+        self.best_energy = math.inf
+        self.rank_steps: Dict[int, int] = {}
+
+    def feed(self, lines: typing.Iterable[str]) -> None:
+        for line in lines:
+            epoch = EPOCH_RE.search(line)
+            if epoch:
+                self.epoch = max(self.epoch or 0, int(epoch.group(1)))
+            step = STEP_RE.search(line)
+            if step:
+                self.steps += 1
+                rank = RANK_RE.search(line)
+                if rank:
+                    self.rank_steps[int(rank.group(1))] = self.rank_steps.get(int(rank.group(1)), 0) + 1
+            energy = ENERGY_RE.search(line)
+            if energy:
+                self.best_energy = min(self.best_energy, float(energy.group(1)))
+
+
+class TelemetryMonitor(threading.Thread):
+    """Sample the progress of a running job and append it as JSON lines to ``metrics_path``.
+
+    Every ``interval`` seconds the new lines of the log are parsed and the output folders are
+    scanned. Each sample holds the completed epochs, steps per second, poses written, best
+    energy (from the log or from the pose scores), per rank progress and the ETA compared
+    with the ``Time`` budget of the job.
+    """
+
+    def __init__(self, root: str, name: str, metrics_path: str, n_iterations: int, time_budget_hours: float = None,
+                 log_paths: typing.Iterable[str] = (), metric: Optional[str] = None, interval: float = 30,
+                 out_log: logging.Logger = None) -> None:
+        super().__init__(name='asitedesign-telemetry', daemon=True)
+        self.root = root
+        self.name_prefix = name
+        self.metrics_path = metrics_path
+        self.n_iterations = n_iterations
+        self.time_budget = time_budget_hours * 3600 if time_budget_hours else None
+        self.metric = metric
+        self.interval = interval
+        self.out_log = out_log
+        self.tail = LogTail(Path(path) for path in log_paths)
+        self.parser = LogParser()
+        self.start_time = time.time()
+        self.latest: Dict[str, Any] = {}
+        self._scored: Dict[Path, float] = {}
+        self._previous = (self.start_time, 0)
+        self._stop_event = threading.Event()
+
+    def sample(self) -> Dict[str, Any]:
+        now = time.time()
+        self.parser.feed(self.tail.read())
+        completed = len(outputs.completed_epochs(self.root, self.name_prefix))
+        poses = outputs.pose_files(outputs.output_dir(self.root, self.name_prefix))
+        final_poses = outputs.pose_files(outputs.final_pose_dir(self.root, self.name_prefix))
+        for path in poses + final_poses:
+            if path not in self._scored:
+                try:
+                    self._scored[path] = outputs.pose_score(outputs.read_pose_scores(path), self.metric)
+                except OSError:
+                    continue
+        best_pose = min(self._scored.values(), default=math.inf)
+
+        elapsed = now - self.start_time
+        previous_time, previous_steps = self._previous
+        steps_per_sec = (self.parser.steps - previous_steps) / max(now - previous_time, 1e-9)
+        self._previous = (now, self.parser.steps)
+        eta = elapsed / completed * (self.n_iterations - completed) if completed else None
+
+        metrics = {'timestamp': now,
+                   'elapsed': round(elapsed, 3),
+                   'epochs_completed': completed,
+                   'epochs_total': self.n_iterations,
+                   'current_epoch': self.parser.epoch,
+                   'steps': self.parser.steps,
+                   'steps_per_sec': round(steps_per_sec, 4),
+                   'poses_written': len(poses),
+                   'final_poses': len(final_poses),
+                   'best_energy': _finite(min(self.parser.best_energy, best_pose)),
+                   'rank_steps': {str(rank): steps for rank, steps in sorted(self.parser.rank_steps.items())},
+                   'eta_seconds': round(eta, 1) if eta is not None else None,
+                   'time_budget_seconds': self.time_budget,
+                   'over_budget': bool(self.time_budget and eta is not None and elapsed + eta > self.time_budget)}
+        with open(self.metrics_path, 'a') as metrics_file:
+            metrics_file.write(json.dumps(metrics) + '\n')
+        self.latest = metrics
+        return metrics
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except OSError as error:
+                if self.out_log:
+                    self.out_log.info(f"Telemetry sample skipped: {error}")
+
+    def stop(self) -> Dict[str, Any]:
+        """Stop sampling and record a last sample."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        return self.sample()
+
+
+def prometheus_text(metrics: Dict[str, Any], prefix: str = 'asitedesign') -> str:
+    """Render the numeric entries of a telemetry sample in the Prometheus text exposition format."""
+    lines = []
+    for key, value in metrics.items():
+        if key == 'rank_steps':
+            lines.append(f"# TYPE {prefix}_rank_steps gauge")
+            lines.extend(f'{prefix}_rank_steps{{rank="{rank}"}} {steps}' for rank, steps in value.items())
+        elif isinstance(value, (bool, int, float)) and key != 'timestamp':
+            lines.append(f"# TYPE {prefix}_{key} gauge")
+            lines.append(f"{prefix}_{key} {float(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """Serve the latest sample of a :class:`TelemetryMonitor` at ``/metrics`` (Prometheus) and ``/`` (JSON)."""
+
+    def __init__(self, monitor: TelemetryMonitor, port: int, host: str = '127.0.0.1') -> None:
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics'):
+                    body, content_type = prometheus_text(monitor.latest).encode(), 'text/plain; version=0.0.4'
+                else:
+                    body, content_type = json.dumps(monitor.latest).encode(), 'application/json'
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, name='asitedesign-metrics', daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _finite(value: float) -> Optional[float]:
+    return value if math.isfinite(value) else None
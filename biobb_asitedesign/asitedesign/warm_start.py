@@ -0,0 +1,72 @@
+""" Warm start of a design job from a previous output zip for package biobb_asitedesign.asitedesign
+
+The best final poses of the previous run become the starting structures of the new one (the
+input PDB of the job, or of each replica of an ensemble), and its YAML and params files are
+reused: the YAML of the new job only needs the entries that change, e.g. Constraints or
+DesignResidues, and a lower nIterations for a refinement.
+"""
+from pathlib import Path, PurePosixPath
+import typing
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from biobb_asitedesign.asitedesign import common as com
+from biobb_asitedesign.asitedesign.reader import OutputArchive
+
+# Set by the new job: its input PDB and params files, and a new seed
+DROPPED_KEYS = ('PDB', 'ParameterFiles', 'Seed')
+
+
+class WarmStart(typing.NamedTuple):
+    source: str
+    # Best first
+    poses: List[Path]
+    scores: List[float]
+    yaml_path: str
+    params_dir: Optional[str]
+
+
+def previous_yaml(archive: OutputArchive) -> Dict[str, Any]:
+    """Return the YAML of the run of ``archive`` without the entries set by a new job."""
+    config = {key: value for key, value in archive.yaml.items() if key not in DROPPED_KEYS}
+    if config.get('Name'):
+        # Written as <sandbox>/<Name> by create_yaml
+        config['Name'] = PurePosixPath(str(config['Name'])).name
+    return config
+
+
+def params_members(archive: OutputArchive) -> List[Any]:
+    """Return the params files of the run of ``archive``, those listed in its ParameterFiles if found."""
+    members: Dict[str, Any] = {}
+    for member in sorted(archive.members, key=lambda member: (len(PurePosixPath(member.name).parts), member.name)):
+        path = PurePosixPath(member.name)
+        if path.suffix == '.params':
+            members.setdefault(path.name, member)
+    listed = {PurePosixPath(str(path)).name for path in archive.yaml.get('ParameterFiles') or []}
+    return [member for name, member in sorted(members.items()) if not listed or name in listed]
+
+
+def prepare(zip_path: str, dest_dir: str, top: int = 1, input_yaml_path: Optional[str] = None) -> WarmStart:
+    """Extract the ``top`` best final poses and the params files of the output zip ``zip_path`` to ``dest_dir``
+    and write the YAML of the previous run updated with ``input_yaml_path`` as ``dest_dir/input.yaml``."""
+    dest = Path(dest_dir)
+    with OutputArchive(zip_path) as archive:
+        best = archive.top_poses(top)
+        if not best:
+            raise ValueError(f"No final poses in {zip_path} to warm start from")
+        poses = []
+        for rank, member in enumerate(best, 1):
+            poses.append(member.extract(str(dest.joinpath(f"warm_start_{rank}.pdb"))))
+        scores = [member.score() for member in best]
+        members = params_members(archive)
+        params_dir = dest.joinpath('params')
+        archive.extract(members, str(params_dir), flatten=True)
+
+        config = previous_yaml(archive)
+    if input_yaml_path:
+        config.update(com.read_yaml(input_yaml_path) or {})
+    yaml_path = dest.joinpath('input.yaml')
+    with open(yaml_path, 'w') as yaml_file:
+        yaml.dump(config, yaml_file, default_flow_style=False)
+    return WarmStart(str(zip_path), poses, scores, str(yaml_path), str(params_dir) if members else None)
@@ -0,0 +1,288 @@
+""" Offline benchmark suite of the wrapper overhead of biobb_asitedesign
+
+Runs the wrapper phases against the stand-in of ``python -m ActiveSiteDesign`` and ``mpirun``
+in ``stub/``, so no PyRosetta, MPI or container is needed:
+
+    * staging: copy of the inputs and link of the params files into a sandbox.
+    * yaml: generation of the AsiteDesign YAML from a preset and an input YAML.
+    * archive: packing of a synthetic output tree into the output zip.
+    * cleanup: removal of the sandbox.
+    * end_to_end: a whole ``asitedesign`` launch with the stub on the PATH, plus the wall time
+      of each phase of its profiling report (only when biobb_common is installed).
+
+Every run is appended to a JSON lines history. With ``--check`` the medians are compared
+with the median of the previous runs of the same host and size, and the command exits with 1
+if any of them is slower than the tolerance allows::
+
+    python -m biobb_asitedesign.test.benchmark.run_benchmarks --size medium --repeat 5 --check
+"""
+import argparse
+import contextlib
+import json
+import os
+from pathlib import Path, PurePosixPath
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+from typing import Any, Callable, Dict, List, Mapping, Optional
+import zipfile
+
+import yaml
+
+from biobb_asitedesign.asitedesign import common as com
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+STUB_DIR = BENCHMARK_DIR.joinpath('stub')
+DATA_DIR = BENCHMARK_DIR.parent.joinpath('data', 'asitedesign')
+
+# Synthetic output tree sizes: epochs, spawned poses per epoch, atoms per pose, WriteALL frames per rank
+SIZES = {
+    'tiny': {'nIterations': 1, 'nPoses': 2, 'atoms': 200, 'frames': 0},
+    'small': {'nIterations': 2, 'nPoses': 4, 'atoms': 2000, 'frames': 0},
+    'medium': {'nIterations': 4, 'nPoses': 8, 'atoms': 5000, 'frames': 5},
+    'large': {'nIterations': 8, 'nPoses': 32, 'atoms': 12606, 'frames': 10},
+}
+
+
+def stub_env(size: Mapping[str, Any] = None, env: Mapping[str, str] = None) -> Dict[str, str]:
+    """Return an environment with the stub ``mpirun`` first on the PATH and the stub ``ActiveSiteDesign`` importable."""
+    env = dict(os.environ if env is None else env)
+    env['PATH'] = f"{STUB_DIR.joinpath('bin')}{os.pathsep}{env.get('PATH', '')}"
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(STUB_DIR), env.get('PYTHONPATH')]))
+    if size:
+        env['ASITEDESIGN_STUB_POSES'] = str(size['nPoses'])
+        env['ASITEDESIGN_STUB_ATOMS'] = str(size['atoms'])
+        env['ASITEDESIGN_STUB_FRAMES'] = str(size['frames'])
+    return env
+
+
+@contextlib.contextmanager
+def patched_environ(env: Mapping[str, str]):
+    previous = dict(os.environ)
+    os.environ.clear()
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        os.environ.clear()
+        os.environ.update(previous)
+
+
+def generate_tree(workdir: Path, size: Mapping[str, Any], name: str = 'bench_job') -> Path:
+    """Run the stub ``ActiveSiteDesign`` in ``workdir`` and return the sandbox holding its output tree."""
+    sandbox = workdir.joinpath('sandbox')
+    sandbox.mkdir(parents=True, exist_ok=True)
+    config = com.read_yaml(str(DATA_DIR.joinpath('DesignCatalyticSite.yaml')))
+    config.update({'Name': str(sandbox.joinpath(name)), 'PDB': str(DATA_DIR.joinpath('Input_file.pdb')),
+                   'nIterations': size['nIterations'], 'nPoses': size['nPoses'], 'WriteALL': bool(size['frames'])})
+    yaml_path = sandbox.joinpath('input.yaml')
+    with open(yaml_path, 'w') as yaml_file:
+        yaml.dump(config, yaml_file)
+    with open(sandbox.joinpath('output.out'), 'w') as log:
+        subprocess.run(['mpirun', '-n', str(size['nPoses'] + 1), sys.executable, '-m', 'ActiveSiteDesign', str(yaml_path)],
+                       cwd=str(sandbox), env=stub_env(size), stdout=log, check=True)
+    return sandbox
+
+
+def timed(function: Callable[[], Any], setup: Callable[[], Any] = None, repeat: int = 3) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return {'median': statistics.median(times), 'min': min(times), 'repeat': repeat}
+
+
+def bench_staging(workdir: Path, repeat: int) -> Dict[str, float]:
+    unique_dir = workdir.joinpath('staging')
+    inputs = [DATA_DIR.joinpath('Input_file.pdb'), DATA_DIR.joinpath('DesignCatalyticSite.yaml')]
+    params = sorted(DATA_DIR.joinpath('params').glob('*.params'))
+
+    def setup():
+        shutil.rmtree(unique_dir, ignore_errors=True)
+        unique_dir.mkdir()
+
+    def stage():
+        for path in inputs:
+            shutil.copy2(path, unique_dir)
+        for path in params:
+            com.link_or_copy(str(path), str(unique_dir))
+
+    return timed(stage, setup, repeat)
+
+
+def bench_yaml(workdir: Path, repeat: int) -> Dict[str, float]:
+    workflow_dict = {'simulation_type': 'CatalyticSite', 'PDB': '/data/Input_file.pdb', 'ParameterFiles': ['/data/LIG.fa.params'],
+                     'nIterations': 2, 'nPoses': 2, 'nSteps': 1, 'Time': 1}
+    return timed(lambda: com.create_yaml(output_yaml_path=str(workdir.joinpath('input.yaml')), workflow_dict=workflow_dict,
+                                         input_yaml_path=str(DATA_DIR.joinpath('DesignCatalyticSite.yaml')),
+                                         preset_dict=com.yaml_preset('CatalyticSite'), unique_dir='/data'),
+                 repeat=repeat)
+
+
+def bench_archive_and_cleanup(workdir: Path, size: Mapping[str, Any], repeat: int) -> Dict[str, Dict[str, float]]:
+    source = generate_tree(workdir.joinpath('source'), size)
+    sandbox = workdir.joinpath('archive', source.name)
+    zip_path = workdir.joinpath('output.zip')
+
+    def setup():
+        shutil.rmtree(sandbox.parent, ignore_errors=True)
+        shutil.copytree(source, sandbox)
+        if zip_path.exists():
+            zip_path.unlink()
+
+    def cleanup():
+        shutil.rmtree(sandbox)
+
+    archive = timed(lambda: com.zip_list(str(zip_path), [str(sandbox)]), setup, repeat)
+    archive['output_bytes'] = zip_path.stat().st_size
+    return {'archive': archive, 'cleanup': timed(cleanup, setup, repeat)}
+
+
+def bench_end_to_end(workdir: Path, size: Mapping[str, Any], repeat: int) -> Dict[str, Dict[str, float]]:
+    """Time whole launches with the stub, and the median wall time of every phase of their profiling reports."""
+    from biobb_asitedesign.asitedesign.asitedesign import asitedesign
+    phases: Dict[str, List[float]] = {}
+    runs = workdir.joinpath('end_to_end')
+
+    input_yaml = DATA_DIR.joinpath('DesignCatalyticSite.yaml')
+    final_pose_dir = f"{com.read_yaml(str(input_yaml))['Name']}_final_pose"
+
+    def launch():
+        output_path = runs.joinpath('output.zip')
+        return_code = asitedesign(input_pdb=str(DATA_DIR.joinpath('Input_file.pdb')),
+                                  input_yaml=str(input_yaml),
+                                  params_zip=str(DATA_DIR.joinpath('params', 'params.zip')),
+                                  output_path=str(output_path),
+                                  properties={'cpus': size['nPoses'] + 1, 'nIterations': size['nIterations'],
+                                              'nPoses': size['nPoses'], 'container_path': '', 'params_cache': False,
+                                              'profile': True})
+        # A failed launch is fast, its time must not be reported as the latency of the wrapper
+        check_end_to_end(return_code, output_path, final_pose_dir, size['nPoses'])
+        report = json.loads(runs.joinpath('output_profile.json').read_text())
+        for phase in report['phases']:
+            phases.setdefault(phase['phase'], []).append(phase['wall'])
+
+    def setup():
+        shutil.rmtree(runs, ignore_errors=True)
+        runs.mkdir(parents=True)
+        os.chdir(runs)
+
+    cwd = os.getcwd()
+    try:
+        with patched_environ(stub_env(size)):
+            results = {'end_to_end': timed(launch, setup, repeat)}
+    finally:
+        os.chdir(cwd)
+    for phase, times in phases.items():
+        results[f"end_to_end.{phase}"] = {'median': statistics.median(times), 'min': min(times), 'repeat': len(times)}
+    return results
+
+
+def check_end_to_end(return_code: int, output_path: Path, final_pose_dir: str, n_poses: int) -> None:
+    """Raise RuntimeError unless the launch succeeded and its output zip has the log and the final poses."""
+    if return_code != 0 or not zipfile.is_zipfile(str(output_path)):
+        raise RuntimeError(f"End to end launch failed with return code {return_code}, see {output_path.parent}")
+    with zipfile.ZipFile(str(output_path)) as zip_file:
+        members = [PurePosixPath(name) for name in zip_file.namelist()]
+    final_poses = [member for member in members if member.parent.name == final_pose_dir and member.suffix == '.pdb']
+    if 'output.out' not in {member.name for member in members} or len(final_poses) != n_poses:
+        raise RuntimeError(f"End to end output {output_path} has {len(final_poses)} of {n_poses} final poses "
+                           f"in {final_pose_dir} or misses output.out")
+
+
+def run_suite(size_name: str, repeat: int = 3, end_to_end: bool = True, workdir: str = None) -> Dict[str, Any]:
+    """Run every benchmark for the output tree size ``size_name`` and return the history record."""
+    size = SIZES[size_name]
+    with tempfile.TemporaryDirectory(prefix='asitedesign_bench_', dir=workdir) as tmp:
+        tmp_path = Path(tmp)
+        results: Dict[str, Dict[str, float]] = {'staging': bench_staging(tmp_path, repeat),
+                                                'yaml': bench_yaml(tmp_path, repeat)}
+        results.update(bench_archive_and_cleanup(tmp_path, size, repeat))
+        skipped = []
+        if end_to_end:
+            try:
+                results.update(bench_end_to_end(tmp_path, size, repeat))
+            except ImportError as error:
+                skipped.append(f"end_to_end: {error}")
+    return {'timestamp': time.time(), 'commit': git_commit(), 'host': platform.node(), 'python': platform.python_version(),
+            'size': size_name, 'results': results, 'skipped': skipped}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=str(BENCHMARK_DIR), capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_history(history_path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(history_path):
+        return []
+    with open(history_path) as history_file:
+        return [json.loads(line) for line in history_file if line.strip()]
+
+
+def append_history(history_path: str, record: Mapping[str, Any]) -> None:
+    Path(history_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(history_path, 'a') as history_file:
+        history_file.write(json.dumps(record) + '\n')
+
+
+def find_regressions(record: Mapping[str, Any], history: typing.Iterable[Mapping[str, Any]], window: int = 5,
+                     tolerance: float = 0.25, min_delta: float = 0.01) -> List[str]:
+    """Compare the medians of ``record`` with the median of the last ``window`` runs of the same host and size.
+
+    A benchmark regresses when it is more than ``tolerance`` (relative) and ``min_delta`` seconds
+    slower than that baseline; the absolute floor keeps sub-millisecond timings from flapping.
+    """
+    previous = [run for run in history if run['host'] == record['host'] and run['size'] == record['size']][-window:]
+    regressions = []
+    for name, result in record['results'].items():
+        baseline_runs = [run['results'][name]['median'] for run in previous if name in run['results']]
+        if not baseline_runs:
+            continue
+        baseline = statistics.median(baseline_runs)
+        if result['median'] > baseline * (1 + tolerance) and result['median'] - baseline > min_delta:
+            regressions.append(f"{name}: {result['median']:.4f}s vs baseline {baseline:.4f}s "
+                               f"(+{(result['median'] / baseline - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark of the wrapper overhead of biobb_asitedesign.')
+    parser.add_argument('--size', default='small', choices=sorted(SIZES), help='Size of the synthetic output tree.')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions of every benchmark, the median is reported.')
+    parser.add_argument('--history', default=os.path.join(com.default_cache_path('benchmarks'), 'history.jsonl'),
+                        help='JSON lines file with the results of the previous runs.')
+    parser.add_argument('--check', action='store_true', help='Exit with 1 if a benchmark regressed against the history.')
+    parser.add_argument('--window', type=int, default=5, help='Previous runs used as baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Relative slowdown allowed.')
+    parser.add_argument('--no-record', action='store_true', help='Do not append this run to the history.')
+    parser.add_argument('--no-end-to-end', action='store_true', help='Skip the whole launch benchmark.')
+    args = parser.parse_args()
+
+    record = run_suite(args.size, repeat=args.repeat, end_to_end=not args.no_end_to_end)
+    for name, result in record['results'].items():
+        print(f"{name:32s} median {result['median']:.4f}s  min {result['min']:.4f}s")
+    for skipped in record['skipped']:
+        print(f"skipped {skipped}")
+
+    regressions = find_regressions(record, read_history(args.history), args.window, args.tolerance) if args.check else []
+    if not args.no_record:
+        append_history(args.history, record)
+    if regressions:
+        print("Regressions:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+""" Offline stand-in for ``python -m ActiveSiteDesign <input.yaml>``
+
+Reads the AsiteDesign YAML and writes a synthetic output tree with the layout of the real
+program: ``<Name>_output/epoch_<n>`` with the spawned poses of every epoch (and, with
+``WriteALL``, one multi-model trajectory per rank), ``<Name>_final_pose`` with ``nPoses`` poses,
+and ``Rank/Epoch/Step/Energy`` progress lines on stdout.
+
+Poses are copies of the input PDB (or of a synthetic chain when it can not be read) with
+jittered coordinates, random amino acids at the ``DesignResidues`` and a Rosetta pose energies
+table. The size of the tree is configured with environment variables:
+
+    * ASITEDESIGN_STUB_POSES: spawned poses per epoch (default: nPoses of the YAML).
+    * ASITEDESIGN_STUB_ATOMS: atoms per pose (default: all the atoms of the input PDB).
+    * ASITEDESIGN_STUB_FRAMES: frames per rank trajectory when WriteALL is set (default: nSteps).
+    * ASITEDESIGN_STUB_SLEEP: seconds slept per step, to emulate a running job (default: 0).
+    * ASITEDESIGN_STUB_SEED: random seed when the YAML has no Seed (default: 0).
+    * ASITEDESIGN_STUB_EXIT: exit code (default: 0).
+
+It only depends on the standard library and PyYAML.
+"""
+import os
+from pathlib import Path
+import random
+import sys
+import time
+from typing import List
+
+import yaml
+
+AMINO_ACIDS = ['ALA', 'ARG', 'ASN', 'ASP', 'CYS', 'GLN', 'GLU', 'GLY', 'HIS', 'ILE',
+               'LEU', 'LYS', 'MET', 'PHE', 'PRO', 'SER', 'THR', 'TRP', 'TYR', 'VAL']
+
+
+def template_atoms(pdb_path: str, n_atoms: int = None) -> List[str]:
+    """Return ``n_atoms`` ATOM/HETATM lines of ``pdb_path``, repeated or synthesized when needed."""
+    lines: List[str] = []
+    try:
+        with open(pdb_path) as pdb_file:
+            lines = [line.rstrip('\n') for line in pdb_file if line.startswith(('ATOM  ', 'HETATM'))]
+    except (OSError, TypeError):
+        pass
+    if not lines:
+        lines = [f"ATOM  {i + 1:5d}  CA  ALA A{i // 5 + 1:4d}    {i * 0.5:8.3f}{i * 0.25:8.3f}{0.0:8.3f}  1.00  0.00           C"
+                 for i in range(n_atoms or 1000)]
+    if n_atoms:
+        lines = (lines * (n_atoms // len(lines) + 1))[:n_atoms]
+    return lines
+
+
+def write_pose(path: Path, atoms: List[str], design: set, rng: random.Random, energy: float, models: int = 0) -> None:
+    mutations = {key: rng.choice(AMINO_ACIDS) for key in design}
+    with open(path, 'w') as pdb_file:
+        pdb_file.write(f"REMARK FullAtom {energy:.3f}\n")
+        pdb_file.write(f"REMARK FullAtomWithConstraints {energy + rng.uniform(0, 5):.3f}\n")
+        pdb_file.write(f"REMARK OnlyConstraints {rng.uniform(0, 5):.3f}\n")
+        for model in range(max(models, 1)):
+            if models:
+                pdb_file.write(f"MODEL     {model + 1:4d}\n")
+            for line in atoms:
+                key = f"{line[22:26].strip()}-{line[21]}"
+                resname = mutations.get(key, line[17:20])
+                x, y, z = (float(line[30 + 8 * i:38 + 8 * i]) + rng.gauss(0, 0.3) for i in range(3))
+                pdb_file.write(f"{line[:17]}{resname}{line[20:30]}{x:8.3f}{y:8.3f}{z:8.3f}{line[54:]}\n")
+            if models:
+                pdb_file.write("ENDMDL\n")
+        pdb_file.write(f"#BEGIN_POSE_ENERGIES_TABLE {path.name}\n"
+                       f"label fa_atr fa_rep total\nweights 1 0.55 NA\n"
+                       f"pose {energy - 10:.3f} 10.000 {energy:.3f}\n"
+                       f"#END_POSE_ENERGIES_TABLE {path.name}\nEND\n")
+
+
+def run(yaml_path: str) -> int:
+    with open(yaml_path) as yaml_file:
+        config = yaml.safe_load(yaml_file)
+    env = os.environ
+    rng = random.Random(int(config.get('Seed', env.get('ASITEDESIGN_STUB_SEED', 0))))
+    n_iterations = int(config.get('nIterations') or 1)
+    n_poses = int(config.get('nPoses') or 1)
+    n_spawned = int(env.get('ASITEDESIGN_STUB_POSES', n_poses))
+    n_steps = int(config.get('nSteps') or 1)
+    frames = int(env.get('ASITEDESIGN_STUB_FRAMES', n_steps)) if config.get('WriteALL') else 0
+    sleep = float(env.get('ASITEDESIGN_STUB_SLEEP', 0))
+    atoms = template_atoms(config.get('PDB'), int(env['ASITEDESIGN_STUB_ATOMS']) if env.get('ASITEDESIGN_STUB_ATOMS') else None)
+    design = {str(key).strip() for key in (config.get('DesignResidues') or {})}
+
+    name = str(config.get('Name', 'job'))
+    output = Path(f"{name}_output")
+    best = 0.0
+    for epoch in range(n_iterations):
+        epoch_dir = output.joinpath(f"epoch_{epoch}")
+        epoch_dir.mkdir(parents=True, exist_ok=True)
+        for rank in range(1, n_spawned + 1):
+            for step in range(1, n_steps + 1):
+                energy = best + rng.uniform(-5, 2)
+                best = min(best, energy)
+                print(f"Rank {rank} Epoch {epoch} Step {step} Energy: {energy:.3f}", flush=True)
+                if sleep:
+                    time.sleep(sleep)
+            write_pose(epoch_dir.joinpath(f"pose_{rank}.pdb"), atoms, design, rng, best + rng.uniform(0, 3))
+            if frames:
+                write_pose(epoch_dir.joinpath(f"trajectory_{rank}.pdb"), atoms, design, rng, best, models=frames)
+
+    final = Path(f"{name}_final_pose")
+    final.mkdir(parents=True, exist_ok=True)
+    for rank in range(1, n_poses + 1):
+        write_pose(final.joinpath(f"final_pose_{rank}.pdb"), atoms, design, rng, best + rng.uniform(0, 3))
+    print(f"Finished {n_iterations} epochs, best energy {best:.3f}", flush=True)
+    return int(env.get('ASITEDESIGN_STUB_EXIT', 0))
+
+
+def main() -> None:
+    if len(sys.argv) < 2:
+        sys.exit("usage: python -m ActiveSiteDesign <input.yaml>")
+    sys.exit(run(sys.argv[1]))
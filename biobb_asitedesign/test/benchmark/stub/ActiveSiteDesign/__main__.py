@@ -0,0 +1,3 @@
+from ActiveSiteDesign import main
+
+main()
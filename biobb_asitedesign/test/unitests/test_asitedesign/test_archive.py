@@ -0,0 +1,57 @@
+import hashlib
+import os
+import zipfile
+
+from biobb_asitedesign.asitedesign.archive import MANIFEST_NAME, read_manifest, write_archive
+
+
+def make_tree(root):
+    sandbox = root / 'sandbox'
+    (sandbox / 'job_output' / '0').mkdir(parents=True)
+    (sandbox / 'job_final_pose').mkdir()
+    (sandbox / 'empty').mkdir()
+    (sandbox / 'output.out').write_text('log\n')
+    for i in range(12):
+        (sandbox / 'job_output' / '0' / f'pose_{i}.pdb').write_bytes(os.urandom(64) + b'ATOM' * 50000)
+    (sandbox / 'job_final_pose' / 'final_0.pdb').write_text('ATOM\n' * 1000)
+    return sandbox
+
+
+class TestArchive:
+    def test_parallel_deflate(self, tmp_path):
+        sandbox = make_tree(tmp_path)
+        zip_file = str(tmp_path / 'out.zip')
+        manifest = write_archive(zip_file, [str(sandbox)], compress_level=6, workers=4)
+
+        with zipfile.ZipFile(zip_file) as zip_f:
+            assert zip_f.testzip() is None
+            names = zip_f.namelist()
+            assert len(names) == len(set(names))
+            assert 'sandbox/empty/' in names
+            assert 'sandbox/job_output/0/pose_3.pdb' in names
+            info = zip_f.getinfo('sandbox/job_output/0/pose_3.pdb')
+            assert info.compress_type == zipfile.ZIP_DEFLATED
+            assert info.compress_size < info.file_size
+            data = zip_f.read('sandbox/job_output/0/pose_3.pdb')
+        assert data == (sandbox / 'job_output' / '0' / 'pose_3.pdb').read_bytes()
+
+        entries = {e['name']: e for e in manifest}
+        assert len(entries) == 14
+        assert entries['sandbox/job_output/0/pose_3.pdb']['sha256'] == hashlib.sha256(data).hexdigest()
+        assert read_manifest(zip_file) == manifest
+
+    def test_stored_and_duplicates(self, tmp_path):
+        sandbox = make_tree(tmp_path)
+        other = tmp_path / 'other'
+        other.mkdir()
+        (other / 'output.out').write_text('other log\n')
+        zip_file = str(tmp_path / 'out.zip')
+        file_list = [str(sandbox / 'output.out'), str(sandbox / 'output.out'), str(other / 'output.out')]
+        write_archive(zip_file, file_list, compress_level=0, workers=2)
+
+        with zipfile.ZipFile(zip_file) as zip_f:
+            names = sorted(n for n in zip_f.namelist() if n != MANIFEST_NAME)
+            assert all(i.compress_type == zipfile.ZIP_STORED for i in zip_f.infolist() if i.filename != MANIFEST_NAME)
+            assert names == ['file_1_output.out', 'output.out']
+            assert zip_f.read('output.out') == b'other log\n'
+            assert zip_f.read('file_1_output.out') == b'log\n'
@@ -0,0 +1,73 @@
+import os
+import stat
+import zipfile
+
+import pytest
+
+from biobb_asitedesign.adapters.pycompss.asitedesign import task_variants
+from biobb_asitedesign.adapters.pycompss.asitedesign.task_variants import task_cpus
+
+DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'asitedesign')
+
+STUB_MPIRUN = """#!/bin/sh
+# Stand-in for "mpirun -n N python -m ActiveSiteDesign input.yaml": records its arguments
+echo "stub mpirun $@"
+mkdir -p stub_final_pose
+echo "ATOM" > stub_final_pose/pose_0.pdb
+"""
+
+
+class TestAsitedesignPc:
+    def test_task_cpus(self):
+        assert task_cpus({'cpus': 1}) == 1
+        assert task_cpus({'cpus': 3}) == 4
+        with pytest.raises(ValueError):
+            task_cpus({'cpus': 100000})
+
+    def test_task_variants(self, tmp_path):
+        assert task_variants.CPUS_VARIANTS == sorted(set(task_variants.CPUS_VARIANTS))
+        assert task_variants.task_name(4) == 'asitedesign_pc_4cu'
+        assert task_variants.task_name(4, 'dir') == 'asitedesign_pc_dir_4cu'
+        directions = task_variants.PARAMETER_DIRECTIONS
+        assert set(directions) == {'zip', 'dir'}
+        for kind in directions:
+            assert list(directions[kind]) == ['input_pdb', 'input_yaml', 'params_zip', 'output_path']
+            assert directions[kind]['output_path'] == 'FILE_OUT'
+        assert directions['zip']['params_zip'] == 'FILE_IN' and directions['dir']['params_zip'] == 'DIRECTORY_IN'
+        assert task_variants.params_kind(os.path.join(DATA, 'params', 'params.zip')) == 'zip'
+        assert task_variants.params_kind(str(tmp_path)) == 'dir'
+
+    def test_registered_tasks(self):
+        pytest.importorskip('pycompss')
+        pytest.importorskip('biobb_common')
+        from biobb_asitedesign.adapters.pycompss.asitedesign import asitedesign_pc
+
+        assert set(asitedesign_pc.TASKS) == {(cpus, kind) for cpus in task_variants.CPUS_VARIANTS
+                                             for kind in task_variants.PARAMETER_DIRECTIONS}
+        for cpus, kind in asitedesign_pc.TASKS:
+            assert getattr(asitedesign_pc, task_variants.task_name(cpus, kind)) is asitedesign_pc.TASKS[(cpus, kind)]
+
+    def test_local_runtime(self, tmp_path, monkeypatch):
+        pytest.importorskip('pycompss')
+        pytest.importorskip('biobb_common')
+        from biobb_asitedesign.adapters.pycompss.asitedesign.asitedesign_pc import asitedesign_pc
+
+        bin_dir = tmp_path / 'bin'
+        bin_dir.mkdir()
+        mpirun = bin_dir / 'mpirun'
+        mpirun.write_text(STUB_MPIRUN)
+        mpirun.chmod(mpirun.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+        monkeypatch.chdir(tmp_path)
+
+        output_path = str(tmp_path / 'output.zip')
+        asitedesign_pc(input_pdb=os.path.join(DATA, 'Input_file.pdb'),
+                       input_yaml=os.path.join(DATA, 'DesignCatalyticSite.yaml'),
+                       params_zip=os.path.join(DATA, 'params', 'params.zip'),
+                       output_path=output_path,
+                       properties={'cpus': 2, 'container_path': '', 'params_cache': False})
+
+        with zipfile.ZipFile(output_path) as zip_f:
+            assert any(name.endswith('/input.yaml') for name in zip_f.namelist())
+            assert any(name.endswith('/LIG.fa.params') for name in zip_f.namelist())
+        assert '-n 2' in (tmp_path / 'output.out').read_text()
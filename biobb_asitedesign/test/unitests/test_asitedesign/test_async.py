@@ -0,0 +1,174 @@
+import asyncio
+import os
+from pathlib import Path
+import sys
+import time
+
+import pytest
+import yaml
+
+from biobb_asitedesign.asitedesign import aio
+from biobb_asitedesign.test.benchmark.run_benchmarks import patched_environ, stub_env
+
+DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'asitedesign')
+
+
+def alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            return stat.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except OSError:
+        return False
+
+
+def processes_using(path):
+    """Return the live processes with ``path`` in their command line."""
+    pids = []
+    for cmdline in Path('/proc').glob('[0-9]*/cmdline'):
+        try:
+            if str(path) in cmdline.read_bytes().replace(b'\0', b' ').decode(errors='replace'):
+                pids.append(int(cmdline.parent.name))
+        except (OSError, ValueError):
+            continue
+    return [pid for pid in pids if alive(pid)]
+
+
+def slow_stub_env():
+    env = stub_env({'nPoses': 2, 'atoms': 20, 'frames': 0})
+    env['ASITEDESIGN_STUB_SLEEP'] = '0.2'
+    return env
+
+
+def job_arguments(tmp_path, name):
+    return dict(input_pdb=os.path.join(DATA, 'Input_file.pdb'), input_yaml=os.path.join(DATA, 'DesignCatalyticSite.yaml'),
+                params_zip=os.path.join(DATA, 'params', 'params.zip'), output_path=str(tmp_path / f"{name}.zip"),
+                properties={'cpus': 3, 'nPoses': 2, 'nIterations': 500, 'container_path': '', 'params_cache': False,
+                            'chdir_sandbox': True, 'sandbox_path': str(tmp_path / 'sandboxes')})
+
+
+class TestAsync:
+    def test_run_shell_streams_output(self, tmp_path):
+        (tmp_path / 'input.yaml').write_text(yaml.dump({'Name': 'job', 'nIterations': 2, 'nPoses': 2, 'nSteps': 1}))
+        lines = []
+        result = asyncio.run(aio.run_shell(
+            f"mpirun -n 3 {sys.executable} -m ActiveSiteDesign input.yaml > output.out; echo done >&2",
+            cwd=str(tmp_path), env=stub_env({'nPoses': 2, 'atoms': 10, 'frames': 0}), on_output=lines.append,
+            log_paths=[str(tmp_path / 'output.out')], poll_interval=0.05))
+        assert result.return_code == 0 and result.stderr == 'done'
+        assert 'done' in lines
+        assert set((tmp_path / 'output.out').read_text().splitlines()) <= set(lines)
+        assert (tmp_path / 'job_final_pose').is_dir()
+
+    def test_timeout_kills_process_group(self, tmp_path):
+        pid_file = tmp_path / 'child.pid'
+
+        async def main():
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(aio.run_shell(f"sleep 60 & echo $! > {pid_file}; wait", grace=1), 0.5)
+
+        started = time.time()
+        asyncio.run(main())
+        assert time.time() - started < 5
+        deadline = time.time() + 5
+        while alive(int(pid_file.read_text())) and time.time() < deadline:
+            time.sleep(0.05)
+        assert not alive(int(pid_file.read_text()))
+
+    def test_sigterm_ignored_until_sigkill(self, tmp_path):
+        async def main():
+            task = asyncio.ensure_future(aio.run_shell("trap '' TERM; sleep 60", grace=0.3))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        started = time.time()
+        asyncio.run(main())
+        assert time.time() - started < 5
+
+    def test_cpu_limiter(self):
+        async def main():
+            limiter = aio.CpuLimiter(max_cpus=8, max_jobs=3)
+            peak = {'cpus': 0, 'jobs': 0}
+            order = []
+
+            async def job(name, cpus):
+                async with limiter.slot(cpus):
+                    order.append(name)
+                    peak['cpus'] = max(peak['cpus'], limiter.used_cpus)
+                    peak['jobs'] = max(peak['jobs'], limiter.running)
+                    await asyncio.sleep(0.02)
+
+            await asyncio.gather(*(job(index, cpus) for index, cpus in enumerate([4, 4, 2, 1, 1, 6, 2])))
+            with pytest.raises(ValueError):
+                async with limiter.slot(9):
+                    pass
+            return peak, order, limiter.used_cpus
+
+        peak, order, used = asyncio.run(main())
+        assert peak['cpus'] <= 8 and peak['jobs'] <= 3
+        assert order == list(range(7)) and used == 0
+
+    def test_own_process_group(self):
+        groups = []
+        result = asyncio.run(aio.run_shell('sleep 0.1', on_start=lambda process: groups.append((process.pid, os.getpgid(process.pid)))))
+        assert result.return_code == 0
+        assert groups[0][0] == groups[0][1] != os.getpgid(0)
+
+
+class TestAsyncJobs:
+    """Cancellation and timeouts of whole jobs run with the stub AsiteDesign."""
+
+    def test_cancel_job(self, tmp_path):
+        pytest.importorskip('biobb_common')
+        from biobb_asitedesign.asitedesign.asitedesign import Asitedesign
+        from biobb_asitedesign.asitedesign.asitedesign_async import run_async
+
+        (tmp_path / 'sandboxes').mkdir()
+        lines = []
+
+        async def main():
+            job = Asitedesign(**job_arguments(tmp_path, 'cancelled'))
+            task = asyncio.ensure_future(run_async(job, on_output=lines.append, grace=1, poll_interval=0.05))
+            deadline = time.time() + 30
+            while not (job.process_group and lines) and time.time() < deadline:
+                await asyncio.sleep(0.05)
+            running = (job.process_group, job.stage_io_dict['unique_dir'])
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return running
+
+        with patched_environ(slow_stub_env()):
+            process_group, sandbox = asyncio.run(main())
+        assert process_group and lines
+        with pytest.raises(ProcessLookupError):
+            os.killpg(process_group, 0)
+        assert not os.path.exists(sandbox) and not processes_using(sandbox)
+        assert not (tmp_path / 'cancelled.zip').exists()
+
+    def test_timeout_cleans_up(self, tmp_path):
+        pytest.importorskip('biobb_common')
+        from biobb_asitedesign.asitedesign.asitedesign_async import AsyncAsitedesignRunner, asitedesign_async
+
+        (tmp_path / 'sandboxes').mkdir()
+
+        async def main():
+            with pytest.raises(asyncio.TimeoutError):
+                await asitedesign_async(**job_arguments(tmp_path, 'single'), timeout=2, grace=1)
+            async with AsyncAsitedesignRunner(max_jobs=2, max_cpus=6, timeout=2, grace=1) as runner:
+                for name in ('first', 'second'):
+                    arguments = job_arguments(tmp_path, name)
+                    runner.submit(arguments.pop('input_pdb'), arguments.pop('input_yaml'), arguments.pop('params_zip'),
+                                  arguments.pop('output_path'), **arguments)
+                return await runner.wait()
+
+        started = time.time()
+        with patched_environ(slow_stub_env()):
+            results = asyncio.run(main())
+        assert time.time() - started < 60
+        assert set(results) == {'first', 'second'}
+        assert all(isinstance(result, asyncio.TimeoutError) for result in results.values())
+        assert list((tmp_path / 'sandboxes').iterdir()) == []
+        assert not processes_using(tmp_path / 'sandboxes')
+        assert not list(tmp_path.glob('*.zip'))
@@ -0,0 +1,65 @@
+import subprocess
+import sys
+import time
+
+from biobb_asitedesign.asitedesign import batch
+
+
+class TestBatch:
+    def test_read_manifest(self, tmp_path):
+        manifest = tmp_path / 'manifest.yml'
+        manifest.write_text("""
+defaults:
+  input_yaml: DesignCatalyticSite.yaml
+  params_zip: params.zip
+  cpus: 2
+sweep:
+  input_pdb: [a.pdb, b.pdb]
+  DesignResidues: [{28-A: ZX}, {28-A: ZX, 29-A: ZX}]
+  simulation_type: [CatalyticSite, DirectEvolution]
+jobs:
+  - input_pdb: /abs/c.pdb
+    cpus: 4
+""")
+        jobs = batch.build_jobs(batch.read_manifest(str(manifest)))
+        assert len(jobs) == 9
+        assert jobs[0].files['input_pdb'] == str(tmp_path / 'a.pdb')
+        assert jobs[0].properties == {'cpus': 2, 'DesignResidues': {'28-A': 'ZX'}, 'simulation_type': 'CatalyticSite',
+                                      'mpi_bind_to': 'none'}
+        assert jobs[-1].files['input_pdb'] == '/abs/c.pdb' and jobs[-1].cpus == 4
+
+        # The manifest has precedence over job_properties, the defaults only fill what neither sets
+        shared = {'cpus': 6, 'mpi_bind_to': 'core', 'container_path': 'singularity'}
+        jobs = batch.build_jobs([{'input_pdb': 'a.pdb'}, {'input_pdb': 'b.pdb', 'cpus': 3, 'mpi_bind_to': 'socket'}],
+                                default_cpus=2, job_properties=shared)
+        assert jobs[0].cpus == 6 and jobs[0].properties == shared
+        assert jobs[1].cpus == 3 and jobs[1].properties == dict(shared, cpus=3, mpi_bind_to='socket')
+        assert batch.build_jobs([{}], default_cpus=2, job_properties={'nPoses': 2})[0].properties == \
+            {'nPoses': 2, 'cpus': 2, 'mpi_bind_to': 'none'}
+
+        csv_manifest = tmp_path / 'manifest.csv'
+        csv_manifest.write_text('input_pdb,cpus,DesignResidues\na.pdb,3,"{28-A: ZX, 29-A: ZX}"\n')
+        rows = batch.read_manifest(str(csv_manifest))
+        assert rows == [{'input_pdb': str(tmp_path / 'a.pdb'), 'cpus': 3, 'DesignResidues': {'28-A': 'ZX', '29-A': 'ZX'}}]
+
+    def test_run_jobs_respects_cores_and_retries(self, tmp_path):
+        jobs = [batch.BatchJob(job_id=f"job_{i}", files={}, properties={}, cpus=cpus)
+                for i, cpus in enumerate([3, 2, 2, 1, 8])]
+        in_use = []
+        attempts = {}
+
+        def launch(job):
+            attempts[job.job_id] = attempts.get(job.job_id, 0) + 1
+            in_use.append(sum(j.cpus for j in jobs if j.status == 'running'))
+            code = 1 if job.job_id == 'job_3' and attempts[job.job_id] == 1 else 0
+            return subprocess.Popen([sys.executable, '-c', f"import time, sys; time.sleep(0.2); sys.exit({code})"])
+
+        start = time.time()
+        batch.run_jobs(jobs, launch, max_cpus=4, max_retries=1, poll_interval=0.05)
+        assert max(in_use) <= 4
+        assert [job.status for job in jobs] == ['done', 'done', 'done', 'done', 'skipped']
+        assert jobs[3].attempts == 2
+        assert time.time() - start < 5
+
+        summary = batch.write_summary(jobs, str(tmp_path / 'summary.csv'))
+        assert open(summary).read().count('\n') == 6
@@ -0,0 +1,45 @@
+import pytest
+
+from biobb_asitedesign.asitedesign import outputs
+from biobb_asitedesign.asitedesign.archive import write_archive
+from biobb_asitedesign.test.benchmark.run_benchmarks import (SIZES, check_end_to_end, find_regressions, generate_tree,
+                                                             run_suite)
+
+
+def record(median, host='node', size='tiny'):
+    return {'host': host, 'size': size, 'results': {'archive': {'median': median}}}
+
+
+class TestBenchmark:
+    def test_stub_output_tree(self, tmp_path):
+        sandbox = generate_tree(tmp_path, dict(SIZES['tiny'], nIterations=2, frames=2))
+        assert [epoch for epoch, _ in outputs.completed_epochs(sandbox, 'bench_job')] == [0, 1]
+        final_poses = outputs.pose_files(outputs.final_pose_dir(sandbox, 'bench_job'))
+        assert len(final_poses) == 2
+        assert outputs.rank_poses(final_poses, 'FullAtom')[0][0] < 0
+        assert 'Rank 1 Epoch 0 Step 1 Energy:' in sandbox.joinpath('output.out').read_text()
+        trajectory = outputs.output_dir(sandbox, 'bench_job').joinpath('epoch_0', 'trajectory_1.pdb').read_text()
+        assert trajectory.count('ENDMDL') == 2 and trajectory.count('\nATOM') == 2 * SIZES['tiny']['atoms']
+
+    def test_suite(self, tmp_path):
+        run = run_suite('tiny', repeat=1, end_to_end=False, workdir=str(tmp_path))
+        assert set(run['results']) == {'staging', 'yaml', 'archive', 'cleanup'}
+        assert run['results']['archive']['output_bytes'] > 0
+
+    def test_check_end_to_end(self, tmp_path):
+        sandbox = generate_tree(tmp_path, SIZES['tiny'])
+        output_path = tmp_path / 'output.zip'
+        with pytest.raises(RuntimeError, match='return code 1'):
+            check_end_to_end(1, output_path, 'bench_job_final_pose', 2)
+        write_archive(str(output_path), [str(sandbox)])
+        check_end_to_end(0, output_path, 'bench_job_final_pose', 2)
+        with pytest.raises(RuntimeError, match='2 of 3 final poses'):
+            check_end_to_end(0, output_path, 'bench_job_final_pose', 3)
+
+    def test_regressions(self):
+        history = [record(1.0), record(1.1), record(0.9), record(5.0, host='other'), record(5.0, size='large')]
+        assert find_regressions(record(1.2), history) == []
+        assert find_regressions(record(1.5), history) == ['archive: 1.5000s vs baseline 1.0000s (+50%)']
+        # Below the absolute noise floor
+        assert find_regressions(record(0.002), [record(0.001)]) == []
+        assert find_regressions(record(1.5), []) == []
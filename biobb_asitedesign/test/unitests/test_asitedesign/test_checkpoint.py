@@ -0,0 +1,51 @@
+from biobb_asitedesign.asitedesign import outputs
+from biobb_asitedesign.asitedesign.checkpoint import CheckpointSyncer, EpochCheckpoint
+
+POSE = """REMARK FullAtom {score}
+ATOM      1  N   SER A   1     -52.613 119.576  -8.777  1.00  0.00           N
+#BEGIN_POSE_ENERGIES_TABLE pose.pdb
+label fa_atr fa_rep total
+weights 1 0.55 NA
+pose -10.0 2.5 {total}
+#END_POSE_ENERGIES_TABLE pose.pdb
+"""
+
+
+def write_epoch(root, epoch, scores):
+    folder = outputs.output_dir(root, 'job').joinpath(f"epoch_{epoch}")
+    folder.mkdir(parents=True)
+    for rank, score in enumerate(scores):
+        folder.joinpath(f"pose_{rank}.pdb").write_text(POSE.format(score=score, total=score + 100))
+
+
+class TestCheckpoint:
+    def test_scores(self):
+        scores = outputs.parse_scores(POSE.format(score=-3.5, total=96.5).splitlines())
+        assert scores == {'FullAtom': -3.5, 'fa_atr': -10.0, 'fa_rep': 2.5, 'total': 96.5}
+        assert outputs.pose_score(scores, 'FullAtom') == -3.5
+        assert outputs.pose_score(scores, 'OnlyConstraints') == 96.5
+
+    def test_sync_and_resume(self, tmp_path):
+        sandbox = tmp_path / 'sandbox'
+        write_epoch(sandbox, 0, [-1.0, -2.0])
+        write_epoch(sandbox, 1, [-5.0, -4.0])
+        checkpoint = EpochCheckpoint(str(tmp_path / 'ckpt'), 'digest')
+        syncer = CheckpointSyncer(checkpoint, str(sandbox), 'job', interval=0.01)
+        syncer.start()
+        # Epoch 1 is still running until epoch 2 is spawned
+        syncer.stop()
+        assert checkpoint.state['epochs'] == [0]
+        write_epoch(sandbox, 2, [-0.5])
+        assert CheckpointSyncer(checkpoint, str(sandbox), 'job').sync() == [1]
+
+        resumed = EpochCheckpoint(str(tmp_path / 'ckpt'), 'digest')
+        assert resumed.last_epoch == 1
+        score, seed = resumed.seed_poses('FullAtom')[0]
+        assert score == -5.0 and seed.name == 'pose_0.pdb'
+
+        # A later run segment continues the global epoch numbering
+        write_epoch(tmp_path / 'sandbox2', 0, [-6.0])
+        write_epoch(tmp_path / 'sandbox2', 1, [-7.0])
+        assert CheckpointSyncer(resumed, str(tmp_path / 'sandbox2'), 'job', epoch_offset=2).sync() == [2]
+
+        assert EpochCheckpoint(str(tmp_path / 'ckpt'), 'other inputs').last_epoch is None
@@ -0,0 +1,62 @@
+import csv
+
+import numpy as np
+
+from biobb_asitedesign.asitedesign import clustering
+
+YAML = {'DesignResidues': {'1-A': 'ZX', '2-A': 'ZX'}, 'Ligands': [{'1-L': {'RigidBody': True}}]}
+
+
+def write_pose(path, resnames, shift, score):
+    lines = [f"REMARK FullAtom {score}"]
+    serial = 1
+    for resnum, resname in enumerate(resnames, start=1):
+        for offset, name in enumerate(('N', 'CA', 'C', 'O', 'CB', 'OG')):
+            lines.append(f"ATOM  {serial:5d}  {name:<3} {resname} A{resnum:4d}    "
+                         f"{resnum * 4.0 + offset + shift:8.3f}{offset * 0.7:8.3f}{0.0:8.3f}  1.00  0.00")
+            serial += 1
+    for offset, name in enumerate(('C1', 'O1', 'H1')):
+        lines.append(f"HETATM{serial:5d}  {name:<3} LIG L   1    {offset + shift:8.3f}{5.0:8.3f}{1.0 + shift:8.3f}  1.00  0.00")
+        serial += 1
+    path.write_text('\n'.join(lines) + '\nEND\n')
+    return path
+
+
+class TestClustering:
+    def test_pairwise_rmsd(self):
+        rng = np.random.default_rng(0)
+        coords = rng.normal(50.0, 10.0, size=(7, 11, 3))
+        naive = np.array([[np.sqrt(((a - b) ** 2).sum(axis=1).mean()) for b in coords] for a in coords])
+        assert np.allclose(clustering.pairwise_rmsd(coords), naive, atol=1e-6)
+        assert np.allclose(clustering.pairwise_rmsd(coords[:2], coords[2:]), naive[:2, 2:], atol=1e-6)
+
+    def test_leader_clusters_with_cap(self):
+        rng = np.random.default_rng(1)
+        centers = rng.normal(0.0, 20.0, size=(3, 5, 3))
+        coords = np.concatenate([centers[i % 3] + rng.normal(0, 0.05, size=(1, 5, 3)) for i in range(30)])
+        assigned, distance = clustering.leader_clusters(coords, cutoff=0.5)
+        assert sorted(set(assigned.tolist())) == [0, 1, 2]
+        assert assigned.tolist() == [i % 3 for i in range(30)]
+        assert distance.max() < 0.5
+        capped, capped_distance = clustering.leader_clusters(coords, cutoff=0.5, max_matrix=4)
+        assert np.array_equal(capped, assigned) and np.allclose(capped_distance, distance)
+
+    def test_cluster_poses(self, tmp_path):
+        paths = [write_pose(tmp_path / 'a.pdb', ['HIS', 'SER'], 0.0, -10),
+                 write_pose(tmp_path / 'b.pdb', ['HIS', 'SER'], 2.0, -5),
+                 write_pose(tmp_path / 'c.pdb', ['SER', 'SER'], 0.1, -8),
+                 write_pose(tmp_path / 'd.pdb', ['ASP', 'SER'], 3.0, -7)]
+        members = clustering.cluster_poses(paths, YAML, cutoff=1.0, metric='FullAtom')
+        table = {member.pose: member for member in members}
+        assert [member.pose for member in members] == ['a.pdb', 'c.pdb', 'd.pdb', 'b.pdb']
+        assert table['b.pdb'].duplicate_of == 'a.pdb' and table['b.pdb'].sequence_hash == table['a.pdb'].sequence_hash
+        assert table['a.pdb'].sequence == 'HS'
+        assert (table['c.pdb'].cluster, table['c.pdb'].representative) == (1, 'a.pdb')
+        assert 0 < table['c.pdb'].rmsd_to_representative < 1.0
+        assert (table['d.pdb'].cluster, table['d.pdb'].representative) == (2, 'd.pdb')
+
+        written = clustering.write_clusters(members, tmp_path, str(tmp_path / 'clusters'))
+        assert [path.name for path in written] == ['cluster_001_a.pdb', 'cluster_002_d.pdb']
+        with open(tmp_path / 'clusters' / 'clusters.csv') as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        assert [row['cluster'] for row in rows] == ['1', '1', '2', '1']
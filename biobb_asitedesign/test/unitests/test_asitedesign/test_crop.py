@@ -0,0 +1,44 @@
+import json
+import os
+
+import numpy as np
+
+from biobb_asitedesign.asitedesign import common as com
+from biobb_asitedesign.asitedesign import crop
+from biobb_asitedesign.asitedesign.pdb_index import PDBIndex
+
+DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'asitedesign')
+
+
+class TestCrop:
+    def test_within_cutoff_matches_brute_force(self):
+        rng = np.random.default_rng(0)
+        coords = rng.uniform(-30, 30, size=(2000, 3))
+        query = rng.uniform(-10, 10, size=(40, 3))
+        distances = np.sqrt(((coords[:, None, :] - query[None, :, :]) ** 2).sum(axis=-1)).min(axis=1)
+        assert np.array_equal(crop.within_cutoff(coords, query, 6.5), distances <= 6.5)
+
+    def test_crop_structure(self, tmp_path):
+        pdb_path = os.path.join(DATA, 'Input_file.pdb')
+        index = PDBIndex.from_file(pdb_path)
+        yaml_dict = com.layer_yaml(os.path.join(DATA, 'DesignCatalyticSite.yaml'))
+        crop_map = crop.crop_structure(index, pdb_path, yaml_dict, 6.0, str(tmp_path / 'cropped.pdb'),
+                                       str(tmp_path / 'crop_map.json'))
+
+        cropped = PDBIndex.from_file(str(tmp_path / 'cropped.pdb'))
+        assert len(cropped.residues) == len(crop_map['residues']) < len(index.residues)
+        assert crop.core_residues(yaml_dict) <= set(cropped.residues)
+        assert json.load(open(tmp_path / 'crop_map.json'))['residues'][0]['pose'] == 1
+
+        # Renumber sequentially as a pose writer would, then map back
+        renumbered = tmp_path / 'renumbered.pdb'
+        with open(tmp_path / 'cropped.pdb') as in_f, open(renumbered, 'w') as out_f:
+            previous, number = None, 0
+            for line in in_f:
+                if line.startswith(('ATOM', 'HETATM')):
+                    if line[17:27] != previous:
+                        previous, number = line[17:27], number + 1
+                    line = f"{line[:21]}A{number:>4}{line[26:]}"
+                out_f.write(line)
+        crop.remap_pdb(str(renumbered), crop_map, str(tmp_path / 'remapped.pdb'))
+        assert open(tmp_path / 'remapped.pdb').read() == open(tmp_path / 'cropped.pdb').read()
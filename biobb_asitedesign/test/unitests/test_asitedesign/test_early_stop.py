@@ -0,0 +1,78 @@
+import subprocess
+import sys
+
+import yaml
+
+from biobb_asitedesign.asitedesign import early_stop, outputs
+from biobb_asitedesign.asitedesign.early_stop import ConvergenceMonitor, spawning_metric
+from biobb_asitedesign.test.benchmark.run_benchmarks import stub_env
+
+POSE = "REMARK FullAtom {full}\nREMARK FullAtomWithConstraints {constrained}\n"
+
+
+def write_epoch(root, epoch, scores, constrained=0.0):
+    folder = outputs.output_dir(root, 'job').joinpath(f"epoch_{epoch}")
+    folder.mkdir(parents=True)
+    for rank, score in enumerate(scores):
+        folder.joinpath(f"pose_{rank}.pdb").write_text(POSE.format(full=score, constrained=score + constrained))
+
+
+class TestEarlyStop:
+    def test_spawning_metric(self):
+        steps = ['0.5 FullAtomWithConstraints', '1.0 FullAtom']
+        assert [spawning_metric(epoch, 4, steps, 'Default') for epoch in range(4)] == \
+            ['FullAtomWithConstraints', 'FullAtomWithConstraints', 'FullAtom', 'FullAtom']
+        assert spawning_metric(0, 4, None, 'FullAtom') == 'FullAtom'
+
+    def test_convergence(self, tmp_path):
+        stops = []
+        monitor = ConvergenceMonitor(str(tmp_path), 'job', 10, stops.append, metric='FullAtom', threshold=1.0,
+                                     patience=2, min_epochs=3)
+        for epoch, scores in enumerate([[-10, -5], [-20, -15], [-20.5, -15.2], [-20.6, -15.5]]):
+            write_epoch(tmp_path, epoch, scores)
+        # The last epoch is still running
+        assert monitor.check() is None
+        assert [record['improvement'] for record in monitor.epochs] == [None, 10.0, 0.5]
+        write_epoch(tmp_path, 4, [-30])
+        assert monitor.check().startswith('converged')
+        assert monitor.report()['epochs'][-1]['improvement'] < 1.0
+
+    def test_metric_switch_and_budget(self, tmp_path):
+        monitor = ConvergenceMonitor(str(tmp_path), 'job', 4, print, spawning_steps=['0.5 FullAtomWithConstraints', '1.0 FullAtom'],
+                                     threshold=1.0, patience=1, min_epochs=1)
+        for epoch in range(4):
+            write_epoch(tmp_path, epoch, [-10], constrained=5.0)
+        assert monitor.check() is None
+        assert [record['metric'] for record in monitor.epochs] == ['FullAtomWithConstraints', 'FullAtomWithConstraints', 'FullAtom']
+        assert [record['best'] for record in monitor.epochs] == [-5.0, -5.0, -10.0]
+
+        budget = ConvergenceMonitor(str(tmp_path), 'job', 4, print, wall_budget=1e-6)
+        assert budget.check().startswith('wall-clock budget')
+
+    def test_stop_running_job(self, tmp_path):
+        (tmp_path / 'input.yaml').write_text(yaml.dump({'Name': 'job', 'nIterations': 500, 'nPoses': 2, 'nSteps': 2}))
+        env = stub_env({'nPoses': 2, 'atoms': 20, 'frames': 0})
+        env['ASITEDESIGN_STUB_SLEEP'] = '0.01'
+        # Started in its own process group, as Asitedesign.execute_command does
+        process = subprocess.Popen(f"{sys.executable} -m ActiveSiteDesign input.yaml > output.out", shell=True,
+                                   cwd=str(tmp_path), env=env, start_new_session=True)
+        bystander = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+        monitor = ConvergenceMonitor(str(tmp_path), 'job', 500,
+                                     lambda reason: early_stop.terminate_process_group(process.pid, grace=5),
+                                     metric='FullAtom', threshold=1e9, patience=1, min_epochs=2, interval=0.05)
+        monitor.start()
+        try:
+            assert process.wait(timeout=60) != 0
+            monitor.stop()
+            assert monitor.reason.startswith('converged')
+            # Other children of this process are not signalled
+            assert bystander.poll() is None
+        finally:
+            bystander.kill()
+            bystander.wait()
+
+        completed = outputs.completed_epochs(tmp_path, 'job')
+        assert 2 <= len(completed) < 499
+        final = early_stop.package_best_poses(str(tmp_path), 'job', 2, 'FullAtom')
+        assert len(final) == 2 and final[0].name.startswith('1_epoch')
+        assert early_stop.package_best_poses(str(tmp_path), 'job', 2, 'FullAtom') == []
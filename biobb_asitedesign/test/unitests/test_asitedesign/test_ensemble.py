@@ -0,0 +1,110 @@
+import csv
+import shutil
+import subprocess
+import sys
+import zipfile
+
+import pytest
+import yaml
+
+from biobb_asitedesign.asitedesign import ensemble, outputs, results_index
+from biobb_asitedesign.asitedesign.archive import write_archive
+from biobb_asitedesign.test.benchmark.run_benchmarks import stub_env
+
+DESIGN = {'2-A': 'ZX', '3-A': 'ZX', '5-A': 'ZX'}
+
+
+def run_replica(tmp_path, index, seed):
+    job_dir = tmp_path / f"replica_{index}"
+    sandbox = job_dir / 'sandbox'
+    sandbox.mkdir(parents=True)
+    (sandbox / 'input.yaml').write_text(yaml.dump({'Name': 'job', 'nIterations': 2, 'nPoses': 3, 'nSteps': 1,
+                                                   'Seed': seed, 'DesignResidues': DESIGN}))
+    subprocess.run(f"{sys.executable} -m ActiveSiteDesign input.yaml > output.out", shell=True, cwd=str(sandbox),
+                   env=stub_env({'nPoses': 3, 'atoms': 40, 'frames': 0}), check=True)
+    replica_zip = str(job_dir / f"replica_{index}.zip")
+    write_archive(replica_zip, [str(sandbox)])
+    return replica_zip
+
+
+class TestEnsemble:
+    def test_replica_setup(self):
+        assert ensemble.replica_cpus(10, 3) == [4, 3, 3]
+        assert ensemble.replica_cpus('auto', 2) == ['auto', 'auto']
+        with pytest.raises(ValueError):
+            ensemble.replica_cpus(5, 3)
+        assert ensemble.replica_seeds(7, 3) == [7, 8, 9]
+        assert len(set(ensemble.replica_seeds(None, 4))) == 4
+
+        properties = {'replicas': 3, 'cpus': 12, 'result_cache': True, 'results_index': True, 'telemetry_port': 9100,
+                      'checkpoint_path': '/data/job_checkpoint', 'profile_path': '/data/profile.json'}
+        replica = ensemble.replica_properties(properties, 1, 4, 8)
+        assert replica == {'cpus': 4, 'seed': 8, 'mpi_bind_to': 'none', 'checkpoint_path': '/data/job_checkpoint_replica1',
+                           'profile_path': '/data/profile_replica1.json'}
+
+    def test_absolute_paths(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        (tmp_path / 'images').mkdir()
+        (tmp_path / 'images' / 'asitedesign.sif').write_text('')
+        properties = {'container_path': 'bin/singularity', 'container_image': 'images/asitedesign.sif',
+                      'checkpoint_path': 'checkpoints/job', 'params_cache_path': '/cache', 'sandbox_path': 'work',
+                      'scratch_path': '$TMPDIR, scratch', 'nPoses': 3}
+        replica = ensemble.replica_properties(properties, 0, 2, 1)
+        assert replica['container_path'] == str(tmp_path / 'bin' / 'singularity')
+        assert replica['container_image'] == str(tmp_path / 'images' / 'asitedesign.sif')
+        assert replica['checkpoint_path'] == str(tmp_path / 'checkpoints' / 'job_replica0')
+        assert replica['sandbox_path'] == str(tmp_path / 'work')
+        assert replica['scratch_path'] == f"$TMPDIR,{tmp_path / 'scratch'}"
+        assert replica['params_cache_path'] == '/cache' and replica['nPoses'] == 3
+        # Commands and docker images are not paths
+        assert ensemble.absolute_paths({'container_path': 'docker', 'container_image': 'bsceapm/asitedesign:1.0'}) == \
+            {'container_path': 'docker', 'container_image': 'bsceapm/asitedesign:1.0'}
+
+    def test_merge_and_package(self, tmp_path):
+        replica_zips = {index: run_replica(tmp_path, index, seed) for index, seed in enumerate([3, 4])}
+        replica_poses = {}
+        for index, replica_zip in replica_zips.items():
+            poses_dir = tmp_path / f"poses_{index}"
+            poses_dir.mkdir()
+            replica_poses[index] = ensemble.extract_final_poses(replica_zip, str(poses_dir))
+        assert [len(poses) for poses in replica_poses.values()] == [3, 3]
+        # The same design found by both replicas, with a worse score in the second one
+        best = outputs.rank_poses(replica_poses[0], 'FullAtom')[0][1]
+        duplicate = tmp_path / 'poses_1' / 'duplicate.pdb'
+        shutil.copy2(best, duplicate)
+        with open(duplicate, 'a') as pdb_file:
+            pdb_file.write('REMARK FullAtom 1000.0\n')
+        replica_poses[1].append(duplicate)
+
+        keys = outputs.design_keys(DESIGN)
+        sandbox = tmp_path / 'ensemble'
+        final_dir = outputs.final_pose_dir(sandbox, 'job')
+        merged = ensemble.merge_final_poses(replica_poses, [3, 4], str(final_dir), keys, 'FullAtom')
+        sequences = [pose.sequence for pose in merged]
+        assert len(sequences) == len(set(sequences)) == len({outputs.mutant_sequence(path, keys)
+                                                             for paths in replica_poses.values() for path in paths})
+        assert [pose.rank for pose in merged] == list(range(1, len(merged) + 1))
+        assert all(a.score <= b.score for a, b in zip(merged, merged[1:]))
+        assert {pose.replica for pose in merged} == {0, 1}
+        assert 'duplicate.pdb' not in {pose.pose.split('_', 2)[2] for pose in merged}
+        assert sorted(path.name for path in final_dir.iterdir()) == sorted(pose.pose for pose in merged)
+
+        table = ensemble.write_table(merged, str(sandbox / 'ensemble.csv'))
+        with open(table) as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        assert rows[0]['rank'] == '1' and rows[0]['seed'] in ('3', '4')
+
+        zip_file = str(tmp_path / 'out.zip')
+        ensemble.package_ensemble(zip_file, str(sandbox), [str(final_dir), table], replica_zips)
+        with zipfile.ZipFile(zip_file) as zip_f:
+            assert zip_f.testzip() is None
+            names = zip_f.namelist()
+        assert 'ensemble/ensemble.csv' in names
+        assert f"ensemble/job_final_pose/{merged[0].pose}" in names
+        assert 'ensemble/replica_1/sandbox/job_final_pose/final_pose_1.pdb' in names
+
+        # Indexed once, from the merged final poses
+        records, _ = results_index.zip_records(zip_file, epochs=True)
+        finals = [record for record in records if record.kind == 'final']
+        assert sorted(record.member for record in finals) == sorted(f"ensemble/job_final_pose/{pose.pose}" for pose in merged)
+        assert any(record.kind == 'epoch' and record.member.startswith('ensemble/replica_0/') for record in records)
@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+
+import pytest
+import yaml
+
+from biobb_asitedesign.asitedesign import hosts, outputs
+from biobb_asitedesign.asitedesign.hosts import Node
+from biobb_asitedesign.test.benchmark.run_benchmarks import stub_env
+
+DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'asitedesign')
+
+
+class TestHosts:
+    def test_node_lists(self, tmp_path):
+        assert hosts.expand_hostlist('node[01-03,07],gpu-[1-2]-ib[0-1]') == \
+            ['node01', 'node02', 'node03', 'node07', 'gpu-1-ib0', 'gpu-1-ib1', 'gpu-2-ib0', 'gpu-2-ib1']
+        assert hosts.expand_tasks('16(x2),8') == [16, 16, 8]
+
+        slurm = {'SLURM_JOB_NODELIST': 'cn[1-3]', 'SLURM_JOB_CPUS_PER_NODE': '16(x2),8'}
+        assert hosts.discover_nodes('auto', slurm) == [Node('cn1', 16), Node('cn2', 16), Node('cn3', 8)]
+
+        node_file = tmp_path / 'nodefile'
+        node_file.write_text('cn1\ncn1\ncn2\n')
+        assert hosts.discover_nodes('auto', {'PBS_NODEFILE': str(node_file)}) == [Node('cn1', 2), Node('cn2', 1)]
+        assert hosts.discover_nodes(str(node_file), slurm) == [Node('cn1', 2), Node('cn2', 1)]
+        assert hosts.discover_nodes('a:4,b[1-2]', {}) == [Node('a', 4), Node('b1', 1), Node('b2', 1)]
+        assert hosts.discover_nodes('auto', {}) == []
+
+    def test_distribute(self, tmp_path):
+        assert hosts.distribute_ranks([Node('a', 16), Node('b', 16)], 9) == [Node('a', 5), Node('b', 4)]
+        hostfile = hosts.write_hostfile([Node('a', 5), Node('b', 4)], str(tmp_path / 'hostfile'))
+        assert open(hostfile).read() == 'a slots=5\nb slots=4\n'
+        assert hosts.distribute_ranks([Node('a', 4), Node('b', 1)], 3) == [Node('a', 2), Node('b', 1)]
+        # Oversubscribed beyond the slots
+        assert hosts.distribute_ranks([Node('a', 2), Node('b', 1)], 5) == [Node('a', 3), Node('b', 2)]
+
+    def test_stub_launch(self, tmp_path):
+        pytest.importorskip('biobb_common')
+        from biobb_asitedesign.asitedesign.asitedesign import Asitedesign
+
+        design = Asitedesign(input_pdb=os.path.join(DATA, 'Input_file.pdb'),
+                             input_yaml=os.path.join(DATA, 'DesignCatalyticSite.yaml'),
+                             params_zip=os.path.join(DATA, 'params', 'params.zip'),
+                             output_path=str(tmp_path / 'output.zip'),
+                             properties={'cpus': 'auto', 'nPoses': 3, 'mpi_hosts': 'cn1:2,cn2:2', 'container_path': '',
+                                         'params_cache': False})
+        sandbox = tmp_path / 'sandbox'
+        sandbox.mkdir()
+        design.stage_io_dict = {'unique_dir': str(sandbox), 'in': {}, 'out': {}}
+        program = f"{sys.executable} -m ActiveSiteDesign"
+        command = design.mpi_command(program)
+        hostfile = str(sandbox / 'hostfile')
+        assert design.multinode
+        assert command == f"cd {sandbox} && mpirun -n 4 --hostfile {hostfile} --bind-to core --map-by slot {program}"
+        assert (sandbox / 'hostfile').read_text() == 'cn1 slots=2\ncn2 slots=2\n'
+
+        (sandbox / 'input.yaml').write_text(yaml.dump({'Name': 'job', 'nIterations': 1, 'nPoses': 3, 'nSteps': 1}))
+        env = stub_env({'nPoses': 3, 'atoms': 10, 'frames': 0})
+        env['ASITEDESIGN_STUB_MPIRUN_LOG'] = str(tmp_path / 'mpirun.log')
+        subprocess.run(f"{command} input.yaml > output.out", shell=True, cwd=str(tmp_path), env=env, check=True)
+        assert (tmp_path / 'mpirun.log').read_text().split() == \
+            ['-n', '4', '--hostfile', hostfile, '--bind-to', 'core', '--map-by', 'slot']
+        assert len(outputs.pose_files(outputs.final_pose_dir(sandbox, 'job'))) == 3
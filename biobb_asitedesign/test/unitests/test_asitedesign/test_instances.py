@@ -0,0 +1,53 @@
+import os
+import subprocess
+import time
+
+import pytest
+
+from biobb_asitedesign.asitedesign.instances import INSTANCE_MOUNT, InstancePool, reap_pool
+from biobb_asitedesign.test.benchmark.run_benchmarks import STUB_DIR
+
+
+@pytest.fixture(params=['singularity', 'docker'])
+def pool(request, tmp_path, monkeypatch):
+    monkeypatch.setenv('FAKE_CONTAINER_STATE', str(tmp_path / 'fake_state'))
+    container_path = tmp_path / 'bin' / request.param
+    container_path.parent.mkdir()
+    container_path.symlink_to(STUB_DIR / 'bin' / 'fake_container')
+    (tmp_path / 'sandboxes').mkdir()
+    return InstancePool(str(container_path), 'asitedesign.sif', str(tmp_path / 'sandboxes'),
+                        pool_path=str(tmp_path / 'pool'), max_idle=1, idle_timeout=600)
+
+
+def events(tmp_path):
+    return (tmp_path / 'fake_state' / 'events.log').read_text().split()
+
+
+class TestInstances:
+    def test_exec_and_reuse(self, pool, tmp_path):
+        sandbox = tmp_path / 'sandboxes' / 'job1'
+        sandbox.mkdir()
+        instance = pool.acquire()
+        cmd = instance.exec_command("echo $PWD > output.out", f"{INSTANCE_MOUNT}/job1")
+        assert subprocess.run(' '.join(cmd), shell=True).returncode == 0
+        assert (sandbox / 'output.out').read_text().strip() == str(sandbox)
+        assert pool.release(instance) == []
+
+        assert pool.acquire().name == instance.name
+        assert events(tmp_path).count('start') == 1
+
+    def test_busy_idle_and_dead(self, pool, tmp_path):
+        first, second = pool.acquire(), pool.acquire()
+        assert first.name != second.name
+        pool.release(first)
+        # Only max_idle=1 idle instance is kept
+        assert pool.release(second) == [first.name]
+
+        # An instance that died is replaced
+        os.remove(tmp_path / 'fake_state' / f"{second.name}.json")
+        third = pool.acquire()
+        assert third.name not in (first.name, second.name)
+        pool.release(third)
+
+        assert reap_pool(str(pool.pool_path), now=time.time() + 601) == [third.name]
+        assert events(tmp_path).count('stop') == 2
@@ -0,0 +1,49 @@
+import pytest
+
+from biobb_asitedesign.asitedesign.mpi import available_cores, cgroup_cpu_quota, numa_nodes, parse_cpulist, plan_mpi
+
+
+class TestMpi:
+    def test_cgroup_quota(self, tmp_path):
+        proc = tmp_path / 'cgroup'
+        proc.write_text('0::/job\n')
+        (tmp_path / 'fs' / 'job').mkdir(parents=True)
+        (tmp_path / 'fs' / 'job' / 'cpu.max').write_text('250000 100000\n')
+        assert cgroup_cpu_quota(str(proc), str(tmp_path / 'fs')) == 2.5
+        (tmp_path / 'fs' / 'job' / 'cpu.max').write_text('max 100000\n')
+        assert cgroup_cpu_quota(str(proc), str(tmp_path / 'fs')) is None
+
+        proc.write_text('4:cpu,cpuacct:/slurm/job_1\n')
+        v1 = tmp_path / 'fs' / 'cpu,cpuacct' / 'slurm' / 'job_1'
+        v1.mkdir(parents=True)
+        (v1 / 'cpu.cfs_quota_us').write_text('400000\n')
+        (v1 / 'cpu.cfs_period_us').write_text('100000\n')
+        assert cgroup_cpu_quota(str(proc), str(tmp_path / 'fs')) == 4.0
+
+        assert available_cores(cores=range(16), quota=2.5) == 3
+        assert available_cores(cores=range(16), quota=None) == 16
+
+    def test_numa(self, tmp_path):
+        for node, cpulist in enumerate(['0-3,8-11', '4-7,12-15']):
+            (tmp_path / f'node{node}').mkdir()
+            (tmp_path / f'node{node}' / 'cpulist').write_text(cpulist + '\n')
+        assert parse_cpulist('0-2,5') == [0, 1, 2, 5]
+        assert numa_nodes([0, 1, 4], str(tmp_path)) == {0: [0, 1], 1: [4]}
+        assert numa_nodes([0, 1], str(tmp_path)) == {0: [0, 1]}
+
+    def test_plan(self):
+        plan = plan_mpi('auto', 7, available=16, numa={0: list(range(16))})
+        assert plan.command('python -m ActiveSiteDesign') == \
+            'mpirun -n 8 --bind-to core --map-by core python -m ActiveSiteDesign'
+        assert plan.messages == ['8 of the 16 available cores will be idle']
+        assert plan_mpi('auto', 7, available=16, numa={0: [0], 1: [8]}).options[-1] == 'numa'
+
+        clamped = plan_mpi('auto', 31, available=16, numa={})
+        assert clamped.ranks == 16 and len(clamped.messages) == 2
+        oversubscribed = plan_mpi(32, 31, available=16, numa={}, oversubscribe='warn')
+        assert oversubscribed.ranks == 32
+        assert oversubscribed.options == ['--oversubscribe', '--bind-to', 'none']
+        with pytest.raises(ValueError):
+            plan_mpi('auto', 31, available=16, oversubscribe='error')
+
+        assert plan_mpi(4, 3, available=4, numa={}, bind_to='none', map_by='slot').options == ['--map-by', 'slot']
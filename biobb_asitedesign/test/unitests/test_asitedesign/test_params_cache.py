@@ -0,0 +1,39 @@
+import os
+import zipfile
+
+from biobb_asitedesign.asitedesign.common import link_or_copy
+from biobb_asitedesign.asitedesign.params_cache import ParamsCache
+
+
+def make_zip(path, name, size):
+    with zipfile.ZipFile(path, 'w') as zip_f:
+        zip_f.writestr(name, b'P' * size)
+    return str(path)
+
+
+class TestParamsCache:
+    def test_hit_and_lru_eviction(self, tmp_path):
+        cache = ParamsCache(str(tmp_path / 'cache'), max_size=2500)
+        first = make_zip(tmp_path / 'a.zip', 'LIG.fa.params', 1000)
+        files = cache.get(first)
+        assert [os.path.basename(f) for f in files] == ['LIG.fa.params']
+        # Same content under another archive name is a cache hit
+        copy = tmp_path / 'copy.zip'
+        copy.write_bytes(open(first, 'rb').read())
+        assert cache.get(str(copy)) == files
+
+        cache.get(make_zip(tmp_path / 'b.zip', 'B.params', 1000))
+        os.utime(os.path.dirname(files[0]) + '/.complete', (0, 0))
+        cache.get(make_zip(tmp_path / 'c.zip', 'C.params', 1000))
+        names = sorted(sorted(os.listdir(entry)) for _, _, entry in cache.entries())
+        assert names == [['.complete', 'B.params'], ['.complete', 'C.params']]
+        assert not os.path.exists(files[0])
+
+    def test_link_or_copy(self, tmp_path):
+        src = tmp_path / 'LIG.fa.params'
+        src.write_text('params')
+        dest_dir = tmp_path / 'sandbox'
+        dest_dir.mkdir()
+        dest = link_or_copy(str(src), str(dest_dir))
+        assert os.path.samefile(dest, src)
+        assert not os.path.islink(dest)
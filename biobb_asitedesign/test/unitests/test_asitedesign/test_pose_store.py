@@ -0,0 +1,72 @@
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+import yaml
+
+from biobb_asitedesign.asitedesign import outputs, pose_store, reader
+from biobb_asitedesign.asitedesign.archive import write_archive
+from biobb_asitedesign.asitedesign.pdb_index import PDBIndex
+from biobb_asitedesign.test.benchmark.run_benchmarks import stub_env
+
+
+@pytest.fixture
+def sandbox(tmp_path):
+    sandbox = tmp_path / 'sandbox'
+    sandbox.mkdir()
+    (sandbox / 'input.yaml').write_text(yaml.dump({'Name': 'job', 'nIterations': 2, 'nPoses': 3, 'nSteps': 1,
+                                                   'RankingMetric': 'FullAtom', 'WriteALL': True,
+                                                   'DesignResidues': {'2-A': 'ZX'}}))
+    subprocess.run(f"{sys.executable} -m ActiveSiteDesign input.yaml > output.out", shell=True, cwd=str(sandbox),
+                   env=stub_env({'nPoses': 3, 'atoms': 60, 'frames': 4}), check=True)
+    return sandbox
+
+
+class TestPoseStore:
+    @pytest.mark.parametrize('mode', pose_store.MODES)
+    def test_round_trip(self, sandbox, mode):
+        folder = outputs.epoch_dirs(sandbox, 'job')[-1][1]
+        originals = {path.relative_to(folder).as_posix(): path.read_text() for path in outputs.pose_files(folder)}
+        pdb_bytes = sum(path.stat().st_size for path in outputs.pose_files(folder))
+        store_path, skipped = pose_store.compact_folder(str(folder), mode)
+        assert skipped == [] and outputs.pose_files(folder) == []
+        assert store_path.stat().st_size * 4 < pdb_bytes
+
+        with pose_store.PoseStore(str(store_path)) as store:
+            assert sorted(store.names) == sorted(originals)
+            for name, text in originals.items():
+                assert store.pose_text(name) == text
+            trajectory = next(name for name in originals if name.startswith('trajectory'))
+            frames = store.frames(trajectory)
+            assert len(frames) == 4
+            frame_pdb = store.frame_pdb(frames[1])
+            assert frame_pdb.startswith('REMARK') and 'MODEL' not in frame_pdb
+            atoms = PDBIndex.from_lines(frame_pdb.splitlines(keepends=True)).atoms
+            np.testing.assert_allclose([(atom.x, atom.y, atom.z) for atom in atoms], store.coordinates(frames[1]), atol=5e-4)
+            assert outputs.parse_scores(frame_pdb.splitlines()) == outputs.parse_scores(originals[trajectory].splitlines())
+
+    def test_lossy_files_stay_pdb(self, tmp_path):
+        far = 'ATOM      1  CA  ALA A   1    9999.999  -0.000   0.000  1.00  0.00           C\nEND\n'
+        (tmp_path / 'far.pdb').write_text(far)
+        precise = 'ATOM      1  CA  ALA A   1      1.2345   0.000   0.000  1.00  0.00           C\nEND\n'
+        (tmp_path / 'precise.pdb').write_text(precise)
+        (tmp_path / 'empty.pdb').write_text('REMARK no atoms\nEND\n')
+        for mode in pose_store.MODES:
+            store_path, skipped = pose_store.compact_folder(str(tmp_path), mode, remove=False)
+            assert sorted(path.name for path in skipped) == ['empty.pdb', 'precise.pdb']
+            with pose_store.PoseStore(str(store_path)) as store:
+                assert store.names == ['far.pdb'] and store.pose_text('far.pdb') == far
+        pose_store.compact_folder(str(tmp_path))
+        assert (tmp_path / 'precise.pdb').read_text() == precise and not (tmp_path / 'far.pdb').exists()
+
+    def test_reader(self, sandbox, tmp_path):
+        for _, folder in outputs.epoch_dirs(sandbox, 'job'):
+            pose_store.compact_folder(str(folder), reference_pdb=str(outputs.pose_files(sandbox / 'job_final_pose')[0]))
+        zip_path = str(tmp_path / 'out.zip')
+        write_archive(zip_path, [str(sandbox)])
+        with reader.OutputArchive(zip_path) as archive:
+            assert sorted(archive.pose_stores) == [number for number, _ in outputs.epoch_dirs(sandbox, 'job')]
+            assert archive.epochs == {} and len(archive.final_poses) == 3
+            with archive.open_pose_store(0) as store:
+                assert store.n_frames == 3 + 3 * 4
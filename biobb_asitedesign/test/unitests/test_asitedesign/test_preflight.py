@@ -0,0 +1,47 @@
+import os
+
+from biobb_asitedesign.asitedesign import common as com
+from biobb_asitedesign.asitedesign.pdb_index import PDBIndex
+from biobb_asitedesign.asitedesign.preflight import validate
+
+DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'asitedesign')
+
+
+def design_yaml():
+    return com.layer_yaml(os.path.join(DATA, 'DesignCatalyticSite.yaml'), com.yaml_preset('CatalyticSite'))
+
+
+class TestPreflight:
+    index = PDBIndex.from_file(os.path.join(DATA, 'Input_file.pdb'))
+
+    def test_sample_inputs_pass(self):
+        report = validate(design_yaml(), self.index)
+        assert report.ok, str(report)
+
+    def test_reference_errors(self):
+        yaml_dict = design_yaml()
+        yaml_dict['DesignResidues']['195-A '] = 'ZX'
+        yaml_dict['DesignResidues']['9999-A'] = 'ZX'
+        yaml_dict['Ligands'] = [{'2-L': {}}]
+        yaml_dict['Constraints']['cst5'] = {'type': 'B', 'resi': '28-A', 'atomi': 'NE2-ND1',
+                                            'resj': 'RES7', 'atomj': 'OG'}
+        report = validate(yaml_dict, self.index)
+        wheres = sorted(issue.where for issue in report.errors)
+        assert wheres == ["Constraints.cst5.atomi", "Constraints.cst5.resj", "DesignResidues.'195-A '",
+                          "DesignResidues.'9999-A'", "Ligands.2-L"]
+        assert 'whitespace' in str(report)
+
+    def test_residue_catalytic_keys(self):
+        yaml_dict = com.read_yaml(os.path.join(DATA, 'input.yaml'))
+        index = PDBIndex.from_file(os.path.join(DATA, '1VA4-wt-min.pdb'))
+        report = validate(yaml_dict, index)
+        assert not report.issues, str(report)
+
+        yaml_dict['CatalyticResidues'].update({'9999-A': 'ZZ', '94-A ': 'ZZ', 'SER1': 'S', '251-A': 'ZQ'})
+        yaml_dict['Constraints']['cst0']['atomj'] = 'NE2'
+        report = validate(yaml_dict, index)
+        wheres = sorted(issue.where for issue in report.errors)
+        assert wheres == ["CatalyticResidues.251-A", "CatalyticResidues.94-A ", "CatalyticResidues.9999-A",
+                          "CatalyticResidues.SER1"]
+        # ZZ keeps the serine of the PDB at 94-A
+        assert [issue.where for issue in report.issues if issue.level == 'warning'] == ["Constraints.cst0.atomj"]
@@ -0,0 +1,122 @@
+import csv
+import os
+
+import pytest
+import yaml
+
+from biobb_asitedesign.asitedesign import preset_search
+from biobb_asitedesign.asitedesign.preset import SOFTWARE_PARAMS
+from biobb_asitedesign.asitedesign.reader import OutputArchive
+from biobb_asitedesign.test.benchmark.run_benchmarks import patched_environ, stub_env
+
+DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'asitedesign')
+
+SPACE = {'kT_high': [100, 250, 500], 'nSteps': [1, 2, 4]}
+
+
+def evaluator(calls, fail=()):
+    """Energies improve with the iterations and nSteps, cost grows with both."""
+    def evaluate(trials, iterations):
+        calls.append((iterations, sorted(trial.trial_id for trial in trials)))
+        for trial in trials:
+            added = iterations - trial.iterations
+            trial.core_hours += 0.1 * added * trial.config['nSteps']
+            if trial.trial_id in fail:
+                trial.status = 'failed'
+                continue
+            trial.energy = -10.0 * iterations * trial.config['nSteps'] / (1 + iterations) + trial.config['kT_high'] / 100
+            trial.iterations = iterations
+            trial.status = 'done'
+    return evaluate
+
+
+class TestPresetSearch:
+    def test_rungs_and_sampling(self):
+        assert preset_search.rung_iterations(1, 9, 3) == [1, 3, 9]
+        assert preset_search.rung_iterations(2, 10, 3) == [2, 6, 10]
+        with pytest.raises(ValueError):
+            preset_search.rung_iterations(3, 2, 3)
+        configs = preset_search.sample_configs(SPACE, 5, seed=1)
+        assert len(configs) == 5 and len({tuple(config.items()) for config in configs}) == 5
+        assert configs == preset_search.sample_configs(SPACE, 5, seed=1)
+        assert len(preset_search.sample_configs(SPACE, 100)) == 9
+
+    def test_successive_halving(self, tmp_path):
+        calls = []
+        result = preset_search.successive_halving(SPACE, evaluator(calls, fail={'trial_004'}), budget_core_hours=100)
+        assert [iterations for iterations, _ in calls] == [1, 3, 9]
+        assert [len(trials) for _, trials in calls] == [9, 2, 1]
+        assert 'trial_004' not in calls[1][1]
+        assert len(result.evaluations) == 8 + 2 + 1
+        assert result.core_hours == pytest.approx(sum(trial.core_hours for trial in result.trials))
+        best = [trial for trial in result.trials if trial.rung == 2]
+        assert len(best) == 1 and best[0].config['nSteps'] == 4 and best[0].config['kT_high'] == 100
+
+        front = result.front
+        assert [evaluation.core_hours for evaluation in front] == sorted(evaluation.core_hours for evaluation in front)
+        assert all(a.energy > b.energy for a, b in zip(front, front[1:]))
+        for evaluation in result.evaluations:
+            assert not any(point.energy < evaluation.energy and point.core_hours < evaluation.core_hours for point in front) \
+                or evaluation not in front
+        assert preset_search.select(front).energy == min(evaluation.energy for evaluation in result.evaluations)
+        cheap = preset_search.select(front, energy_tolerance=100)
+        assert cheap == front[0]
+
+        table = preset_search.write_table(result, str(tmp_path / 'front.csv'))
+        rows = list(csv.DictReader(open(table)))
+        assert len(rows) == 11 and sum(row['pareto'] == 'True' for row in rows) == len(front)
+        assert yaml.safe_load(rows[0]['config']) in [trial.config for trial in result.trials]
+
+        base = dict(SOFTWARE_PARAMS['DirectEvolution'], DesignResidues={'2-A': 'ZX'})
+        preset_path = preset_search.write_preset(preset_search.custom_preset(base, front[-1]), str(tmp_path / 'preset.yaml'))
+        preset = yaml.safe_load(open(preset_path))
+        assert preset['nIterations'] == front[-1].iterations and preset['kT_high'] == front[-1].config['kT_high']
+        assert preset['DesignResidues'] == {'2-A': 'ZX'} and preset['ActiveSiteLoops'] == 1
+
+    def test_budget_stops_promotions(self):
+        calls = []
+        # The first rung costs 0.1 * 3 * (1 + 2 + 4) = 2.1, and continuing the best (nSteps 4) to 3 iterations 0.8
+        result = preset_search.successive_halving(SPACE, evaluator(calls), budget_core_hours=3.0)
+        assert [len(trials) for _, trials in calls] == [9, 1]
+        assert result.core_hours == pytest.approx(2.9)
+        assert all(trial.status == 'stopped' for trial in result.trials)
+        calls = []
+        preset_search.successive_halving(SPACE, evaluator(calls), budget_core_hours=1.0)
+        assert len(calls) == 1
+
+    def test_evaluate_with_stub(self, tmp_path, monkeypatch):
+        pytest.importorskip('biobb_common')
+        from biobb_asitedesign.asitedesign.asitedesign_search import AsitedesignSearch
+
+        monkeypatch.chdir(tmp_path)
+        search = AsitedesignSearch(input_pdb=os.path.join(DATA, 'Input_file.pdb'),
+                                   input_yaml=os.path.join(DATA, 'DesignCatalyticSite.yaml'),
+                                   params_zip=os.path.join(DATA, 'params', 'params.zip'),
+                                   output_preset_path=str(tmp_path / 'preset.yaml'),
+                                   output_front_path=str(tmp_path / 'front.csv'),
+                                   properties={'cpus': 3, 'max_cpus': 3, 'poll_interval': 0.1,
+                                               'job_properties': {'container_path': '', 'params_cache': False,
+                                                                  'nPoses': 2}})
+        search.search_dir = tmp_path / 'search'
+        search.base_yaml = {'Name': 'job', 'RankingMetric': 'FullAtom', 'nIterations': 20, 'nSteps': 1}
+        search.metric = 'FullAtom'
+        trial = preset_search.Trial('trial_000', {'kT_high': 100, 'nSteps': 4})
+
+        with patched_environ(stub_env({'nPoses': 2, 'atoms': 20, 'frames': 0})):
+            search.evaluate([trial], 3)
+            assert trial.status == 'done' and trial.iterations == 3
+            # The YAML AsiteDesign ran with, not the defaults of the Asitedesign properties
+            with OutputArchive(trial.output_path) as archive:
+                assert archive.yaml['nIterations'] == 3 and archive.yaml['nSteps'] == 4 and archive.yaml['kT_high'] == 100
+            first = trial.output_path
+
+            # A promotion continues from the previous rung for the added iterations only
+            search.evaluate([trial], 9)
+            assert trial.status == 'done' and trial.iterations == 9 and trial.output_path != first
+            with OutputArchive(trial.output_path) as archive:
+                assert archive.yaml['nIterations'] == 6 and archive.yaml['nSteps'] == 4
+
+        # Trials that can never start are an error, not an empty front
+        search.max_cpus = 2
+        with pytest.raises(ValueError, match='No trial can run'):
+            search.evaluate([preset_search.Trial('trial_001', {'kT_high': 100, 'nSteps': 1})], 1)
@@ -0,0 +1,34 @@
+import json
+import pstats
+import subprocess
+import sys
+
+from biobb_asitedesign.asitedesign.profiling import PhaseProfiler
+
+
+class TestProfiling:
+    def test_phases(self, tmp_path):
+        profiler = PhaseProfiler(python_profile=True)
+        profiler.phase('stage_files')
+        tmp_path.joinpath('staged.bin').write_bytes(b'\0' * (1 << 20))
+        profiler.phase('run')
+        subprocess.run([sys.executable, '-c', 'sum(range(10 ** 6))'], check=True)
+        profiler.finish()
+
+        report_path = tmp_path / 'profile.json'
+        profiler.write(str(report_path), str(tmp_path / 'profile.prof'))
+        report = json.loads(report_path.read_text())
+        assert [phase['phase'] for phase in report['phases']] == ['stage_files', 'run']
+        stage, run = report['phases']
+        assert stage['wall'] >= 0 and run['wall'] > 0
+        assert run['children_cpu_user'] + run['children_cpu_system'] > 0
+        if stage['io']:
+            assert stage['io']['wchar'] >= 1 << 20
+        assert report['total']['wall'] >= stage['wall'] + run['wall']
+        assert pstats.Stats(report['python_profile']).total_calls > 0
+
+    def test_disabled(self):
+        profiler = PhaseProfiler(enabled=False)
+        profiler.phase('stage_files')
+        profiler.finish()
+        assert profiler.phases == [] and profiler.report()['phases'] == []
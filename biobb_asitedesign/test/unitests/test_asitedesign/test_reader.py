@@ -0,0 +1,82 @@
+import subprocess
+import sys
+
+import pytest
+import yaml
+
+from biobb_asitedesign.asitedesign import outputs, reader
+from biobb_asitedesign.asitedesign.archive import AppendableArchive, write_archive
+from biobb_asitedesign.test.benchmark.run_benchmarks import stub_env
+
+
+@pytest.fixture(scope='module')
+def sandbox(tmp_path_factory):
+    sandbox = tmp_path_factory.mktemp('job') / 'sandbox'
+    sandbox.mkdir()
+    (sandbox / 'input.yaml').write_text(yaml.dump({'Name': 'job', 'nIterations': 3, 'nPoses': 4, 'nSteps': 1,
+                                                   'RankingMetric': 'FullAtom', 'WriteALL': True,
+                                                   'DesignResidues': {'2-A': 'ZX'}}))
+    subprocess.run(f"{sys.executable} -m ActiveSiteDesign input.yaml > output.out", shell=True, cwd=str(sandbox),
+                   env=stub_env({'nPoses': 4, 'atoms': 40, 'frames': 3}), check=True)
+    return sandbox
+
+
+class TestReader:
+    @pytest.mark.parametrize('compress_level', [0, 6])
+    def test_layout_and_lazy_reads(self, sandbox, tmp_path, monkeypatch, compress_level):
+        zip_path = str(tmp_path / 'out.zip')
+        write_archive(zip_path, [str(sandbox)], compress_level=compress_level)
+        opened = []
+        original_open = reader.ArchiveMember.open
+
+        def counting_open(member):
+            opened.append(member.name)
+            return original_open(member)
+
+        monkeypatch.setattr(reader.ArchiveMember, 'open', counting_open)
+        with reader.OutputArchive(zip_path) as archive:
+            assert opened == []
+            assert [member.name for member in archive.final_poses] == \
+                [f"sandbox/job_final_pose/final_pose_{rank}.pdb" for rank in range(1, 5)]
+            assert sorted(archive.epochs) == [number for number, _ in outputs.epoch_dirs(sandbox, 'job')]
+            assert archive.trajectories() and all(member.trajectory for member in archive.trajectories())
+            assert [member.name for member in archive.logs] == ['sandbox/output.out']
+            assert opened == []
+
+            top = archive.top_poses(2)
+            expected = outputs.rank_poses(outputs.pose_files(sandbox / 'job_final_pose'), 'FullAtom', 2)
+            assert [member.name.rsplit('/', 1)[1] for member in top] == [path.name for _, path in expected]
+            # Only the final poses and the YAML were read
+            assert set(opened) == {member.name for member in archive.final_poses} | {'sandbox/input.yaml'}
+
+            member = top[0]
+            assert bytes(member.buffer()) == (sandbox / 'job_final_pose' / member.name.rsplit('/', 1)[1]).read_bytes()
+            assert member.stored == (compress_level == 0)
+
+            extracted = archive.extract_top(2, str(tmp_path / 'top'))
+            assert [path.name for path in extracted] == [path.name for _, path in expected]
+            assert extracted[0].read_bytes() == expected[0][1].read_bytes()
+            with pytest.raises(ValueError):
+                archive.extract([_Escaping(member)], str(tmp_path / 'top'))
+
+    def test_replicas(self, sandbox, tmp_path):
+        replica_zip = str(tmp_path / 'replica.zip')
+        write_archive(replica_zip, [str(sandbox)])
+        ensemble_zip = str(tmp_path / 'ensemble.zip')
+        archive = AppendableArchive(ensemble_zip)
+        for index in range(2):
+            archive.append_archive(replica_zip, prefix=f"ensemble/replica_{index}/")
+        archive.close()
+        with reader.OutputArchive(ensemble_zip) as output:
+            assert output.replicas == ['ensemble/replica_0/', 'ensemble/replica_1/']
+        with reader.OutputArchive(ensemble_zip, prefix='ensemble/replica_1/') as replica:
+            assert len(replica.final_poses) == 4 and replica.metric == 'FullAtom'
+
+
+class _Escaping:
+    def __init__(self, member):
+        self.name = '../escaped.pdb'
+        self.member = member
+
+    def extract(self, dest):
+        return self.member.extract(dest)
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from biobb_asitedesign.asitedesign import common as com
+from biobb_asitedesign.asitedesign.result_cache import ResultCache, canonical_yaml, job_digest
+
+DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'asitedesign')
+# Properties that change the run or its output zip, and a value differing from their default
+KEYED_PROPERTIES = {'replicas': 2, 'crop_radius': 12.0, 'early_stop': True, 'cluster': True, 'compact_poses': True}
+
+
+def merged_yaml(sandbox, order):
+    yaml_dict = {'Name': f"{sandbox}/job", 'nSteps': 1,
+                 'Constraints': {'cst4': {'type': 'S', 'reference': 'Input_file.pdb'}}}
+    workflow_dict = {'PDB': f"/data/{sandbox}/Input_file.pdb", 'ParameterFiles': ['/data/LIG.fa.params'],
+                     'nPoses': 2, 'DesignResidues': dict(order)}
+    return com.merge_yaml(workflow_dict, yaml_dict)
+
+
+class TestResultCache:
+    def test_canonical_yaml(self):
+        first = merged_yaml('sandbox_1', [('28-A', 'ZX'), ('29-A', 'ZX')])
+        second = merged_yaml('sandbox_2', [('29-A', 'ZX'), ('28-A', 'ZX')])
+        assert canonical_yaml(first) == canonical_yaml(second)
+        second['nSteps'] = 2
+        assert canonical_yaml(first) != canonical_yaml(second)
+
+    def test_store_and_fetch(self, tmp_path):
+        pdb = tmp_path / 'Input_file.pdb'
+        pdb.write_text('ATOM\n')
+        params = tmp_path / 'LIG.fa.params'
+        params.write_text('NAME LIG\n')
+        yaml_dict = merged_yaml('sandbox', [('28-A', 'ZX')])
+        digest = job_digest(yaml_dict, str(pdb), [str(params)], 'singularity:image.sif')
+        params.write_text('NAME LIG2\n')
+        assert job_digest(yaml_dict, str(pdb), [str(params)], 'singularity:image.sif') != digest
+
+        cache = ResultCache(str(tmp_path / 'cache'))
+        assert not cache.fetch(digest, str(tmp_path / 'miss.zip'))
+        output = tmp_path / 'output.zip'
+        output.write_bytes(b'PK')
+        cache.store(digest, str(output))
+        assert cache.fetch(digest, str(tmp_path / 'hit.zip'))
+        assert (tmp_path / 'hit.zip').read_bytes() == b'PK'
+
+        # Rewriting the output or the fetched copy in place leaves the cache entry untouched
+        cached = cache.lookup(digest)
+        assert not cached.samefile(output) and not cached.samefile(tmp_path / 'hit.zip')
+        for path in (output, tmp_path / 'hit.zip'):
+            with open(path, 'wb') as output_f:
+                output_f.write(b'')
+        assert cached.read_bytes() == b'PK'
+
+    @pytest.mark.parametrize('key', sorted(KEYED_PROPERTIES))
+    def test_job_digest_properties(self, tmp_path, monkeypatch, key):
+        pytest.importorskip('biobb_common')
+        from biobb_asitedesign.asitedesign.asitedesign import Asitedesign
+
+        monkeypatch.chdir(tmp_path)
+
+        def digest(properties):
+            return Asitedesign(input_pdb=os.path.join(DATA, 'Input_file.pdb'),
+                               input_yaml=os.path.join(DATA, 'DesignCatalyticSite.yaml'),
+                               params_zip=os.path.join(DATA, 'params', 'params.zip'),
+                               output_path=str(tmp_path / 'output.zip'),
+                               properties=dict(properties, params_cache=False, cpus=8)).job_digest()
+
+        assert digest({key: KEYED_PROPERTIES[key]}) != digest({})
+        if key == 'early_stop':
+            assert digest({'early_stop': True, 'early_stop_patience': 5}) != digest({'early_stop': True, 'cluster': True, 'compact_poses': True})
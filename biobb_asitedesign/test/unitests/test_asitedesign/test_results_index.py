@@ -0,0 +1,65 @@
+import subprocess
+import sys
+
+import pytest
+import yaml
+
+from biobb_asitedesign.asitedesign import outputs, results_index
+from biobb_asitedesign.asitedesign.archive import write_archive
+from biobb_asitedesign.asitedesign.preset import SOFTWARE_PARAMS
+from biobb_asitedesign.test.benchmark.run_benchmarks import stub_env
+
+DESIGN = {'2-A': 'ZX', '3-A': 'ZX', '5-A': 'ZX'}
+
+
+def run_job(tmp_path, name, seed):
+    sandbox = tmp_path / name / 'sandbox'
+    sandbox.mkdir(parents=True)
+    config = dict(SOFTWARE_PARAMS['DirectEvolution'], Name='job', nIterations=2, nPoses=3, nSteps=1, Seed=seed,
+                  DesignResidues=DESIGN, RankingMetric='FullAtom')
+    (sandbox / 'input.yaml').write_text(yaml.dump(config))
+    subprocess.run(f"{sys.executable} -m ActiveSiteDesign input.yaml > output.out", shell=True, cwd=str(sandbox),
+                   env=stub_env({'nPoses': 3, 'atoms': 40, 'frames': 0}), check=True)
+    zip_path = tmp_path / 'runs' / f"{name}.zip"
+    zip_path.parent.mkdir(exist_ok=True)
+    write_archive(str(zip_path), [str(sandbox)])
+    return zip_path, sandbox
+
+
+class TestResultsIndex:
+    def test_index_and_query(self, tmp_path):
+        jobs = [run_job(tmp_path, name, seed) for name, seed in (('a', 1), ('b', 2))]
+        index_path = str(tmp_path / 'index.sqlite')
+        with results_index.ResultsIndex(index_path) as index:
+            added = index.add_directory(str(tmp_path / 'runs'), epochs=True)
+            assert len(added) == 2 and all(count > 3 for count in added.values())
+            # Unchanged zips are not read again
+            assert index.add_zip(str(jobs[0][0])) == 0
+
+        with results_index.ResultsIndex(index_path) as index:
+            best = index.top(k=None)
+            assert len(best) == 6 and all(record.kind == 'final' for record in best)
+            assert [record.score for record in best] == sorted(record.score for record in best)
+            expected = sorted(score for _, sandbox in jobs
+                              for score, _ in outputs.rank_poses(outputs.pose_files(sandbox / 'job_final_pose'), 'FullAtom'))
+            assert [record.score for record in best] == pytest.approx(expected, abs=1e-3)
+            record = best[0]
+            assert record.preset == 'DirectEvolution' and record.metric == 'FullAtom'
+            assert record.member.startswith('sandbox/job_final_pose/') and record.positions == ['2-A', '3-A', '5-A']
+            assert record.constraint_score == record.scores['OnlyConstraints']
+            sandbox = dict((str(zip_path.resolve()), sandbox) for zip_path, sandbox in jobs)[record.zip_path]
+            assert record.sequence == outputs.mutant_sequence(sandbox.parent / record.member, outputs.design_keys(DESIGN))
+
+            mutation = f"3-A:{record.sequence[1]}"
+            filtered = index.top(k=None, mutations=[mutation])
+            assert record in filtered and all(pose.sequence[1] == record.sequence[1] for pose in filtered)
+            assert len(index.top(k=2, kind=None)) == 2
+            assert index.top(k=3, metric='OnlyConstraints')[0].scores['OnlyConstraints'] == \
+                min(pose.scores['OnlyConstraints'] for pose in best)
+            assert index.top(preset='CatalyticSite') == []
+            with pytest.raises(ValueError):
+                index.top(mutations=['3A'])
+
+            jobs[1][0].unlink()
+            assert index.remove_missing() == [str(jobs[1][0].resolve())]
+            assert len(index.top(k=None)) == 3
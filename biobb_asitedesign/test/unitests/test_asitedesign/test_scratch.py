@@ -0,0 +1,47 @@
+import tarfile
+
+import pytest
+
+from biobb_asitedesign.asitedesign import scratch
+
+
+class TestScratch:
+    def test_candidates(self, monkeypatch, tmp_path):
+        monkeypatch.setenv('TMPDIR', str(tmp_path))
+        assert scratch.candidates('auto') == [tmp_path, scratch.Path('/dev/shm')]
+        monkeypatch.delenv('TMPDIR')
+        assert scratch.candidates('auto') == [scratch.Path('/dev/shm')]
+        monkeypatch.setenv('LOCAL_SCRATCH', '/local')
+        assert scratch.candidates('$LOCAL_SCRATCH/job, /tmp') == [scratch.Path('/local/job'), scratch.Path('/tmp')]
+
+    def test_estimate_and_select(self, tmp_path):
+        pdb = tmp_path / 'input.pdb'
+        pdb.write_bytes(b'x' * 1000)
+        assert scratch.estimate_bytes(str(pdb), 4, 9) == scratch.BASE_BYTES + 1000 * 4 * 10
+        assert scratch.estimate_bytes(str(pdb), 4, 9, n_steps=5, write_all=True) == scratch.BASE_BYTES + 1000 * 4 * 10 * 5
+
+        missing = tmp_path / 'missing'
+        chosen, messages = scratch.select_scratch([missing, tmp_path], 1)
+        assert chosen == tmp_path and len(messages) == 1 and 'not a writable folder' in messages[0]
+        chosen, messages = scratch.select_scratch([tmp_path], 1024 ** 5)
+        assert chosen is None and 'GB required' in messages[0]
+
+    def test_relocate_and_copy_back(self, tmp_path):
+        sandbox = tmp_path / 'shared' / 'sandbox_1'
+        sandbox.joinpath('job_output', 'epoch_0').mkdir(parents=True)
+        sandbox.joinpath('job_output', 'epoch_0', 'pose_1.pdb').write_text('ATOM\n')
+        local = tmp_path / 'local'
+        local.mkdir()
+        moved = scratch.relocate(str(sandbox), local)
+        assert moved == local / 'sandbox_1' and not sandbox.exists()
+        assert (moved / 'job_output' / 'epoch_0' / 'pose_1.pdb').read_text() == 'ATOM\n'
+
+        assert scratch.copy_back(str(moved), str(tmp_path / 'shared'), 'none') is None
+        archive = scratch.copy_back(str(moved), str(tmp_path / 'shared'), 'tar')
+        assert archive == tmp_path / 'shared' / 'sandbox_1.tar'
+        with tarfile.open(str(archive)) as tar:
+            assert 'sandbox_1/job_output/epoch_0/pose_1.pdb' in tar.getnames()
+        tree = scratch.copy_back(str(moved), str(tmp_path / 'shared'), 'tree')
+        assert (tree / 'job_output' / 'epoch_0' / 'pose_1.pdb').exists()
+        with pytest.raises(ValueError):
+            scratch.copy_back(str(moved), str(tmp_path), 'rsync')
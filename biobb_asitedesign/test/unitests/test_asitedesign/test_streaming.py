@@ -0,0 +1,86 @@
+import os
+import zipfile
+
+from biobb_asitedesign.asitedesign import outputs
+from biobb_asitedesign.asitedesign.archive import MANIFEST_NAME, read_manifest, write_archive
+from biobb_asitedesign.asitedesign.streaming import StreamingPackager, read_index
+
+
+def write_epoch(sandbox, epoch):
+    folder = outputs.output_dir(sandbox, 'job').joinpath(f"epoch_{epoch}")
+    folder.mkdir(parents=True)
+    for rank in range(3):
+        folder.joinpath(f"pose_{rank}.pdb").write_bytes(b'REMARK FullAtom -1.0\n' + os.urandom(32) + b'ATOM' * 1000)
+    folder.joinpath('trajectory.log').write_text(f"epoch {epoch}\n")
+
+
+def finish_job(sandbox):
+    final = outputs.final_pose_dir(sandbox, 'job')
+    final.mkdir()
+    final.joinpath('1_pose.pdb').write_text('ATOM\n' * 100)
+    sandbox.joinpath('output.out').write_text('log\n')
+
+
+def zip_contents(zip_file):
+    with zipfile.ZipFile(zip_file) as zip_f:
+        assert zip_f.testzip() is None
+        return {name: zip_f.read(name) for name in zip_f.namelist() if name != MANIFEST_NAME}
+
+
+class TestStreaming:
+    def test_archive_mode(self, tmp_path):
+        sandbox = tmp_path / 'sandbox'
+        sandbox.mkdir()
+        zip_file = str(tmp_path / 'out.zip')
+        index_path = str(tmp_path / 'out_index.json')
+        packager = StreamingPackager(str(sandbox), 'job', zip_file, index_path, compress_level=6)
+        assert read_index(index_path)['epochs'] == []
+
+        write_epoch(sandbox, 0)
+        write_epoch(sandbox, 1)
+        assert packager.pack() == [0]
+        assert packager.pack() == []
+        index = read_index(index_path)
+        assert index['status'] == 'running' and index['epochs'][0]['archive'] == zip_file + '.part'
+        assert index['epochs'][0]['poses'][0] == 'sandbox/job_output/epoch_0/pose_0.pdb'
+        # The partial archive is readable while the job runs
+        assert 'sandbox/job_output/epoch_0/pose_2.pdb' in zip_contents(zip_file + '.part')
+
+        finish_job(sandbox)
+        entries = packager.finish([str(sandbox)], workers=2)
+        assert not os.path.exists(zip_file + '.part')
+        index = read_index(index_path)
+        assert index['status'] == 'complete'
+        assert [record['epoch'] for record in index['epochs']] == [0, 1]
+        assert index['final_poses'] == ['sandbox/job_final_pose/1_pose.pdb']
+
+        expected = str(tmp_path / 'expected.zip')
+        write_archive(expected, [str(sandbox)])
+        assert zip_contents(zip_file) == zip_contents(expected)
+        assert sorted(entry['name'] for entry in read_manifest(zip_file)) == sorted(entry['name'] for entry in entries)
+        assert len(entries) == 2 * 4 + 2
+
+    def test_shards_mode(self, tmp_path):
+        sandbox = tmp_path / 'sandbox'
+        sandbox.mkdir()
+        zip_file = str(tmp_path / 'out.zip')
+        shards = tmp_path / 'out_shards'
+        packager = StreamingPackager(str(sandbox), 'job', zip_file, str(tmp_path / 'out_index.json'), mode='shards',
+                                     shards_path=str(shards), compress_level=9)
+        for epoch in range(3):
+            write_epoch(sandbox, epoch)
+        finish_job(sandbox)
+        assert packager.pack() == [0, 1, 2]
+        assert sorted(os.listdir(shards)) == ['epoch_0000.zip', 'epoch_0001.zip', 'epoch_0002.zip']
+        with zipfile.ZipFile(shards / 'epoch_0001.zip') as shard:
+            compressed = shard.getinfo('sandbox/job_output/epoch_1/pose_0.pdb').compress_size
+
+        entries = packager.finish([str(sandbox)])
+        assert not shards.exists()
+        with zipfile.ZipFile(zip_file) as zip_f:
+            # Copied as stored in the shard
+            assert zip_f.getinfo('sandbox/job_output/epoch_1/pose_0.pdb').compress_size == compressed
+        expected = str(tmp_path / 'expected.zip')
+        write_archive(expected, [str(sandbox)])
+        assert zip_contents(zip_file) == zip_contents(expected)
+        assert all(entry['sha256'] for entry in entries)
@@ -0,0 +1,59 @@
+import json
+import urllib.request
+
+from biobb_asitedesign.asitedesign import outputs
+from biobb_asitedesign.asitedesign.telemetry import MetricsServer, TelemetryMonitor, prometheus_text
+
+POSE = "REMARK FullAtom {score}\nATOM      1  N   SER A   1     -52.613 119.576  -8.777  1.00  0.00           N\n"
+
+
+def write_epoch(root, epoch, scores):
+    folder = outputs.output_dir(root, 'job').joinpath(f"epoch_{epoch}")
+    folder.mkdir(parents=True)
+    for rank, score in enumerate(scores):
+        folder.joinpath(f"pose_{rank}.pdb").write_text(POSE.format(score=score))
+
+
+class TestTelemetry:
+    def test_sample(self, tmp_path):
+        write_epoch(tmp_path, 0, [-1.0, -2.0])
+        write_epoch(tmp_path, 1, [-3.0])
+        log = tmp_path / 'output.out'
+        log.write_text("Rank 1 Epoch 1 Step 1 Energy: -4.5\nRank 2 Epoch 1 Step 1 Energy: -1.0\nRank 1 Epoch 1 Step 2")
+        metrics_path = tmp_path / 'telemetry.jsonl'
+        monitor = TelemetryMonitor(str(tmp_path), 'job', str(metrics_path), n_iterations=4, time_budget_hours=1,
+                                   log_paths=[str(tmp_path / 'missing.out'), str(log)], metric='FullAtom')
+        metrics = monitor.sample()
+        assert metrics['epochs_completed'] == 1
+        assert metrics['current_epoch'] == 1
+        # The last line is incomplete and counted once finished
+        assert metrics['steps'] == 2
+        assert metrics['rank_steps'] == {'1': 1, '2': 1}
+        assert metrics['poses_written'] == 3
+        assert metrics['best_energy'] == -4.5
+        assert metrics['eta_seconds'] is not None
+
+        with open(log, 'a') as log_file:
+            log_file.write(" Energy: -9.0\n")
+        assert monitor.stop()['rank_steps'] == {'1': 2, '2': 1}
+        lines = [json.loads(line) for line in metrics_path.read_text().splitlines()]
+        assert len(lines) == 2 and lines[-1]['best_energy'] == -9.0
+
+        text = prometheus_text(lines[-1])
+        assert 'asitedesign_epochs_completed 1.0' in text
+        assert 'asitedesign_rank_steps{rank="1"} 2' in text
+        assert 'timestamp' not in text
+
+    def test_server(self, tmp_path):
+        monitor = TelemetryMonitor(str(tmp_path), 'job', str(tmp_path / 'telemetry.jsonl'), n_iterations=2)
+        monitor.sample()
+        server = MetricsServer(monitor, 0)
+        server.start()
+        try:
+            url = f"http://127.0.0.1:{server.server.server_address[1]}"
+            with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+                assert b'asitedesign_poses_written 0.0' in response.read()
+            with urllib.request.urlopen(url, timeout=5) as response:
+                assert json.loads(response.read())['epochs_total'] == 2
+        finally:
+            server.stop()
@@ -0,0 +1,89 @@
+import os
+import subprocess
+import sys
+
+import pytest
+import yaml
+
+from biobb_asitedesign.asitedesign import ensemble, outputs, warm_start
+from biobb_asitedesign.asitedesign.archive import write_archive
+from biobb_asitedesign.asitedesign.preset import SOFTWARE_PARAMS
+from biobb_asitedesign.test.benchmark.run_benchmarks import stub_env
+
+DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'asitedesign')
+
+
+def run_job(folder, config):
+    folder.mkdir(parents=True)
+    (folder / 'input.yaml').write_text(yaml.dump(config))
+    subprocess.run(f"{sys.executable} -m ActiveSiteDesign input.yaml > output.out", shell=True, cwd=str(folder),
+                   env=stub_env({'nPoses': 4, 'atoms': 30, 'frames': 0}), check=True)
+
+
+def previous_run(tmp_path):
+    sandbox = tmp_path / 'previous' / 'sandbox'
+    config = dict(SOFTWARE_PARAMS['DirectEvolution'], Name=f"{sandbox}/job", nIterations=4, nPoses=4, nSteps=1,
+                  Seed=3, RankingMetric='FullAtom', DesignResidues={'2-A': 'ZX'},
+                  PDB='/data/input.pdb', ParameterFiles=['/data/LIG.params'])
+    run_job(sandbox, config)
+    return sandbox
+
+
+class TestWarmStart:
+    def test_prepare(self, tmp_path):
+        sandbox = previous_run(tmp_path)
+        (sandbox / 'LIG.params').write_text('NAME LIG\n')
+        (sandbox / 'OTHER.params').write_text('NAME OTH\n')
+        zip_path = tmp_path / 'previous.zip'
+        write_archive(str(zip_path), [str(sandbox)])
+        changes = tmp_path / 'changes.yaml'
+        changes.write_text(yaml.dump({'nIterations': 1, 'DesignResidues': {'2-A': 'ZX', '4-A': 'ZX'}}))
+
+        start = warm_start.prepare(str(zip_path), str(tmp_path / 'warm'), top=2, input_yaml_path=str(changes))
+        ranked = outputs.rank_poses(outputs.pose_files(sandbox / 'job_final_pose'), 'FullAtom', 2)
+        assert [path.name for path in start.poses] == ['warm_start_1.pdb', 'warm_start_2.pdb']
+        assert [path.read_bytes() for path in start.poses] == [path.read_bytes() for _, path in ranked]
+        assert start.scores == [score for score, _ in ranked]
+        assert sorted(path.name for path in (tmp_path / 'warm' / 'params').iterdir()) == ['LIG.params']
+        assert start.params_dir == str(tmp_path / 'warm' / 'params')
+
+        merged = yaml.safe_load(open(start.yaml_path))
+        assert merged['Name'] == 'job' and merged['nIterations'] == 1 and merged['nSteps'] == 1
+        assert merged['DesignResidues'] == {'2-A': 'ZX', '4-A': 'ZX'}
+        assert merged['SpawningMetricSteps'] == SOFTWARE_PARAMS['DirectEvolution']['SpawningMetricSteps']
+        assert not {'PDB', 'ParameterFiles', 'Seed'} & set(merged)
+
+        # The refinement runs from the best pose
+        run_job(tmp_path / 'refine', dict(merged, PDB=str(start.poses[0])))
+        assert len(outputs.epoch_dirs(tmp_path / 'refine', 'job')) == 1
+
+    def test_replicas_do_not_warm_start_again(self):
+        properties = {'warm_start_from': 'previous.zip', 'warm_start_top': 2, 'replicas': 2, 'cpus': 2}
+        assert not {'warm_start_from', 'warm_start_top'} & set(ensemble.replica_properties(properties, 0, 1, 7))
+
+    def test_merged_yaml(self, tmp_path, monkeypatch):
+        pytest.importorskip('biobb_common')
+        from biobb_asitedesign.asitedesign.asitedesign import Asitedesign
+
+        monkeypatch.chdir(tmp_path)
+        sandbox = previous_run(tmp_path)
+        zip_path = tmp_path / 'previous.zip'
+        write_archive(str(zip_path), [str(sandbox)])
+        changes = tmp_path / 'changes.yaml'
+        changes.write_text(yaml.dump({'nIterations': 1}))
+
+        def merged_yaml(properties):
+            design = Asitedesign(input_pdb=os.path.join(DATA, 'Input_file.pdb'), input_yaml=str(changes),
+                                 params_zip=os.path.join(DATA, 'params', 'params.zip'),
+                                 output_path=str(tmp_path / 'refined.zip'),
+                                 properties=dict(properties, warm_start_from=str(zip_path), container_path='',
+                                                 params_cache=False, simulation_type='DirectEvolution'))
+            return design, design.merged_yaml()
+
+        # The property defaults do not override the previous YAML nor input_yaml
+        design, merged = merged_yaml({})
+        assert merged['nIterations'] == 1 and merged['nSteps'] == 1 and merged['nPoses'] == 4
+        assert design.nIterations == 1 and design.nPoses == 4
+        assert merged['PDB'] == design.io_dict['in']['input_pdb'] and merged['DesignResidues'] == {'2-A': 'ZX'}
+        _, merged = merged_yaml({'nSteps': 4, 'nIterations': 2})
+        assert merged['nIterations'] == 2 and merged['nSteps'] == 4 and merged['nPoses'] == 4
@@ -20,11 +20,13 @@ setuptools.setup(
     },
     packages=setuptools.find_packages(exclude=['adapters', 'docs', 'test']),
     package_data={'biobb_asitedesign': ['py.typed']},
-    install_requires=['biobb_common==4.0.0'],
+    install_requires=['biobb_common==4.0.0', 'numpy'],
     python_requires='>=3.7,<3.10',
     entry_points={
         "console_scripts": [
-            "asitedesign = biobb_asitedesign.asitedesign.asitedesign:main"
+            "asitedesign = biobb_asitedesign.asitedesign.asitedesign:main",
+            "asitedesign_batch = biobb_asitedesign.asitedesign.asitedesign_batch:main",
+            "asitedesign_search = biobb_asitedesign.asitedesign.asitedesign_search:main"
         ]
     },
     classifiers=(